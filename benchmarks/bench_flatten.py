@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+
+"""
+Benchmarks `container.flatten_dict`, `container.iter_flatten_dict` and
+`container.unflatten_dict` on generated documents:
+
+    python benchmarks/bench_flatten.py --num-leaves 2000000
+
+Only the current implementations are timed; the figures are not compared
+against any earlier version.
+
+"""
+
+import argparse
+import time
+from yakherd import container
+
+def build_document(num_leaves, fanout, depth):
+    """
+    Returns a nested dictionary with ``num_leaves`` leaves, spread over
+    subtrees ``depth`` levels deep with ``fanout`` children per level.
+    """
+    root = {}
+    for leaf_idx in range(num_leaves):
+        node = root
+        idx = leaf_idx
+        for level in range(depth - 1):
+            idx, child_idx = divmod(idx, fanout)
+            node = node.setdefault("k{}".format(child_idx), {})
+        node["leaf{}".format(idx)] = leaf_idx
+    return root
+
+def build_chain(depth):
+    root = {}
+    node = root
+    for level in range(depth):
+        node = node.setdefault("k{}".format(level), {})
+    node["leaf"] = depth
+    return root
+
+def _time(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print("{:<40} {:>10.3f} s".format(label, time.perf_counter() - start))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+            "--num-leaves",
+            type=int,
+            default=1000000,
+            help="Number of leaves in the wide document [default=%(default)s].")
+    parser.add_argument(
+            "--fanout",
+            type=int,
+            default=32,
+            help="Children per level in the wide document [default=%(default)s].")
+    parser.add_argument(
+            "--depth",
+            type=int,
+            default=5,
+            help="Depth of the wide document [default=%(default)s].")
+    parser.add_argument(
+            "--chain-depth",
+            type=int,
+            default=100000,
+            help="Depth of the deep (single chain) document [default=%(default)s].")
+    args = parser.parse_args()
+    d = _time("build ({} leaves)".format(args.num_leaves), lambda: build_document(args.num_leaves, args.fanout, args.depth))
+    _time("iter_flatten_dict (consume)", lambda: sum(1 for _ in container.iter_flatten_dict(d)))
+    flat_d = _time("flatten_dict", lambda: container.flatten_dict(d))
+    tuple_d = _time("flatten_dict (tuple keys)", lambda: container.flatten_dict(d, is_tuple_keys=True))
+    _time("unflatten_dict", lambda: container.unflatten_dict(flat_d))
+    _time("unflatten_dict (tuple keys)", lambda: container.unflatten_dict(tuple_d))
+    chain = build_chain(args.chain_depth)
+    _time("flatten_dict (depth {})".format(args.chain_depth), lambda: container.flatten_dict(chain))
+    _time("unflatten_dict (depth {})".format(args.chain_depth),
+            lambda: container.unflatten_dict(container.flatten_dict(chain, is_tuple_keys=True)))
+
+if __name__ == '__main__':
+    main()
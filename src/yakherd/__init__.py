@@ -34,27 +34,72 @@ __project__ = "yakherd"
 # __version__ = "0.1.0"
 __version__ = "2021.12.07"
 
-from yakherd.classlib import (
-    Attributes,
-    DummyClass,
-    cached_property,
-)
-from yakherd.consoleui import (
-    default_key_value_assignment_token,
-    CommandParser,
-    LoggerConfigurationParser,
-    PathParser,
-)
-from yakherd.filesystem import (
-    file_handle,
-)
-from yakherd.fileresource import (
-    ConfigurationDict,
-)
-from yakherd.logsystem import (
-    Logger,
-)
-from yakherd.textprocessing import (
-    format_dict_table,
-    format_dict_table_rows,
+import time as _time
+# Reference points for `yakherd.timing`: taken as early as possible, so that
+# the time spent starting up the interpreter and importing application modules
+# can be told apart.
+_import_wall_time = _time.time()
+_import_perf_counter = _time.perf_counter()
+
+# Public names are resolved on first access (PEP 562) so that a bare
+# ``import yakherd`` does not pull in every submodule and their (relatively
+# heavy) standard library dependencies.
+_lazy_attribute_modules = {
+    "Attributes": "yakherd.classlib",
+    "DummyClass": "yakherd.classlib",
+    "cached_property": "yakherd.classlib",
+    "default_key_value_assignment_token": "yakherd.consoleui",
+    "BatchConfigurationParser": "yakherd.consoleui",
+    "CommandParser": "yakherd.consoleui",
+    "LoggerConfigurationParser": "yakherd.consoleui",
+    "PathParser": "yakherd.consoleui",
+    "ProfilingConfigurationParser": "yakherd.consoleui",
+    "TimingConfigurationParser": "yakherd.consoleui",
+    "file_handle": "yakherd.filesystem",
+    "ConfigurationDict": "yakherd.fileresource",
+    "InputManifest": "yakherd.fileresource",
+    "LayeredConfiguration": "yakherd.fileresource",
+    "Logger": "yakherd.logsystem",
+    "format_dict_table": "yakherd.textprocessing",
+    "format_dict_table_rows": "yakherd.textprocessing",
+    "iter_dict_table_rows": "yakherd.textprocessing",
+    "write_dict_table": "yakherd.textprocessing",
+}
+
+# Submodules, imported on first access as attributes of the package, so that
+# ``import yakherd; yakherd.filesystem.file_handle(...)`` keeps working.
+_lazy_submodules = (
+    "application",
+    "classlib",
+    "completion",
+    "consoleui",
+    "container",
+    "daemon",
+    "debug",
+    "fileresource",
+    "filesystem",
+    "hashing",
+    "logsystem",
+    "packsystem",
+    "profiling",
+    "textprocessing",
+    "timing",
 )
+
+__all__ = sorted(_lazy_attribute_modules)
+
+def __getattr__(name):
+    import importlib
+    if name in _lazy_submodules:
+        # (importing a submodule also binds it in this namespace)
+        return importlib.import_module("." + name, __name__)
+    try:
+        module_name = _lazy_attribute_modules[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attribute_modules) | set(_lazy_submodules))
@@ -30,26 +30,129 @@
 ## 
 ##############################################################################
 
-import os
-import pathlib
 import sys
-import argparse
-
-def main():
-    parser = argparse.ArgumentParser(description=None)
-    parser.add_argument(
-            "src_paths",
-            action="store",
-            nargs="+",
-            metavar="FILE",
-            help="Path to source file(s).")
-    parser.add_argument(
-            "-o", "--output-prefix",
-            action="store",
-            default="output",
-            help="Prefix for output files [default=%(default)s].")
-    args = parser.parse_args()
+from yakherd import consoleui
+from yakherd import filesystem
+from yakherd import hashing
+from yakherd import textprocessing
+
+def report_duplicates(**kwargs):
+    paths = []
+    for path in kwargs["src_paths"]:
+        if path.is_dir():
+            paths.extend(filesystem.discover_paths(
+                path,
+                include=kwargs["include"],
+                exclude=kwargs["exclude"],
+                max_workers=kwargs["num_threads"],
+            ))
+        else:
+            paths.append(path)
+    groups = hashing.find_duplicates(
+        paths,
+        algorithm=kwargs["algorithm"],
+        min_size=kwargs["min_size"],
+        max_workers=kwargs["num_threads"],
+    )
+    def _iter_rows():
+        for group_idx, (size, digest, group_paths) in enumerate(groups):
+            for path in group_paths:
+                yield {
+                    "Group": group_idx + 1,
+                    "Size": size,
+                    "Digest": digest.hex()[:16],
+                    "Path": path,
+                }
+    with filesystem.file_handle(kwargs["output"], "w") as dest:
+        textprocessing.write_dict_table(dest, _iter_rows())
+    wasted = sum(size * (len(group_paths) - 1) for size, _, group_paths in groups)
+    sys.stderr.write("{} duplicate group(s), {} redundant byte(s)\n".format(len(groups), wasted))
+
+def process_files(**kwargs):
     print("Hello, world.")
 
+# commands that are dispatched to subcommands rather than to the default
+# ('yakherd FILE [FILE ...]') command
+subcommand_names = ("duplicates",)
+
+def compose_default_command():
+    default_cmd = consoleui.CommandParser(name="yakherd", command_fn=process_files)
+    default_cmd.add_argument(
+        "src_paths",
+        action="store",
+        nargs="+",
+        metavar="FILE",
+        help="Path to source file(s).",
+    )
+    default_cmd.add_argument(
+        "-o", "--output-prefix",
+        action="store",
+        default="output",
+        help="Prefix for output files [default=%(default)s].",
+    )
+    return default_cmd
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    if not args or args[0] not in subcommand_names + ("-h", "--help"):
+        return compose_default_command().execute(args)
+    main_cmd = consoleui.CommandParser(
+        name="yakherd",
+        epilog=(
+            "Without a command ('yakherd FILE [FILE ...] [-o PREFIX]'), the"
+            " given source files are processed."
+        ),
+    )
+    duplicates_cmd = main_cmd.add_subcommand(
+        "duplicates",
+        command_fn=report_duplicates,
+        help="Report files with identical contents.",
+    )
+    duplicates_cmd.add_path_argument(
+        "src_paths",
+        nargs="+",
+        metavar="PATH",
+        is_resolve_paths=True,
+        help="Files or directories (searched recursively) to examine.",
+    )
+    duplicates_cmd.add_argument(
+        "--include",
+        action="append",
+        metavar="PATTERN",
+        help="Only examine files (in directories) matching this glob pattern (repeatable).",
+    )
+    duplicates_cmd.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="Skip files and directories matching this glob pattern (repeatable).",
+    )
+    duplicates_cmd.add_argument(
+        "--min-size",
+        type=int,
+        default=1,
+        metavar="BYTES",
+        help="Ignore files smaller than this [default=%(default)s].",
+    )
+    duplicates_cmd.add_argument(
+        "--algorithm",
+        default=hashing.default_algorithm,
+        help="Hash algorithm [default=%(default)s].",
+    )
+    duplicates_cmd.add_argument(
+        "--num-threads",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of threads used to read and hash files.",
+    )
+    duplicates_cmd.add_path_argument(
+        "-o", "--output",
+        default="-",
+        help="Path to report file [default: standard output].",
+    )
+    return main_cmd.execute(args)
+
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
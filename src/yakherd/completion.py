@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+"""
+Shell completion responder that answers from an index written by
+`CommandParser.write_completion_index` instead of importing the application
+and rebuilding its parser on every keypress.
+
+Deliberately depends on nothing but the standard library modules below so that
+it starts quickly::
+
+    python -m yakherd.completion INDEX-PATH [WORD [WORD ...]]
+
+where the words are the command line words following the program name, up to
+and including the (possibly empty) word being completed. Candidates are
+written to standard output, one per line.
+"""
+
+import json
+import os
+import sys
+
+def default_index_path(prog):
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_dir, prog, "completion-index.json")
+
+def load_index(path):
+    with open(path) as src:
+        return json.load(src)
+
+def complete_path(prefix):
+    dir_path, name_prefix = os.path.split(prefix)
+    try:
+        entries = list(os.scandir(os.path.expanduser(dir_path) or "."))
+    except OSError:
+        return []
+    is_show_hidden = name_prefix.startswith(".")
+    candidates = []
+    for entry in entries:
+        if not entry.name.startswith(name_prefix):
+            continue
+        if entry.name.startswith(".") and not is_show_hidden:
+            continue
+        candidates.append(os.path.join(dir_path, entry.name))
+    return sorted(candidates)
+
+def complete(index, words):
+    """
+    Returns list of completion candidates for the last element of ``words``
+    given the preceding ones.
+    """
+    if not words:
+        words = [""]
+    node = index["tree"]
+    pending_option = None
+    positional_idx = 0
+    is_options_ended = False
+    for word in words[:-1]:
+        if pending_option is not None:
+            pending_option = None
+            continue
+        if word == "--":
+            is_options_ended = True
+            continue
+        if word.startswith("-") and not is_options_ended:
+            option = node["options"].get(word)
+            if option is not None and not option.get("flag"):
+                pending_option = option
+            continue
+        commands = node.get("commands", {})
+        if word in commands and not is_options_ended:
+            node = commands[word]
+            positional_idx = 0
+            continue
+        positional_idx += 1
+    current = words[-1]
+    if pending_option is not None:
+        return _complete_value(pending_option, current)
+    if current.startswith("-") and not is_options_ended:
+        return sorted(o for o in node["options"] if o.startswith(current))
+    candidates = []
+    if not is_options_ended:
+        candidates.extend(
+            sorted(c for c in node.get("commands", {}) if c.startswith(current))
+        )
+    positionals = node.get("positionals", [])
+    if positionals:
+        if positional_idx >= len(positionals) and positionals[-1].get("repeat"):
+            positional_idx = len(positionals) - 1
+        if positional_idx < len(positionals):
+            candidates.extend(_complete_value(positionals[positional_idx], current))
+    return candidates
+
+def _complete_value(argument, current):
+    if argument.get("choices"):
+        return [c for c in argument["choices"] if c.startswith(current)]
+    if argument.get("path"):
+        return complete_path(current)
+    return []
+
+def compose_bash_completion_script(prog, index_path, python_path=None):
+    if python_path is None:
+        python_path = sys.executable
+    fn_name = "_yakherd_complete_{}".format(
+        "".join(c if c.isalnum() else "_" for c in prog)
+    )
+    return "\n".join([
+        "{}() {{".format(fn_name),
+        "    local IFS=$'\\n'",
+        "    COMPREPLY=( $('{}' -m yakherd.completion '{}' \"${{COMP_WORDS[@]:1:COMP_CWORD}}\" 2>/dev/null) )".format(
+            python_path, index_path
+        ),
+        "}",
+        "complete -o filenames -F {} {}".format(fn_name, prog),
+        "",
+    ])
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        sys.stderr.write("usage: python -m yakherd.completion INDEX-PATH [WORD ...]\n")
+        return 2
+    try:
+        index = load_index(argv[0])
+    except (OSError, ValueError):
+        return 1
+    candidates = complete(index, argv[1:])
+    if candidates:
+        sys.stdout.write("\n".join(candidates))
+        sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -35,12 +35,39 @@ import argparse
 import pathlib
 import os
 from yakherd import classlib
+from yakherd import container
 from yakherd import filesystem
+from yakherd import timing
+from yakherd import textprocessing
 
 # Globals {{{1
 default_key_value_assignment_token = ":="
+completion_index_format = 1
 # }}}1 Globals
 
+# Functions {{{1
+_batch_command = None
+
+def _execute_batch_argv(argv):
+    # process pool worker for `CommandParser.execute_batch`: relies on the
+    # command being inherited from the parent through the fork
+    return _batch_command._execute_timed(argv)
+
+def exit_status(code):
+    """
+    Returns the process exit status corresponding to the argument of
+    `sys.exit` (or `SystemExit.code`), writing it to standard error if it is
+    a message (as the interpreter does on exit).
+    """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    import sys
+    sys.stderr.write("{}\n".format(code))
+    return 1
+# }}}1 Functions
+
 # ConsoleStyle {{{1
 
 # Adapted from `click`:
@@ -234,7 +261,7 @@ class CommandParser:
             return dest
         for arg in args:
             if not arg.startswith("-"):
-                return arg[1:].replace("-", "_")
+                return arg.replace("-", "_")
             elif arg.startswith("--"):
                 return arg[2:].replace("-", "_")
         raise ValueError("Unable to predict argument name.")
@@ -249,6 +276,8 @@ class CommandParser:
         **kwargs,
     ):
         parent_command = kwargs.pop("parent_command", None)
+        if parent_command is None:
+            phase_timer = timing.PhaseTimer()
         if parser_fn is None:
             parser_fn = argparse.ArgumentParser
             kwargs["prog"] = name
@@ -274,12 +303,16 @@ class CommandParser:
         self.is_draw_help_tree_edges = True
         self._global_command_context = {}
         self._argument_groups = {}
+        self._path_argument_dests = set()
         self._logger = None
+        self._logger_key = None
         if parent_command:
             for k,v in parent_command._global_command_context.items():
                 self._global_command_context[k] = v
         else:
             self._global_command_context["argument_postprocessing_callbacks"] = {}
+            self._global_command_context["phase_timer"] = phase_timer
+        self._mark_constructed()
 
     @property
     def name(self):
@@ -298,6 +331,15 @@ class CommandParser:
     def _subparser(self):
         return self.parser.add_subparsers(title="Commands")
 
+    @property
+    def phase_timer(self):
+        return self._global_command_context["phase_timer"]
+
+    def _mark_constructed(self):
+        # construction of the command tree ends with the last parser,
+        # subcommand or argument added, not when parsing starts
+        self.phase_timer.mark("construction")
+
     @property
     def _argument_postprocessing_callbacks(self):
         return self._global_command_context["argument_postprocessing_callbacks"]
@@ -319,32 +361,219 @@ class CommandParser:
             **kwargs,
         )
         self.subcommands.append(subcommand)
+        self._mark_constructed()
         return subcommand
 
     def add_argument(self, *args, **kwargs):
-        return self.parser.add_argument(*args, **kwargs)
+        action = self.parser.add_argument(*args, **kwargs)
+        self._mark_constructed()
+        return action
 
     def add_argument_group(self, *args, **kwargs):
-        return self.parser.add_argument_group(*args, **kwargs)
+        group = self.parser.add_argument_group(*args, **kwargs)
+        self._mark_constructed()
+        return group
 
     def default_action(self, **kwargs):
-        if self.command_fn is None:
-            pass
-        else:
-            self.command_fn(**kwargs)
-
-    def parse(self):
-        raw_d = vars(self.parser.parse_args())
-        processed_d = {}
-        for arg_name in raw_d:
-            arg_value = raw_d[arg_name]
-            if arg_name in self._argument_postprocessing_callbacks:
-                callback_fn = self._argument_postprocessing_callbacks[arg_name]
-                arg_value = callback_fn(arg_value)
-                pass
-            processed_d[arg_name] = arg_value
+        try:
+            with self.phase_timer.phase("command"):
+                if self.command_fn is None:
+                    pass
+                elif kwargs.get("__profiling_cpu_path") or kwargs.get("__profiling_memory_path"):
+                    ProfilingConfigurationParser.run_profiled(
+                        fn=self.command_fn,
+                        args_d=kwargs,
+                        logger=self.get_logger(args_d=kwargs),
+                    )
+                else:
+                    self.command_fn(**kwargs)
+        finally:
+            if kwargs.get("__timing_is_report") or kwargs.get("__timing_file_path"):
+                TimingConfigurationParser.report(
+                    phase_timer=self.phase_timer,
+                    args_d=kwargs,
+                    prog=self.name,
+                )
+
+    def parse(self, args=None):
+        phase_timer = self.phase_timer
+        phase_timer.record_mark("construction")
+        with phase_timer.phase("parse"):
+            raw_d = vars(self.parser.parse_args(args))
+            processed_d = {}
+            for arg_name in raw_d:
+                arg_value = raw_d[arg_name]
+                if arg_name in self._argument_postprocessing_callbacks:
+                    callback_fn = self._argument_postprocessing_callbacks[arg_name]
+                    arg_value = callback_fn(arg_value)
+                    pass
+                processed_d[arg_name] = arg_value
+            if "__timing_program_version" in processed_d:
+                # reported instead of `sys.argv`, which does not match for
+                # programmatic or batch invocations
+                if args is None:
+                    import sys
+                    args = sys.argv[1:]
+                processed_d["__timing_argv"] = list(args)
         return processed_d
 
+    def execute(self, args=None):
+        """
+        Parses ``args`` (defaulting to the process command line arguments),
+        dispatches to the `default_action` of the selected (sub)command, and
+        returns the exit status. Calls to `sys.exit` (including those made by
+        the argument parser on errors or for help) are translated into the
+        returned exit status instead of terminating the process.
+
+        If batch options have been attached (`attach_batch_options`) and
+        ``--batch`` is given, the command lines listed in the batch file are
+        executed instead (see `execute_batch`).
+
+        If `enable_completion_index` has been called, the completion index is
+        first regenerated if it is stale.
+        """
+        completion_index = self._global_command_context.get("completion_index", None)
+        if completion_index is not None:
+            try:
+                self.ensure_completion_index(*completion_index)
+            except OSError:
+                # completion is a convenience: never fail the command for it
+                pass
+        batch_options_parser = self._global_command_context.get("batch_options_parser", None)
+        if batch_options_parser is not None:
+            batch_args, _ = batch_options_parser.parse_known_args(args)
+            batch_args_d = vars(batch_args)
+            if batch_args_d["__batch_path"] is not None:
+                return self.execute_batch(
+                    source=batch_args_d["__batch_path"],
+                    max_workers=batch_args_d["__batch_num_jobs"],
+                    summary_path=batch_args_d["__batch_summary_path"],
+                    logger_args_d=self._parse_logger_args(args),
+                )
+        return self._dispatch(args)
+
+    def _dispatch(self, args):
+        try:
+            args_d = self.parse(args)
+            self._cached_args_d = args_d
+            args_d["func"](**args_d)
+        except SystemExit as e:
+            return exit_status(e.code)
+        return 0
+
+    def execute_batch(
+        self,
+        source,
+        max_workers=None,
+        summary_path=None,
+        logger=None,
+        logger_args_d=None,
+    ):
+        """
+        Executes each command line listed in ``source`` (a path, or "-" for
+        standard input; one command line per line, split into arguments
+        following shell quoting rules; blank lines and lines starting with '#'
+        are skipped) in turn, as if each had been passed to `execute`.
+
+        All invocations share this command tree, including the cached logger
+        (see `get_logger`), which is only rebuilt when an invocation gives
+        different logger options from the previous one. If ``max_workers`` is
+        greater than 1, invocations are distributed across a pool of that
+        many processes, forked from the current one.
+
+        Returns 0 if all invocations succeed, and 1 otherwise. The exit status
+        and elapsed time of each invocation is written as a table to
+        ``summary_path`` (if given), and failures are reported through
+        ``logger`` or, if ``logger_args_d`` is given instead, through the
+        logger of this command configured from those parsed arguments.
+        """
+        import shlex
+        global _batch_command
+        with filesystem.file_handle(source) as src:
+            argvs = [
+                shlex.split(line)
+                for line in src
+                if line.strip() and not line.lstrip().startswith("#")
+            ]
+        if max_workers is not None and max_workers > 1 and len(argvs) > 1:
+            import concurrent.futures
+            import multiprocessing
+            _batch_command = self
+            try:
+                with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                ) as executor:
+                    results = list(executor.map(
+                        _execute_batch_argv,
+                        argvs,
+                        chunksize=max(1, len(argvs) // (max_workers * 4)),
+                    ))
+            finally:
+                _batch_command = None
+        else:
+            results = [self._execute_timed(argv) for argv in argvs]
+        summary = []
+        for idx, (argv, (status, elapsed)) in enumerate(zip(argvs, results)):
+            summary.append({
+                "index": idx + 1,
+                "status": status,
+                "seconds": "{:.6f}".format(elapsed),
+                "command": shlex.join(argv),
+            })
+        failed = [row for row in summary if row["status"] != 0]
+        if logger is None and logger_args_d is not None:
+            logger = self.get_logger(args_d=logger_args_d)
+        if summary_path:
+            with filesystem.file_handle(summary_path, "w") as dest:
+                dest.write(textprocessing.format_dict_table(summary))
+                dest.write("\n")
+        if logger is not None:
+            logger.log_info("{} of {} batch invocation(s) succeeded in {:.3f} seconds".format(
+                len(summary) - len(failed),
+                len(summary),
+                sum(elapsed for _, elapsed in results),
+            ))
+            if failed:
+                logger.log_error("Failed batch invocation(s):")
+                logger.log_error(textprocessing.format_dict_table_rows(failed))
+        return 1 if failed else 0
+
+    def _parse_logger_args(self, args):
+        # the logger options on the command line invoking a batch
+        import copy
+        logger_parser = copy.copy(self.logger_configuration_parser).attach_to_parser()
+        logger_args, _ = logger_parser.parse_known_args(args)
+        return vars(logger_args)
+
+    def _execute_timed(self, argv):
+        import time
+        start = time.perf_counter()
+        status = self._dispatch(argv)
+        return status, time.perf_counter() - start
+
+    def serve(
+        self,
+        socket_path,
+        idle_timeout=None,
+        is_fork=False,
+        preload_modules=None,
+    ):
+        """
+        Runs this command as a persistent server listening on the Unix domain
+        socket ``socket_path`` that executes command lines forwarded by
+        `yakherd.daemon.run_client`. See `yakherd.daemon.CommandServer`.
+        """
+        from yakherd import daemon
+        server = daemon.CommandServer(
+            command=self,
+            socket_path=socket_path,
+            idle_timeout=idle_timeout,
+            is_fork=is_fork,
+            preload_modules=preload_modules,
+        )
+        server.serve_forever()
+
     def validate_no_unknown_arguments(self):
         self.parser.parse_args()
 
@@ -371,6 +600,121 @@ class CommandParser:
             #     entries.append(sc.parser.format_usage())
         return entries
 
+    def compose_completion_tree(self):
+        """
+        Returns a (JSON-serializable) description of the options, positional
+        arguments and subcommands of this command and, recursively, of all its
+        subcommands, for use by `yakherd.completion`.
+        """
+        options = {}
+        positionals = []
+        for action in self.parser._actions:
+            if isinstance(action, argparse._SubParsersAction):
+                continue
+            entry = {}
+            if action.dest in self._path_argument_dests:
+                entry["path"] = True
+            if action.choices:
+                entry["choices"] = [str(c) for c in action.choices]
+            if action.option_strings:
+                if action.nargs == 0:
+                    entry["flag"] = True
+                for option_string in action.option_strings:
+                    options[option_string] = entry
+            else:
+                if action.nargs in ("*", "+", argparse.REMAINDER):
+                    entry["repeat"] = True
+                positionals.append(entry)
+        commands = {}
+        for sc in self.subcommands:
+            sc_name = sc.parser.prog.split(" ")[-1]
+            commands[sc_name] = sc.compose_completion_tree()
+        tree = {"options": options}
+        if positionals:
+            tree["positionals"] = positionals
+        if commands:
+            tree["commands"] = commands
+        return tree
+
+    @staticmethod
+    def _compose_completion_tree_digest(tree):
+        import hashlib
+        import json
+        return hashlib.sha1(json.dumps(tree, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def write_completion_index(self, path, version=None, tree=None):
+        """
+        Writes the completion tree of this command to ``path``, tagged with
+        ``version`` and a digest of the tree. The file is replaced atomically,
+        so that a completion request running concurrently never sees a partial
+        index.
+        """
+        import json
+        if tree is None:
+            tree = self.compose_completion_tree()
+        index = {
+            "format": completion_index_format,
+            "version": version,
+            "digest": self._compose_completion_tree_digest(tree),
+            "prog": self.name,
+            "tree": tree,
+        }
+        path = os.fspath(filesystem.expand_path(path))
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "w") as dest:
+            json.dump(index, dest, separators=(",", ":"))
+        os.replace(temp_path, path)
+        return path
+
+    def ensure_completion_index(self, path=None, version=None):
+        """
+        (Re-)writes the completion index at ``path`` (defaulting to a
+        per-program file in the user cache directory) if it does not exist, or
+        was generated for a different ``version`` of the program or from a
+        different parser definition. Returns `True` if the index was
+        (re-)written. Cheap enough to call on every run (see
+        `enable_completion_index`).
+        """
+        from yakherd import completion
+        if path is None:
+            path = completion.default_index_path(self.name)
+        try:
+            index = completion.load_index(path)
+        except (OSError, ValueError):
+            index = None
+        tree = self.compose_completion_tree()
+        if (
+            index is not None
+            and index.get("format") == completion_index_format
+            and index.get("version") == version
+            and index.get("digest") == self._compose_completion_tree_digest(tree)
+        ):
+            return False
+        self.write_completion_index(path=path, version=version, tree=tree)
+        return True
+
+    def enable_completion_index(self, path=None, version=None):
+        """
+        Makes `execute` keep the completion index at ``path`` up to date (see
+        `ensure_completion_index`) on every run, so that it is regenerated
+        whenever the program ``version`` or the parser definition changes.
+        Failures to write the index are ignored.
+        """
+        self._global_command_context["completion_index"] = (path, version)
+
+    def compose_bash_completion_script(self, path=None, python_path=None):
+        from yakherd import completion
+        if path is None:
+            path = completion.default_index_path(self.name)
+        return completion.compose_bash_completion_script(
+            prog=self.name,
+            index_path=path,
+            python_path=python_path,
+        )
+
     @property
     def logger_configuration_parser(self):
         if (
@@ -395,13 +739,52 @@ class CommandParser:
                 self._logger_configuration_parser = LoggerConfigurationParser(name=self.name, **kwargs)
         self.logger_configuration_parser = LoggerConfigurationParser(name=self.name, **kwargs)
         self.logger_configuration_parser.attach(self)
+        self._mark_constructed()
         return self.logger_configuration_parser
 
+    def attach_batch_options(self, **kwargs):
+        batch_configuration_parser = BatchConfigurationParser()
+        batch_configuration_parser.attach(self, **kwargs)
+        self._global_command_context["batch_options_parser"] = batch_configuration_parser.attach_to_parser(
+            parser=argparse.ArgumentParser(add_help=False),
+            batch_parser_group=False,
+        )
+        self._mark_constructed()
+        return batch_configuration_parser
+
+    def attach_timing_options(self, version=None, **kwargs):
+        timing_configuration_parser = TimingConfigurationParser(version=version)
+        timing_configuration_parser.attach(self, **kwargs)
+        self._mark_constructed()
+        return timing_configuration_parser
+
+    def attach_profiling_options(self, **kwargs):
+        profiling_configuration_parser = ProfilingConfigurationParser(name=self.name)
+        profiling_configuration_parser.attach(self, **kwargs)
+        self._mark_constructed()
+        return profiling_configuration_parser
+
     def get_logger(self, args_d=None, **kwargs):
-        if self._logger is None:
-            if args_d is None:
-                args_d = self.args_d
-            self._logger = self.logger_configuration_parser.get_logger(args_d=args_d, **kwargs)
+        """
+        Returns the logger of this command, configured from the logger options
+        in ``args_d`` (defaulting to `args_d`). The logger is cached, and only
+        replaced (with the handlers of the old one removed) if requested with
+        different logger options, as happens across batch invocations.
+        """
+        if args_d is None:
+            args_d = self.args_d
+        elif not isinstance(args_d, dict):
+            args_d = vars(args_d)
+        logger_key = (
+            sorted((k, v) for k, v in args_d.items() if k.startswith("__logging_")),
+            kwargs,
+        )
+        if self._logger is None or self._logger_key != logger_key:
+            if self._logger is not None:
+                self._logger.close()
+            with self.phase_timer.phase("logger"):
+                self._logger = self.logger_configuration_parser.get_logger(args_d=args_d, **kwargs)
+            self._logger_key = logger_key
         return self._logger
 
     def add_path_argument(
@@ -409,7 +792,28 @@ class CommandParser:
         *args,
         **kwargs
     ):
+        """
+        Adds an argument for a path (or, with ``nargs``, paths), that will be
+        expanded when parsed (see `process_path_argument`), falling back to
+        ``environ_var`` if not given.
+
+        If ``is_resolve_paths`` is `True`, the value(s) will further be
+        resolved in bulk (see `filesystem.resolve_paths`): glob patterns
+        expanded (``is_expand_glob``), duplicates removed
+        (``is_dedupe_paths``), and existence (``is_require_exists``) and
+        type (``path_type``, "file" or "dir") validated, with failures
+        reported as usage errors. The parsed value(s) will then be
+        `filesystem.StatPath` objects carrying cached stat results.
+        """
         environ_var = kwargs.pop("environ_var", None)
+        resolve_kwargs = None
+        if kwargs.pop("is_resolve_paths", False):
+            resolve_kwargs = {
+                "is_expand_glob": kwargs.pop("is_expand_glob", True),
+                "is_dedupe": kwargs.pop("is_dedupe_paths", True),
+                "is_require_exists": kwargs.pop("is_require_exists", True),
+                "path_type": kwargs.pop("path_type", None),
+            }
         group = kwargs.pop("group", None)
         group_name = kwargs.pop("group_name", None)
         if group is not None:
@@ -425,12 +829,21 @@ class CommandParser:
             target = self.parser
         if "default" not in kwargs and environ_var:
             kwargs["default"] = os.environ.get(environ_var, None)
-        target.add_argument(*args, **kwargs)
-        key = self.get_arg_var_name(*args, **kwargs)
-        self._argument_postprocessing_callbacks[key] = lambda value: self.process_path_argument(
-            value=value,
-            environ_var=environ_var,
-        )
+        action = target.add_argument(*args, **kwargs)
+        self._path_argument_dests.add(action.dest)
+        if resolve_kwargs is None:
+            callback_fn = lambda value: self.process_path_argument(
+                value=value,
+                environ_var=environ_var,
+            )
+        else:
+            callback_fn = lambda value: self.resolve_path_argument(
+                value=value,
+                environ_var=environ_var,
+                **resolve_kwargs,
+            )
+        self._argument_postprocessing_callbacks[action.dest] = callback_fn
+        self._mark_constructed()
 
     def process_path_argument(
         self,
@@ -443,7 +856,7 @@ class CommandParser:
             return [self.process_path_argument(
                 value=i,
                 environ_var=environ_var,
-                default_path=default_path,
+                fallback_value=fallback_value,
             ) for i in path]
         if not path:
             if environ_var and environ_var in os.environ:
@@ -452,6 +865,89 @@ class CommandParser:
                 path = fallback_value
         return filesystem.expand_path(path)
 
+    def resolve_path_argument(
+        self,
+        value=None,
+        environ_var=None,
+        fallback_value=None,
+        **kwargs
+    ):
+        """
+        As `process_path_argument`, but resolving the path(s) in bulk (see
+        `filesystem.resolve_paths`, to which ``kwargs`` are passed), with
+        failures reported as usage errors. Returns a list of
+        `filesystem.StatPath` objects if ``value`` is a list or tuple, or a
+        single `filesystem.StatPath` (or `None` if there is no value)
+        otherwise.
+        """
+        is_multiple = isinstance(value, list) or isinstance(value, tuple)
+        path = self.process_path_argument(
+            value=value,
+            environ_var=environ_var,
+            fallback_value=fallback_value,
+        )
+        if not path:
+            return path
+        try:
+            resolved = filesystem.resolve_paths(path if is_multiple else [path], **kwargs)
+        except OSError as e:
+            self.parser.error(str(e))
+        if is_multiple:
+            return resolved
+        if len(resolved) != 1:
+            self.parser.error("Expecting a single path but found {}: '{}'".format(len(resolved), path))
+        return resolved[0]
+
+    def build_settings(
+        self,
+        config=None,
+        defaults=None,
+        environ_vars=None,
+        config_keys=None,
+        args_d=None,
+    ):
+        """
+        Builds (once, typically after parsing) and returns a
+        `container.LayeredDict` of settings, also stored as `settings`,
+        resolving each value in order of precedence from:
+
+        -   "cli": the parsed command line arguments (``args_d``, defaulting
+            to `args_d`); note that arguments are only considered given if
+            their value is not `None`, so options that should be able to
+            fall through to lower layers should have a default of `None`.
+        -   "environ": the environment variables given by ``environ_vars``, a
+            mapping of setting keys to environment variable names.
+        -   "config": ``config`` (e.g., a `fileresource.ConfigurationDict`),
+            with keys optionally mapped by ``config_keys``, a mapping of
+            setting keys to configuration keys.
+        -   "defaults": ``defaults``.
+
+        Lookups are then single dictionary lookups, `settings.source(key)`
+        reports the layer that supplied a value, and
+        `settings.set_layer(...)` re-derives values when one layer changes.
+        """
+        if args_d is None:
+            args_d = self.args_d
+        environ_d = {}
+        for key, environ_var in (environ_vars or {}).items():
+            if environ_var in os.environ:
+                environ_d[key] = os.environ[environ_var]
+        if config is None:
+            config = {}
+        elif config_keys:
+            config = {
+                key: config[config_key]
+                for key, config_key in config_keys.items()
+                if config_key in config
+            }
+        self.settings = container.LayeredDict([
+            ("cli", args_d),
+            ("environ", environ_d),
+            ("config", config),
+            ("defaults", defaults if defaults is not None else {}),
+        ])
+        return self.settings
+
     def resolve_value(
         self,
         command_name=None,
@@ -462,13 +958,13 @@ class CommandParser:
         is_require_value=False,
     ):
         val = None
-        if command_name and command_name in self.args_d:
+        if command_name and self.args_d.get(command_name, None) is not None:
             val = self.args_d[command_name]
         elif environ_var and environ_var in os.environ:
             val = os.environ[environ_var]
-        elif config_value:
+        elif config_value is not None:
             val = config_value
-        elif fallback_value:
+        elif fallback_value is not None:
             val = fallback_value
         elif is_require_value:
             raise TypeError("Required value not specified")
@@ -654,6 +1150,252 @@ class LoggerConfigurationParser(AttachableSubParsers):
 
 # }}}1 LoggerConfigurationParser
 
+# ProfilingConfigurationParser {{{1
+
+class ProfilingConfigurationParser(AttachableSubParsers):
+    """
+    Adds options to run the command function of a `CommandParser` (via
+    `CommandParser.default_action`) under a CPU profiler and/or with memory
+    allocations traced. If none of these options are given, the command
+    function is called directly.
+
+    ::
+        import yakherd
+
+        main_cmd = yakherd.CommandParser(name="Foo", command_fn=run)
+        main_cmd.attach_logger_options()
+        main_cmd.attach_profiling_options()
+        args_d = main_cmd.args_d
+        args_d["func"](**args_d)
+
+    and then::
+
+        $ foo --profile foo-cpu.txt --profile-memory foo-memory.txt
+
+    """
+
+    def __init__(
+        self,
+        name="command",
+    ):
+        self.name = name
+
+    def attach_to_parser(
+        self,
+        parser=None,
+        profiling_parser_group=None,
+        profiling_parser_group_name="Profiling Options",
+    ):
+        if parser is None:
+            parser = argparse.ArgumentParser(add_help=False)
+        if profiling_parser_group is None:
+            self.profiling_parser_group = parser.add_argument_group(profiling_parser_group_name)
+        elif profiling_parser_group is False:
+            self.profiling_parser_group = parser
+        else:
+            self.profiling_parser_group = profiling_parser_group
+        self.profiling_parser_group.add_argument(
+            "--profile",
+            metavar="FILE",
+            nargs="?",
+            const="{}-profile.txt".format(self.name.replace(" ", "-")),
+            dest="__profiling_cpu_path",
+            default=None,
+            help="Profile the command and write report to FILE [default = '%(const)s'].",
+        )
+        self.profiling_parser_group.add_argument(
+            "--profile-mode",
+            choices=["deterministic", "sampling"],
+            dest="__profiling_cpu_mode",
+            default="deterministic",
+            help=(
+                "Use deterministic ('cProfile') or (lower overhead) statistical"
+                " sampling profiling [default = %(default)s]."
+            ),
+        )
+        self.profiling_parser_group.add_argument(
+            "--profile-sampling-interval",
+            metavar="SECONDS",
+            type=float,
+            dest="__profiling_sampling_interval",
+            default=0.005,
+            help="Interval between stack samples in sampling mode [default = %(default)s].",
+        )
+        self.profiling_parser_group.add_argument(
+            "--profile-memory",
+            metavar="FILE",
+            nargs="?",
+            const="{}-memory-profile.txt".format(self.name.replace(" ", "-")),
+            dest="__profiling_memory_path",
+            default=None,
+            help="Trace memory allocations and write report to FILE [default = '%(const)s'].",
+        )
+        self.profiling_parser_group.add_argument(
+            "--profile-top",
+            metavar="N",
+            type=int,
+            dest="__profiling_num_top",
+            default=20,
+            help="Number of entries of profile reports to log [default = %(default)s].",
+        )
+        return parser
+
+    @staticmethod
+    def run_profiled(fn, args_d, logger=None):
+        from yakherd import profiling
+        if not hasattr(args_d, "__get__") and not isinstance(args_d, dict):
+            args_d = vars(args_d)
+        return profiling.run_profiled(
+            fn=fn,
+            kwargs=args_d,
+            cpu_path=args_d.get("__profiling_cpu_path", None),
+            cpu_mode=args_d.get("__profiling_cpu_mode", "deterministic"),
+            memory_path=args_d.get("__profiling_memory_path", None),
+            num_top=args_d.get("__profiling_num_top", 20),
+            sampling_interval=args_d.get("__profiling_sampling_interval", 0.005),
+            logger=logger,
+        )
+
+# }}}1 ProfilingConfigurationParser
+
+# BatchConfigurationParser {{{1
+
+class BatchConfigurationParser(AttachableSubParsers):
+    """
+    Adds options to run many command lines listed in a file in a single
+    process (see `CommandParser.execute_batch`). Only effective when the
+    command is run through `CommandParser.execute`.
+
+    ::
+        $ foo --batch invocations.txt --batch-jobs 8 --batch-summary summary.txt
+
+    where "invocations.txt" has lines such as::
+
+        --output-prefix a a1.txt a2.txt
+        --output-prefix b b1.txt
+
+    """
+
+    def attach_to_parser(
+        self,
+        parser=None,
+        batch_parser_group=None,
+        batch_parser_group_name="Batch Options",
+    ):
+        if parser is None:
+            parser = argparse.ArgumentParser(add_help=False)
+        if batch_parser_group is None:
+            self.batch_parser_group = parser.add_argument_group(batch_parser_group_name)
+        elif batch_parser_group is False:
+            self.batch_parser_group = parser
+        else:
+            self.batch_parser_group = batch_parser_group
+        self.batch_parser_group.add_argument(
+            "--batch",
+            metavar="FILE",
+            dest="__batch_path",
+            default=None,
+            help=(
+                "Instead of running a single command, run each of the command"
+                " lines (arguments, one invocation per line) in FILE ('-' for"
+                " standard input)."
+            ),
+        )
+        self.batch_parser_group.add_argument(
+            "--batch-jobs",
+            metavar="N",
+            type=int,
+            dest="__batch_num_jobs",
+            default=None,
+            help="Run batch invocations across a pool of N processes.",
+        )
+        self.batch_parser_group.add_argument(
+            "--batch-summary",
+            metavar="FILE",
+            dest="__batch_summary_path",
+            default=None,
+            help="Write exit status and elapsed time of each batch invocation to FILE.",
+        )
+        return parser
+
+# }}}1 BatchConfigurationParser
+
+# TimingConfigurationParser {{{1
+
+class TimingConfigurationParser(AttachableSubParsers):
+    """
+    Adds options to report the time spent in each phase of a run of a
+    `CommandParser` command: interpreter startup (up to the import of
+    `yakherd`), imports, construction of the command parser tree, parsing of
+    the command line (including argument postprocessing), logger construction,
+    and the command itself. The timings are always collected by the
+    `CommandParser.phase_timer`; these options only control reporting, which
+    happens after the command function (called via
+    `CommandParser.default_action`) returns.
+
+    ``version``, if given, is included in the records written by
+    ``--timings-file``, so that startup regressions can be tracked across
+    releases.
+    """
+
+    def __init__(
+        self,
+        version=None,
+    ):
+        self.version = version
+
+    def attach_to_parser(
+        self,
+        parser=None,
+        timing_parser_group=None,
+        timing_parser_group_name="Timing Options",
+    ):
+        if parser is None:
+            parser = argparse.ArgumentParser(add_help=False)
+        if timing_parser_group is None:
+            self.timing_parser_group = parser.add_argument_group(timing_parser_group_name)
+        elif timing_parser_group is False:
+            self.timing_parser_group = parser
+        else:
+            self.timing_parser_group = timing_parser_group
+        self.timing_parser_group.add_argument(
+            "--timings",
+            action="store_true",
+            dest="__timing_is_report",
+            default=False,
+            help="Report time spent in each phase of the run to standard error.",
+        )
+        self.timing_parser_group.add_argument(
+            "--timings-file",
+            metavar="FILE",
+            dest="__timing_file_path",
+            default=None,
+            help="Append time spent in each phase of the run as a JSON record to FILE.",
+        )
+        parser.set_defaults(__timing_program_version=self.version)
+        return parser
+
+    @staticmethod
+    def report(phase_timer, args_d, prog=None, out=None):
+        import sys
+        from yakherd import textprocessing
+        if not hasattr(args_d, "__get__") and not isinstance(args_d, dict):
+            args_d = vars(args_d)
+        if args_d.get("__timing_is_report"):
+            if out is None:
+                out = sys.stderr
+            out.write(textprocessing.format_dict_table(phase_timer.rows()))
+            out.write("\n")
+        if args_d.get("__timing_file_path"):
+            phase_timer.append_json(
+                args_d["__timing_file_path"],
+                prog=prog,
+                version=args_d.get("__timing_program_version", None),
+                argv=args_d.get("__timing_argv", sys.argv[1:]),
+            )
+
+# }}}1 TimingConfigurationParser
+
 # PathParser {{{1
 
 class PathParser(AttachableSubParsers):
@@ -32,19 +32,301 @@
 
 import heapq
 import collections
+import collections.abc
 
 
-def flatten_dict(d, separator=".", parent_key=""):
-    items = []
-    for k, v in d.items():
-        new_key = str(parent_key) + separator + str(k) if parent_key else str(k)
-        if v and isinstance(v, collections.MutableMapping):
-            items.extend(
-                flatten_dict(v, separator=separator, parent_key=parent_key).items()
-            )
+def iter_flatten_dict(d, separator=".", parent_key="", is_tuple_keys=False):
+    """
+    Yields ``(key, value)`` for each leaf of the nested mapping ``d``, in
+    depth-first order, where ``key`` is the path to the leaf: either the
+    (string representations of the) keys along the path joined by
+    ``separator``, or, if ``is_tuple_keys`` is `True`, a tuple of the keys
+    (with ``parent_key``, if given, a tuple prefix). Empty mappings are
+    leaves. Iterative, so the depth of ``d`` is not limited by the recursion
+    limit, and no intermediate dictionaries are built.
+    """
+    if is_tuple_keys:
+        path = list(parent_key) if parent_key else []
+    else:
+        path = [str(parent_key)] if parent_key else []
+    # the path components are only joined for leaves, so that deep documents
+    # do not build a (quadratic) series of intermediate keys
+    stack = [iter(d.items())]
+    while stack:
+        for k, v in stack[-1]:
+            if v and isinstance(v, collections.abc.Mapping):
+                path.append(k if is_tuple_keys else str(k))
+                stack.append(iter(v.items()))
+                break
+            if is_tuple_keys:
+                yield tuple(path) + (k,), v
+            elif path:
+                yield separator.join(path) + separator + str(k), v
+            else:
+                yield str(k), v
         else:
-            items.append((new_key, v))
-    return dict(items)
+            stack.pop()
+            if stack:
+                path.pop()
+
+def flatten_dict(d, separator=".", parent_key="", is_tuple_keys=False):
+    """
+    Returns a flat dictionary mapping the paths to the leaves of the nested
+    mapping ``d`` to their values (see `iter_flatten_dict`).
+    """
+    return dict(iter_flatten_dict(
+        d,
+        separator=separator,
+        parent_key=parent_key,
+        is_tuple_keys=is_tuple_keys,
+    ))
+
+def unflatten_dict(items, separator="."):
+    """
+    Inverse of `flatten_dict`: returns a nested dictionary built from
+    ``items`` (a mapping or iterable of ``(key, value)`` pairs), where each
+    key is either a tuple path or a string path with components separated by
+    ``separator``. Raises `ValueError` if a path runs through a leaf.
+    """
+    if isinstance(items, collections.abc.Mapping):
+        items = items.items()
+    root = {}
+    # ids of the dictionaries built here, as opposed to leaf values
+    nodes = {id(root)}
+    for key, value in items:
+        path = key if isinstance(key, tuple) else key.split(separator)
+        node = root
+        for part in path[:-1]:
+            child = node.get(part)
+            if child is None and part not in node:
+                child = {}
+                nodes.add(id(child))
+                node[part] = child
+            elif id(child) not in nodes:
+                raise ValueError("Path runs through a leaf: {!r}".format(key))
+            node = child
+        if path[-1] in node and id(node[path[-1]]) in nodes:
+            raise ValueError("Leaf conflicts with a path: {!r}".format(key))
+        if isinstance(value, collections.abc.Mapping) and not value:
+            # an empty mapping leaf may later be extended by other paths
+            value = {}
+            nodes.add(id(value))
+        node[path[-1]] = value
+    return root
+
+
+class LayeredDict(collections.abc.Mapping):
+    """
+    A read-only merged view of a stack of named mappings ("layers"), listed
+    from highest to lowest precedence: the value for a key is taken from the
+    first layer that has it (ignoring `None` values if ``is_skip_none`` is
+    `True`, so that, e.g., unspecified command-line options do not mask
+    lower layers, while other "falsy" values such as 0 or "" do).
+
+    The merged view is precomputed, so lookups cost a single dictionary
+    lookup regardless of the number of layers, and the layer that supplied
+    each value is tracked (`source`). Layers are held by reference, not
+    copied. When a layer changes, only the keys in that layer are re-derived
+    (`set_layer`). `overlay` derives a new view that stores only the keys in
+    the old or new version of the replaced layer, and looks up all other
+    keys in this view (much like a `collections.ChainMap`), so it costs time
+    proportional to the size of that layer rather than of the whole view.
+
+    ::
+
+        settings = LayeredDict([
+            ("cli", args_d),
+            ("environ", environ_d),
+            ("config", config_d),
+            ("defaults", defaults_d),
+        ])
+        settings["num_threads"]
+        settings.source("num_threads") # e.g., "environ"
+
+    """
+
+    # marks keys that an overlay resolves to no value, masking the parent
+    _absent = object()
+
+    def __init__(self, layers=None, is_skip_none=True):
+        self.is_skip_none = is_skip_none
+        self._parent = None
+        self._layer_names = []
+        self._layers = {}
+        self._layer_keys = {}
+        self._merged = {}
+        self._sources = {}
+        for name, mapping in layers or []:
+            if name in self._layers:
+                raise ValueError("Duplicate layer name: '{}'".format(name))
+            self._layer_names.append(name)
+            self._layers[name] = mapping
+            self._layer_keys[name] = frozenset(mapping)
+        # fill from the lowest precedence layer up, so that each key is
+        # written once per layer that has it
+        for name in reversed(self._layer_names):
+            mapping = self._layers[name]
+            for key in self._layer_keys[name]:
+                value = mapping[key]
+                if self.is_skip_none and value is None:
+                    continue
+                self._merged[key] = value
+                self._sources[key] = name
+
+    def __getitem__(self, key):
+        if self._parent is None:
+            return self._merged[key]
+        return self._lookup(key)[0]
+
+    def __contains__(self, key):
+        if self._parent is None:
+            return key in self._merged
+        try:
+            self._lookup(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        if self._parent is None:
+            return iter(self._merged)
+        return self._iter_chained()
+
+    def __len__(self):
+        if self._parent is None:
+            return len(self._merged)
+        return sum(1 for _ in self._iter_chained())
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, dict(self))
+
+    def _lookup(self, key):
+        # returns ``(value, source)``
+        try:
+            value = self._merged[key]
+        except KeyError:
+            if self._parent is None:
+                raise
+            value, source = self._parent._lookup(key)
+            if source in self._layers:
+                # supplied by a layer that this view replaced
+                return self._resolve(key)
+            return value, source
+        if value is self._absent:
+            raise KeyError(key)
+        return value, self._sources[key]
+
+    def _resolve(self, key):
+        # returns ``(value, source)`` from the layers, ignoring the merged view
+        for name in self._layer_names:
+            mapping, keys = self._layer_entry(name)
+            if key not in keys:
+                continue
+            value = mapping[key]
+            if self.is_skip_none and value is None:
+                continue
+            return value, name
+        raise KeyError(key)
+
+    def _layer_entry(self, name):
+        # returns ``(mapping, keys)`` of the layer ``name``: an overlay only
+        # holds the layers it replaced, and shares the others with its parent
+        if name in self._layers:
+            return self._layers[name], self._layer_keys[name]
+        if self._parent is None:
+            raise KeyError(name)
+        return self._parent._layer_entry(name)
+
+    def _iter_chained(self):
+        for key, value in self._merged.items():
+            if value is not self._absent:
+                yield key
+        for key in self._parent:
+            if key in self._merged:
+                continue
+            try:
+                self._lookup(key)
+            except KeyError:
+                continue
+            yield key
+
+    @property
+    def layer_names(self):
+        return list(self._layer_names)
+
+    def layer(self, name):
+        return self._layer_entry(name)[0]
+
+    def source(self, key):
+        """
+        Returns the name of the layer that supplied the value for ``key``.
+        """
+        if self._parent is None:
+            return self._sources[key]
+        return self._lookup(key)[1]
+
+    def sources(self):
+        """
+        Returns a mapping of each key to the name of the layer that supplied
+        its value.
+        """
+        if self._parent is None:
+            return dict(self._sources)
+        return {key: self.source(key) for key in self}
+
+    def set_layer(self, name, mapping=None):
+        """
+        Replaces the layer ``name`` by ``mapping`` (or, if not given,
+        re-reads it after it has been modified in place), re-deriving only the
+        keys in the old or new version of the layer.
+        """
+        if name not in self._layer_names:
+            raise KeyError(name)
+        old_mapping, old_keys = self._layer_entry(name)
+        if mapping is None:
+            mapping = old_mapping
+        changed_keys = old_keys | frozenset(mapping)
+        self._layers[name] = mapping
+        self._layer_keys[name] = frozenset(mapping)
+        for key in changed_keys:
+            self._rederive(key)
+
+    def overlay(self, name, mapping):
+        """
+        Returns a new view with the layer ``name`` replaced by ``mapping``,
+        sharing all other layers with this one. The new view only stores the
+        values of the keys in the old or new version of the layer, and falls
+        back to this view for all other keys (except where a value would come
+        from the replaced layer of this view, which is then resolved from the
+        layers of the new view instead). Later changes to the other layers of
+        this view (through `set_layer`) thus show through in the new view.
+        """
+        if name not in self._layer_names:
+            raise KeyError(name)
+        derived = self.__class__.__new__(self.__class__)
+        derived.__dict__.update(self.__dict__)
+        derived._parent = self
+        derived._layer_names = self._layer_names
+        derived._layers = {}
+        derived._layer_keys = {}
+        derived._merged = {}
+        derived._sources = {}
+        derived.set_layer(name, mapping)
+        return derived
+
+    def _rederive(self, key):
+        try:
+            value, name = self._resolve(key)
+        except KeyError:
+            if self._parent is None:
+                self._merged.pop(key, None)
+                self._sources.pop(key, None)
+            else:
+                self._merged[key] = self._absent
+                self._sources[key] = None
+            return
+        self._merged[key] = value
+        self._sources[key] = name
 
 
 class ObjectHeap:
@@ -0,0 +1,308 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+"""
+Warm server ("daemon") mode for `CommandParser` applications.
+
+A `CommandServer` keeps the interpreter, the imported modules and the
+`CommandParser` tree of an application loaded, and executes command lines
+forwarded to it over a Unix domain socket by a thin client::
+
+    # server
+    main_cmd = build_command_tree()
+    main_cmd.serve("/run/user/1000/foo.sock", idle_timeout=600)
+
+    # client: forwards its arguments, environment, working directory and
+    # standard streams, and exits with the exit status of the command
+    $ python -m yakherd.daemon /run/user/1000/foo.sock [ARGS ...]
+
+The client side of this module only depends on the standard library modules
+imported below, so that it starts quickly.
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+
+_header_format = "!I"
+_status_format = "!i"
+_standard_stream_fds = (0, 1, 2)
+
+def _flush_standard_streams():
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (AttributeError, OSError, ValueError):
+            pass
+
+# Client {{{1
+
+def run_client(socket_path, argv=None):
+    """
+    Forwards ``argv`` (defaulting to the arguments of the current process),
+    along with the environment, working directory and standard streams of the
+    current process to the server listening on ``socket_path``, waits for the
+    command to complete, and returns its exit status.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    payload = json.dumps({
+        "argv": list(argv),
+        "env": dict(os.environ),
+        "cwd": os.getcwd(),
+    }).encode("utf-8")
+    for stream in (sys.stdout, sys.stderr):
+        stream.flush()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(os.fspath(socket_path))
+        socket.send_fds(
+            sock,
+            [struct.pack(_header_format, len(payload))],
+            list(_standard_stream_fds),
+        )
+        sock.sendall(payload)
+        data = _receive_exactly(sock, struct.calcsize(_status_format))
+    if data is None:
+        raise ConnectionError("Server closed connection without reporting exit status")
+    return struct.unpack(_status_format, data)[0]
+
+def _receive_exactly(sock, num_bytes):
+    chunks = []
+    while num_bytes > 0:
+        chunk = sock.recv(num_bytes)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        num_bytes -= len(chunk)
+    return b"".join(chunks)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        sys.stderr.write("usage: python -m yakherd.daemon SOCKET-PATH [ARG ...]\n")
+        return 2
+    try:
+        return run_client(argv[0], argv[1:])
+    except OSError as e:
+        sys.stderr.write("Failed to run command on server at '{}': {}\n".format(argv[0], e))
+        return 1
+
+# }}}1 Client
+
+# CommandServer {{{1
+
+class CommandServer:
+    """
+    Executes command lines received from `run_client` using the (already
+    constructed) ``command`` (a `CommandParser`), via
+    `CommandParser.execute`.
+
+    If ``is_fork`` is `True`, each request is executed in a child process
+    forked from the server, so that requests are isolated from each other and
+    can run concurrently. Otherwise, requests are executed one at a time in the
+    server process itself, with the standard streams, working directory,
+    environment and `sys.argv` of the server temporarily switched to those of
+    the client. This saves the cost of the fork, but any state modified by the
+    command (including the cached logger of the command) persists across
+    requests.
+
+    If ``idle_timeout`` is given, the server exits after that many seconds
+    without requests (and with no requests in progress).
+
+    ``preload_modules`` is a list of names of modules to import before
+    serving, in addition to those already imported by the application.
+    """
+
+    def __init__(
+        self,
+        command,
+        socket_path,
+        idle_timeout=None,
+        is_fork=False,
+        preload_modules=None,
+    ):
+        self.command = command
+        self.socket_path = os.fspath(socket_path)
+        self.idle_timeout = idle_timeout
+        self.is_fork = is_fork
+        self.preload_modules = preload_modules
+        self._children = set()
+        self._listener = None
+
+    def serve_forever(self):
+        import importlib
+        import time
+        for module_name in self.preload_modules or []:
+            importlib.import_module(module_name)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._listener.bind(self.socket_path)
+            os.chmod(self.socket_path, 0o600)
+            self._listener.listen()
+            if self.idle_timeout is not None or self.is_fork:
+                self._listener.settimeout(min(self.idle_timeout or 1.0, 1.0))
+            last_activity_time = time.monotonic()
+            while True:
+                try:
+                    conn, _ = self._listener.accept()
+                except socket.timeout:
+                    self._reap_children()
+                    if (
+                        self.idle_timeout is not None
+                        and not self._children
+                        and time.monotonic() - last_activity_time >= self.idle_timeout
+                    ):
+                        break
+                    continue
+                conn.settimeout(None)
+                with conn:
+                    self._handle_connection(conn)
+                self._reap_children()
+                last_activity_time = time.monotonic()
+        finally:
+            self._listener.close()
+            self._listener = None
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def _handle_connection(self, conn):
+        header_size = struct.calcsize(_header_format)
+        data, fds, _, _ = socket.recv_fds(conn, header_size, len(_standard_stream_fds))
+        try:
+            if len(fds) != len(_standard_stream_fds):
+                return
+            if len(data) < header_size:
+                rest = _receive_exactly(conn, header_size - len(data))
+                if rest is None:
+                    return
+                data += rest
+            payload = _receive_exactly(conn, struct.unpack(_header_format, data)[0])
+            if payload is None:
+                return
+            request = json.loads(payload.decode("utf-8"))
+            if self.is_fork:
+                self._execute_in_child(conn, request, fds)
+            else:
+                status = self._execute_in_process(request, fds)
+                self._send_status(conn, status)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def _execute_in_child(self, conn, request, fds):
+        # (so that output buffered by the server is not written by the child)
+        _flush_standard_streams()
+        pid = os.fork()
+        if pid:
+            self._children.add(pid)
+            return
+        status = 1
+        try:
+            self._listener.close()
+            for target_fd, fd in zip(_standard_stream_fds, fds):
+                os.dup2(fd, target_fd)
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["env"])
+            sys.argv = [self.command.name] + request["argv"]
+            status = self._execute(request["argv"])
+            # `os._exit` does not flush: output must reach the client before
+            # it is told the command has finished
+            _flush_standard_streams()
+            self._send_status(conn, status)
+        finally:
+            _flush_standard_streams()
+            os._exit(status & 0xFF)
+
+    def _execute_in_process(self, request, fds):
+        _flush_standard_streams()
+        saved_fds = [os.dup(fd) for fd in _standard_stream_fds]
+        saved_cwd = os.getcwd()
+        saved_environ = dict(os.environ)
+        saved_argv = sys.argv
+        saved_stdin = sys.stdin
+        try:
+            for target_fd, fd in zip(_standard_stream_fds, fds):
+                os.dup2(fd, target_fd)
+            # discard anything read ahead from the standard input of a
+            # previous request
+            sys.stdin = open(0, "r", closefd=False)
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["env"])
+            sys.argv = [self.command.name] + request["argv"]
+            return self._execute(request["argv"])
+        finally:
+            _flush_standard_streams()
+            sys.stdin = saved_stdin
+            sys.argv = saved_argv
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            os.chdir(saved_cwd)
+            for target_fd, fd in zip(_standard_stream_fds, saved_fds):
+                os.dup2(fd, target_fd)
+                os.close(fd)
+
+    def _execute(self, argv):
+        try:
+            return self.command.execute(argv)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            return 1
+
+    def _send_status(self, conn, status):
+        try:
+            conn.sendall(struct.pack(_status_format, status))
+        except OSError:
+            pass
+
+    def _reap_children(self):
+        for pid in list(self._children):
+            try:
+                reaped_pid, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                reaped_pid = pid
+            if reaped_pid:
+                self._children.discard(pid)
+
+# }}}1 CommandServer
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -33,11 +33,148 @@
 
 from yakherd import container
 from yakherd import filesystem
+import collections.abc
 import configparser
+import errno
 import json
+import os
+import re
+import threading
 
 # ConfigurationDict {{{1
 
+_missing = object()
+
+class _KeyNode:
+    """
+    Node of the key index of a `ConfigurationDict`: ``children`` maps each
+    next key component to its node, and ``key`` is the flat key of the entry
+    at this path, if any.
+    """
+
+    __slots__ = ("children", "key")
+
+    def __init__(self):
+        self.children = {}
+        self.key = None
+
+class _ConfigurationSource:
+
+    def __init__(self, path, file_type, kwargs, signature, keys):
+        self.path = path
+        self.file_type = file_type
+        self.kwargs = kwargs
+        self.signature = signature
+        self.keys = keys
+
+def _stat_signature(path):
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+_json_whitespace_re = re.compile(rb"[ \t\n\r]*")
+_json_string_re = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_json_scalar_re = re.compile(rb'"(?:[^"\\]|\\.)*"|[^,}\] \t\n\r]+', re.DOTALL)
+# everything up to the next bracket, skipping over strings
+_json_skip_re = re.compile(rb'(?:[^"{}\[\]]+|"(?:[^"\\]|\\.)*")*', re.DOTALL)
+
+def _index_json_members(data):
+    """
+    Returns a list of ``(name, start, end)`` tuples giving the byte range of
+    the value of each member of the top-level JSON object in ``data``
+    (`bytes` or a buffer), scanning (with regular expressions) over, but not
+    decoding, the values.
+    """
+    def _skip_whitespace(pos):
+        return _json_whitespace_re.match(data, pos).end()
+    def _error(message, pos):
+        return json.JSONDecodeError(message, bytes(data[pos:pos + 32]).decode("utf-8", "replace"), 0)
+    pos = _skip_whitespace(0)
+    if data[pos:pos + 1] != b"{":
+        raise _error("Expecting top-level object", pos)
+    pos = _skip_whitespace(pos + 1)
+    members = []
+    if data[pos:pos + 1] == b"}":
+        return members
+    while True:
+        m = _json_string_re.match(data, pos)
+        if m is None:
+            raise _error("Expecting member name", pos)
+        name = json.loads(m.group())
+        pos = _skip_whitespace(m.end())
+        if data[pos:pos + 1] != b":":
+            raise _error("Expecting ':' delimiter", pos)
+        pos = _skip_whitespace(pos + 1)
+        start = pos
+        if data[pos:pos + 1] in (b"{", b"["):
+            depth = 0
+            while True:
+                c = data[pos:pos + 1]
+                if not c:
+                    raise _error("Unterminated value", start)
+                if c in (b"{", b"["):
+                    depth += 1
+                elif c in (b"}", b"]"):
+                    depth -= 1
+                pos += 1
+                if depth == 0:
+                    break
+                pos = _json_skip_re.match(data, pos).end()
+        else:
+            m = _json_scalar_re.match(data, pos)
+            if m is None:
+                raise _error("Expecting value", pos)
+            pos = m.end()
+        members.append((name, start, pos))
+        pos = _skip_whitespace(pos)
+        c = data[pos:pos + 1]
+        if c == b"}":
+            return members
+        if c != b",":
+            raise _error("Expecting ',' delimiter", pos)
+        pos = _skip_whitespace(pos + 1)
+
+_ini_section_re = re.compile(rb"^\[([^\]\r\n]+)\][ \t]*\r?$", re.MULTILINE)
+
+def _index_ini_sections(data):
+    """
+    Returns a list of ``(name, start, end)`` tuples giving the byte range of
+    the body of each section (with an unindented header) in ``data``.
+    """
+    sections = []
+    matches = list(_ini_section_re.finditer(data))
+    for m, next_m in zip(matches, matches[1:] + [None]):
+        end = next_m.start() if next_m is not None else len(data)
+        sections.append((m.group(1).decode("utf-8"), m.end() + 1, end))
+    return sections
+
+class ConfigurationDiff:
+    """
+    Key-level differences between two states of a `ConfigurationDict`:
+    ``added`` and ``removed`` map flat keys to their new and old values
+    respectively, and ``changed`` maps flat keys to ``(old, new)`` values.
+    ``paths`` lists the source files that were re-read.
+    """
+
+    def __init__(self):
+        self.added = {}
+        self.removed = {}
+        self.changed = {}
+        self.paths = []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return "{}(added={!r}, removed={!r}, changed={!r})".format(
+            self.__class__.__name__,
+            self.added,
+            self.removed,
+            self.changed,
+        )
+
 class ConfigurationDict(container.AttributeSetterDict):
 
     """
@@ -55,54 +192,584 @@ class ConfigurationDict(container.AttributeSetterDict):
                 }
             will become:
                 {"d1.da": 1}
+    -   Values are stored once, under their flat keys. A trie-style index of
+        the key paths supports lookups by path components (``config["d1",
+        "da"]``, ``config.get("d1", "da")``; as before, the components are
+        joined by the separator, so they may contain it themselves), views
+        of subtrees (`subtree`) and sorted iteration over all the entries
+        under a prefix (`iter_prefix`). The nested structure is derived from
+        the index on demand (`_raw_d`). The index is only built (in a single
+        pass over the keys) when first needed, and then maintained as keys
+        are added or removed, so that reading files and plain lookups by flat
+        key do not pay for it.
+    -   Files read are tracked, so that changes to them can be applied
+        incrementally (`reload_changed`, or `watch` to poll in the
+        background), with subscribers notified of the key-level differences
+        (`subscribe`).
     """
 
     # init {{{2
-    def __init__(self):
-        super().__init__(self)
+    def __init__(self, cache_dir=None):
+        super().__init__()
         self.dict_path_separator = "."
-        self._raw_d = {}
+        self.cache_dir = cache_dir
+        # built on first use (see `_get_key_index`)
+        self._key_index = None
+        self._config_sources = []
+        self._lazy_sections = {}
+        self._subscribers = []
+        self._reload_lock = threading.RLock()
+        self._watch_thread = None
+        self._watch_stop_event = None
     # }}}2 init
 
+    # key index {{{2
+    def _get_key_index(self):
+        if self._key_index is None:
+            self._key_index = _KeyNode()
+            for key in dict.keys(self):
+                self._index_key(key)
+        return self._key_index
+
+    def _index_key(self, key):
+        node = self._key_index
+        for part in str(key).split(self.dict_path_separator):
+            try:
+                node = node.children[part]
+            except KeyError:
+                node = node.children.setdefault(part, _KeyNode())
+        node.key = key
+
+    def _unindex_key(self, key):
+        if self._key_index is None:
+            return
+        nodes = [self._key_index]
+        parts = str(key).split(self.dict_path_separator)
+        for part in parts:
+            node = nodes[-1].children.get(part)
+            if node is None:
+                return
+            nodes.append(node)
+        nodes[-1].key = None
+        # prune nodes that no longer lead to any entries
+        for part, parent, node in zip(reversed(parts), reversed(nodes[:-1]), reversed(nodes[1:])):
+            if node.key is not None or node.children:
+                break
+            del parent.children[part]
+
+    def _split_path(self, path):
+        # joined and split again, so that components may themselves contain
+        # separators (``config["d1.da", "x"]`` is ``config["d1.da.x"]``)
+        if not path:
+            return ()
+        return self.dict_path_separator.join(str(part) for part in path).split(self.dict_path_separator)
+
+    def _find_node(self, path):
+        node = self._get_key_index()
+        for part in self._split_path(path):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def _resolve_key(self, args):
+        if len(args) == 1:
+            path = args[0]
+            if not isinstance(path, tuple):
+                if self._lazy_sections:
+                    self._load_lazy_key(path)
+                return path
+        else:
+            path = args
+        path = self._split_path(path)
+        if self._lazy_sections and path:
+            self._load_lazy_section(path[0])
+        node = self._find_node(path)
+        if node is None or node.key is None:
+            raise KeyError(self.dict_path_separator.join(str(part) for part in path))
+        return node.key
+
+    def __setitem__(self, key, value):
+        if self._lazy_sections:
+            self._load_lazy_key(key)
+        self._store(key, value)
+
+    def _store(self, key, value):
+        if self._key_index is not None and not super().__contains__(key):
+            self._index_key(key)
+        super().__setitem__(key, value)
+
+    def _store_all(self, items):
+        if self._key_index is not None:
+            for key in items:
+                if not super().__contains__(key):
+                    self._index_key(key)
+        super().update(items)
+
+    def __delitem__(self, key):
+        if self._lazy_sections:
+            self._load_lazy_key(key)
+        super().__delitem__(key)
+        self._unindex_key(key)
+
+    def __contains__(self, key):
+        if self._lazy_sections:
+            self._load_lazy_key(key)
+        return super().__contains__(key)
+
+    def update(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and type(args[0]) is dict:
+            items = args[0]
+        else:
+            items = dict(*args, **kwargs)
+        if self._lazy_sections:
+            for key in items:
+                self._load_lazy_key(key)
+        self._store_all(items)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    def pop(self, key, default=_missing):
+        if key in self:
+            value = super().pop(key)
+            self._unindex_key(key)
+            return value
+        if default is _missing:
+            raise KeyError(key)
+        return default
+
+    def popitem(self):
+        self._load_lazy_sections()
+        key, value = super().popitem()
+        self._unindex_key(key)
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._key_index = None
+        self._lazy_sections = {}
+
+    def subtree(self, *path):
+        """
+        Returns a (read-only, live) view of the entries under ``path``, with
+        keys relative to it. Nothing is copied.
+        """
+        path = self._split_path(path)
+        self._load_lazy_sections(path[:1])
+        node = self._find_node(path)
+        if node is None:
+            raise KeyError(self.dict_path_separator.join(str(part) for part in path))
+        return ConfigurationView(self, node, path)
+
+    def iter_prefix(self, *path):
+        """
+        Yields ``(key, value)`` for all entries under ``path`` (including the
+        entry at ``path`` itself, if any), in sorted order of their key paths.
+        """
+        path = self._split_path(path)
+        self._load_lazy_sections(path[:1])
+        node = self._find_node(path)
+        if node is None:
+            return
+        for key in self._iter_node_keys(node):
+            yield key, super().__getitem__(key)
+
+    @staticmethod
+    def _iter_node_keys(node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.key is not None:
+                yield node.key
+            stack.extend(
+                node.children[part] for part in sorted(node.children, reverse=True)
+            )
+
+    @property
+    def _raw_d(self):
+        """
+        The entries as a nested dictionary (derived from the key index; values
+        are not copied).
+
+        Note that this is not the raw data as read: it is composed from
+        the flat keys, so keys containing the separator are nested (``{"a.b":
+        1}`` as read becomes ``{"a": {"b": 1}}``), entries set or deleted
+        after reading are reflected, and a key that is both an entry and a
+        prefix of other keys (``"a"`` and ``"a.b"``) only appears with the
+        entries under it.
+        """
+        self._load_lazy_sections()
+        def _compose(node):
+            d = {}
+            for part, child in node.children.items():
+                if child.children:
+                    d[part] = _compose(child)
+                else:
+                    d[part] = super(ConfigurationDict, self).__getitem__(child.key)
+            return d
+        return _compose(self._get_key_index())
+    # }}}2 key index
+
     # reading/parsing {{{2
-    def read(self, path, file_type, **kwargs):
+    def read(self, path, file_type, is_lazy=False, **kwargs):
+        """
+        Reads and flattens data from ``path``, of ``file_type`` ("json" or
+        "ini"), with ``kwargs`` passed to the parser.
+
+        If ``cache_dir`` was given, the parsed and flattened data is cached
+        there, keyed by the path, modification time and size of the file, the
+        file type, the parser options and `dict_path_separator`, and reused
+        instead of parsing the file again until any of these change.
+
+        If ``is_lazy`` is `True`, the file is instead memory-mapped and only
+        indexed, in a single pass: the top-level members of a JSON object, or
+        the sections of an INI file, are each only decoded when a key under
+        them (i.e., with the member or section name as the first component)
+        is first accessed, so that the time used scales with the parts of the
+        file that are actually used. Only the byte range of each section is
+        kept, and read from the file when the section is loaded (or, if the
+        file has changed since, the section is loaded from its current
+        contents). Operations over all keys (iteration, `len`, etc.) load all
+        pending sections. When the file changes, `reload_changed` only
+        compares the sections already loaded; the others stay pending, as
+        indexed in the new contents. In lazy mode, INI
+        section headers must not be indented, and interpolation can only
+        refer to the same section or the default section.
+        """
         path = filesystem.expand_path(path)
+        signature = _stat_signature(path)
+        if is_lazy:
+            source = _ConfigurationSource(path, file_type, kwargs, signature, frozenset())
+            self._config_sources.append(source)
+            self._index_lazy(source)
+            return self
+        parsed = self._parse(path, file_type, kwargs)
+        self.update(parsed)
+        self._config_sources.append(
+            _ConfigurationSource(path, file_type, kwargs, signature, frozenset(parsed))
+        )
+        return self
+
+    def _parse(self, path, file_type, kwargs):
         if file_type == "json":
-            d = self._read_json(path, **kwargs)
+            read_fn = self._read_json
         elif file_type == "ini":
-            d = self._read_ini(path, **kwargs)
+            read_fn = self._read_ini
         else:
             raise ValueError(file_type)
-        return self
+        parsed = None
+        if self.cache_dir is not None:
+            cache_path, cache_key = self._compose_cache_entry(path, file_type, kwargs)
+            parsed = self._load_cached(cache_path, cache_key)
+        if parsed is None:
+            parsed = read_fn(path, **kwargs)
+            if self.cache_dir is not None:
+                self._save_cached(cache_path, cache_key, parsed)
+        return parsed
 
     def _read_json(self, path, **kwargs):
         with open(path) as src:
             try:
                 d = json.load(src)
-                self._raw_d.update(d)
-                self.update(container.flatten_dict(d, separator=self.dict_path_separator))
             except json.decoder.JSONDecodeError as e:
                 raise
                 # raise error.SourceFormatError.from_json(e, src.name) from e
+        return container.flatten_dict(d, separator=self.dict_path_separator)
 
     def _read_ini(self, path, **kwargs):
         config = configparser.ConfigParser(**kwargs)
         config.read(path)
+        flat_d = {}
         for section in config.sections():
-            self._raw_d[section] = {}
             for option, value in config.items(section):
-                self._raw_d[section][option] = value
                 flat_key = self.dict_path_separator.join([section, option])
-                self[ flat_key ] = value
+                flat_d[ flat_key ] = value
+        return flat_d
     # }}}2 reading/parsing
 
+    # lazy loading {{{2
+    def _index_lazy(self, source):
+        sections = self._index_lazy_sections(source, source.signature)
+        if sections is None:
+            parsed = self._parse(source.path, source.file_type, source.kwargs)
+            self.update(parsed)
+            source.keys = frozenset(parsed)
+            return
+        for name, loader in sections:
+            self._add_lazy_section(name, source, loader)
+
+    def _index_lazy_sections(self, source, signature):
+        """
+        Returns a list of ``(name, loader)`` tuples for the sections of
+        ``source`` (with the file at ``signature``), or `None` if it cannot be
+        memory-mapped. Only the byte ranges of the sections are kept: each
+        loader reads and decodes its range when called.
+        """
+        mapped_file = filesystem.file_handle(
+            source.path,
+            "rb",
+            is_memory_map=True,
+            compression=None,
+        ).__enter__()
+        with mapped_file:
+            if not getattr(mapped_file, "is_memory_mapped", False):
+                # (empty or special files) nothing to be gained
+                return None
+            if source.file_type == "json":
+                return [
+                    (str(name), self._compose_json_loader(source, signature, name, start, end))
+                    for name, start, end in _index_json_members(mapped_file.view)
+                ]
+            elif source.file_type == "ini":
+                default_section = source.kwargs.get("default_section", configparser.DEFAULTSECT)
+                default_ranges = []
+                section_ranges = []
+                for name, start, end in _index_ini_sections(mapped_file.view):
+                    if name == default_section:
+                        default_ranges.append((start, end))
+                    else:
+                        section_ranges.append((name, start, end))
+                return [
+                    (name, self._compose_ini_loader(
+                        source,
+                        signature,
+                        default_section,
+                        default_ranges,
+                        name,
+                        start,
+                        end,
+                    ))
+                    for name, start, end in section_ranges
+                ]
+            else:
+                raise ValueError(source.file_type)
+
+    def _add_lazy_section(self, name, source, loader):
+        component = name.split(self.dict_path_separator, 1)[0]
+        self._lazy_sections.setdefault(component, []).append((source, loader))
+
+    @staticmethod
+    def _read_lazy_ranges(source, signature, ranges):
+        """
+        Returns the data in (each of the byte) ``ranges`` of the file of
+        ``source``, or `None` if it has changed since it was indexed (at
+        ``signature``), so the ranges no longer apply.
+        """
+        data = []
+        with open(source.path, "rb") as src:
+            if _stat_signature(source.path) != signature:
+                return None
+            for start, end in ranges:
+                src.seek(start)
+                data.append(src.read(end - start))
+        return data
+
+    def _load_changed_lazy_section(self, source, component):
+        # the section is loaded from the current contents of the file, which
+        # are then compared against on the next `reload_changed`
+        parsed = self._parse(source.path, source.file_type, source.kwargs)
+        return {
+            key: value
+            for key, value in parsed.items()
+            if str(key).split(self.dict_path_separator, 1)[0] == component
+        }
+
+    def _compose_json_loader(self, source, signature, name, start, end):
+        def _load():
+            component = str(name).split(self.dict_path_separator, 1)[0]
+            data = self._read_lazy_ranges(source, signature, [(start, end)])
+            if data is None:
+                return self._load_changed_lazy_section(source, component)
+            value = json.loads(data[0])
+            return container.flatten_dict({name: value}, separator=self.dict_path_separator)
+        return _load
+
+    def _compose_ini_loader(self, source, signature, default_section, default_ranges, name, start, end):
+        def _load():
+            component = name.split(self.dict_path_separator, 1)[0]
+            data = self._read_lazy_ranges(source, signature, default_ranges + [(start, end)])
+            if data is None:
+                return self._load_changed_lazy_section(source, component)
+            text = data.pop().decode("utf-8")
+            defaults_text = b"".join(data).decode("utf-8")
+            config = configparser.ConfigParser(**source.kwargs)
+            config.read_string(
+                "[{}]\n{}\n[{}]\n{}".format(
+                    default_section,
+                    defaults_text,
+                    name,
+                    text,
+                ),
+                source=str(source.path),
+            )
+            flat_d = {}
+            for option, value in config.items(name):
+                flat_d[self.dict_path_separator.join([name, option])] = value
+            return flat_d
+        return _load
+
+    def _load_lazy_key(self, key):
+        if isinstance(key, tuple):
+            if key:
+                self._load_lazy_section(str(key[0]))
+        else:
+            self._load_lazy_section(str(key).split(self.dict_path_separator, 1)[0])
+
+    def _load_lazy_section(self, component):
+        with self._reload_lock:
+            pending = self._lazy_sections.pop(component, None)
+            if pending is None:
+                return
+            self._load_lazy_entries(pending)
+
+    def _load_lazy_entries(self, entries):
+        source_indexes = {id(source): idx for idx, source in enumerate(self._config_sources)}
+        for source, loader in entries:
+            source_idx = source_indexes[id(source)]
+            later_keys = set()
+            for later_source in self._config_sources[source_idx + 1:]:
+                later_keys.update(later_source.keys)
+            loaded = loader()
+            for key, value in loaded.items():
+                if key not in later_keys:
+                    self._store(key, value)
+            source.keys = source.keys | frozenset(loaded)
+
+    def _load_lazy_sections(self, path=None):
+        """
+        Loads the pending lazy sections for the first component of ``path``
+        or, if empty or not given, all of them.
+        """
+        if not self._lazy_sections:
+            return
+        if path:
+            self._load_lazy_section(str(path[0]))
+        else:
+            for component in list(self._lazy_sections):
+                self._load_lazy_section(component)
+
+    def _get_lazy_components(self, source):
+        """
+        Returns the set of the first components of the pending lazy sections
+        of ``source``.
+        """
+        return {
+            component
+            for component, pending in self._lazy_sections.items()
+            if any(entry[0] is source for entry in pending)
+        }
+
+    def _drop_lazy_source(self, source):
+        """
+        Drops the pending lazy sections of ``source``.
+        """
+        for component in list(self._lazy_sections):
+            pending = [entry for entry in self._lazy_sections[component] if entry[0] is not source]
+            if pending:
+                self._lazy_sections[component] = pending
+            else:
+                del self._lazy_sections[component]
+
+    def __iter__(self):
+        self._load_lazy_sections()
+        return super().__iter__()
+
+    def __len__(self):
+        self._load_lazy_sections()
+        return super().__len__()
+
+    def keys(self):
+        self._load_lazy_sections()
+        return super().keys()
+
+    def values(self):
+        self._load_lazy_sections()
+        return super().values()
+
+    def items(self):
+        self._load_lazy_sections()
+        return super().items()
+
+    def copy(self):
+        self._load_lazy_sections()
+        return super().copy()
+
+    def __eq__(self, other):
+        self._load_lazy_sections()
+        return super().__eq__(other)
+
+    def __repr__(self):
+        self._load_lazy_sections()
+        return super().__repr__()
+    # }}}2 lazy loading
+
+    # caching {{{2
+    cache_format_version = 2
+
+    def _compose_cache_entry(self, path, file_type, kwargs):
+        import hashlib
+        import os
+        abs_path = os.path.abspath(path)
+        stat_result = os.stat(abs_path)
+        cache_key = (
+            self.cache_format_version,
+            abs_path,
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            file_type,
+            self.dict_path_separator,
+            repr(sorted(kwargs.items())),
+        )
+        cache_name = hashlib.sha1(abs_path.encode("utf-8", "surrogateescape")).hexdigest()
+        cache_path = os.path.join(
+            filesystem.expand_path(self.cache_dir),
+            "{}.{}.pickle".format(cache_name, file_type),
+        )
+        return cache_path, cache_key
+
+    @staticmethod
+    def _load_cached(cache_path, cache_key):
+        import pickle
+        try:
+            with open(cache_path, "rb") as src:
+                entry = pickle.load(src)
+            if entry["key"] == cache_key:
+                return entry["flat_d"]
+        except Exception:
+            # missing or unreadable cache entries are simply (re)created
+            pass
+        return None
+
+    @staticmethod
+    def _save_cached(cache_path, cache_key, parsed):
+        import os
+        import pickle
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with filesystem.file_handle(cache_path, "wb", is_atomic=True, is_fsync=False, compression=None) as dest:
+                pickle.dump(
+                    {"key": cache_key, "flat_d": parsed},
+                    dest,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+        except (OSError, pickle.PicklingError):
+            # caching is best-effort
+            pass
+    # }}}2 caching
+
     # sugar {{{2
 
     def get(self, *args, default=None):
-        return super().get( self.dict_path_separator.join(args), default)
+        try:
+            return super().__getitem__(self._resolve_key(args))
+        except KeyError:
+            return default
 
     def __getitem__(self, *args):
-        return super().__getitem__(self.dict_path_separator.join(args) )
+        return super().__getitem__(self._resolve_key(args))
 
     def check(self, *args):
         try:
@@ -112,4 +779,477 @@ class ConfigurationDict(container.AttributeSetterDict):
 
     # }}}2 sugar
 
+    # watching {{{2
+    def subscribe(self, callback):
+        """
+        Registers ``callback`` to be called with a `ConfigurationDiff` whenever
+        changes to the source files are applied (see `reload_changed`).
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def reload_changed(self):
+        """
+        Checks (using `os.stat`) whether any of the files read have changed
+        and, if so, re-parses only those files, applies the differences and
+        notifies subscribers. Values for keys that are also given by a file
+        read later are not affected (as when reading the files in sequence).
+        Returns the `ConfigurationDiff` (which is empty if nothing changed).
+        A file that is removed is treated as being empty. If a file fails to
+        parse, the other changes are still applied and notified before the
+        error is raised.
+        """
+        diff = ConfigurationDiff()
+        error = None
+        earlier_parsed = {}
+        with self._reload_lock:
+            for source_idx, source in enumerate(self._config_sources):
+                signature = _stat_signature(source.path)
+                if signature == source.signature:
+                    continue
+                # the sections of a lazily-read file that have not been
+                # loaded yet were never seen, so they are not compared but
+                # stay pending (as indexed in the new contents)
+                pending_components = self._get_lazy_components(source)
+                pending = []
+                if signature is None:
+                    parsed = {}
+                else:
+                    try:
+                        sections = None
+                        if pending_components:
+                            sections = self._index_lazy_sections(source, signature)
+                        if sections is None:
+                            parsed = self._parse(source.path, source.file_type, source.kwargs)
+                        else:
+                            parsed = {}
+                            for name, loader in sections:
+                                if name.split(self.dict_path_separator, 1)[0] in pending_components:
+                                    pending.append((name, loader))
+                                else:
+                                    parsed.update(loader())
+                    except Exception as e:
+                        # retried on the next call
+                        error = error or e
+                        continue
+                self._drop_lazy_source(source)
+                for name, loader in pending:
+                    self._add_lazy_section(name, source, loader)
+                self._apply_source_change(source_idx, parsed, diff, earlier_parsed)
+                source.signature = signature
+                source.keys = frozenset(parsed)
+                diff.paths.append(source.path)
+        if diff:
+            for callback in list(self._subscribers):
+                callback(diff)
+        if error is not None:
+            raise error
+        return diff
+
+    def _apply_source_change(self, source_idx, parsed, diff, earlier_parsed):
+        source = self._config_sources[source_idx]
+        later_keys = set()
+        for later_source in self._config_sources[source_idx + 1:]:
+            later_keys.update(later_source.keys)
+        for key in source.keys | frozenset(parsed):
+            if key in later_keys:
+                continue
+            if key in parsed:
+                value = parsed[key]
+            else:
+                value = self._find_earlier_value(source_idx, key, earlier_parsed)
+            is_present = super().__contains__(key)
+            if value is _missing:
+                if is_present:
+                    diff.removed[key] = super().__getitem__(key)
+                    del self[key]
+            elif not is_present:
+                diff.added[key] = value
+                self[key] = value
+            else:
+                old_value = super().__getitem__(key)
+                if old_value != value:
+                    diff.changed[key] = (old_value, value)
+                    self[key] = value
+
+    def _find_earlier_value(self, source_idx, key, earlier_parsed):
+        # only needed when a key is dropped from a file that was masking the
+        # same key in a file read earlier; each earlier file is parsed (at
+        # most) once per reload, in ``earlier_parsed``
+        for earlier_idx in range(source_idx - 1, -1, -1):
+            earlier_source = self._config_sources[earlier_idx]
+            if key in earlier_source.keys:
+                try:
+                    parsed = earlier_parsed[earlier_idx]
+                except KeyError:
+                    parsed = self._parse(earlier_source.path, earlier_source.file_type, earlier_source.kwargs)
+                    earlier_parsed[earlier_idx] = parsed
+                if key in parsed:
+                    return parsed[key]
+        return _missing
+
+    def watch(self, interval=1.0, on_error=None):
+        """
+        Starts a background (daemon) thread that calls `reload_changed` every
+        ``interval`` seconds, so subscribers are notified (on that thread) of
+        changes to the source files. Errors (for e.g., a file that fails to
+        parse because it is being written) are passed to ``on_error``, if
+        given, and the file is retried on the next poll.
+        """
+        if self._watch_thread is not None:
+            return
+        stop_event = threading.Event()
+        def _run():
+            while not stop_event.wait(interval):
+                try:
+                    self.reload_changed()
+                except Exception as e:
+                    if on_error is not None:
+                        on_error(e)
+        self._watch_stop_event = stop_event
+        self._watch_thread = threading.Thread(target=_run, name="ConfigurationDict.watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        if self._watch_thread is None:
+            return
+        self._watch_stop_event.set()
+        self._watch_thread.join()
+        self._watch_thread = None
+        self._watch_stop_event = None
+    # }}}2 watching
+
+class ConfigurationView(collections.abc.Mapping):
+    """
+    A read-only, live view of the entries of a `ConfigurationDict` under a
+    given path (see `ConfigurationDict.subtree`), with keys relative to that
+    path (given either as strings, joined by the `dict_path_separator` of
+    the dictionary, or as tuples of path components). Iteration is in
+    sorted order of key paths.
+    """
+
+    def __init__(self, config, node, path):
+        self._config = config
+        self._node = node
+        self.path = tuple(path)
+
+    def _split_key(self, key):
+        if isinstance(key, tuple):
+            return key
+        return (key,)
+
+    def _find_node(self, path):
+        node = self._node
+        for part in self._config._split_path(path):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def __getitem__(self, key):
+        node = self._find_node(self._split_key(key))
+        if node is None or node.key is None:
+            raise KeyError(key)
+        return dict.__getitem__(self._config, node.key)
+
+    def __iter__(self):
+        offset = len(self._config.dict_path_separator.join(self.path))
+        if self.path:
+            offset += len(self._config.dict_path_separator)
+        for key in ConfigurationDict._iter_node_keys(self._node):
+            if key is not self._node.key:
+                yield str(key)[offset:]
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def subtree(self, *path):
+        path = tuple(self._config._split_path(path))
+        node = self._find_node(path)
+        if node is None:
+            raise KeyError(self._config.dict_path_separator.join(path))
+        return ConfigurationView(self._config, node, self.path + path)
+
 # }}}1 ConfigurationDict
+
+# InputManifest {{{1
+
+class ManifestDelta:
+    """
+    Differences between a set of inputs and an `InputManifest`, as returned
+    by `InputManifest.scan`: lists of ``new``, ``changed``, ``deleted`` and
+    ``unchanged`` paths, and the current ``records`` of all (existing)
+    inputs, which can be committed to the manifest using
+    `InputManifest.update`.
+    """
+
+    def __init__(self):
+        self.new = []
+        self.changed = []
+        self.deleted = []
+        self.unchanged = []
+        self.records = {}
+
+    @property
+    def modified(self):
+        """
+        Paths that need to be processed (i.e., new and changed paths).
+        """
+        return self.new + self.changed
+
+    def __bool__(self):
+        return bool(self.new or self.changed or self.deleted)
+
+class InputManifest:
+
+    """
+    Records the path, size, modification time and (optionally) content hash
+    of each of a set of inputs, so that later runs can process only what has
+    changed:
+
+        manifest = InputManifest("inputs.manifest", is_hash=True)
+        delta = manifest.scan(paths)
+        for path in delta.modified:
+            process(path)
+        manifest.update(delta)
+        manifest.save()
+
+    Inputs are identified by absolute path. An input is considered changed if
+    its size or modification time differ from those recorded, except that if
+    ``is_hash`` is `True` and only the modification time differs, its content
+    hash (computed in parallel by ``max_workers`` threads; see
+    `hashing.hash_files`) is compared instead.
+
+    The manifest is stored as a pickle (compact and fast to load) and saved
+    atomically (see `filesystem.file_handle`).
+    """
+
+    format_version = 1
+
+    def __init__(
+        self,
+        path=None,
+        is_hash=False,
+        algorithm=None,
+        max_workers=None,
+    ):
+        from yakherd import hashing
+        self.path = path
+        self.is_hash = is_hash
+        self.algorithm = algorithm or hashing.default_algorithm
+        self.max_workers = max_workers
+        # path => (size, mtime_ns, digest or None)
+        self.records = {}
+        if path is not None and filesystem.expand_path(path).exists():
+            self.load(path)
+
+    def load(self, path):
+        import pickle
+        with filesystem.file_handle(path, "rb", compression=None) as src:
+            data = pickle.load(src)
+        if data.get("version") != self.format_version:
+            raise ValueError("Unsupported manifest format: {}".format(data.get("version")))
+        self.records = data["records"]
+        if data["algorithm"] != self.algorithm:
+            # digests are not comparable
+            self.records = {
+                path: (size, mtime_ns, None)
+                for path, (size, mtime_ns, digest) in self.records.items()
+            }
+        return self
+
+    def save(self, path=None):
+        import pickle
+        if path is None:
+            path = self.path
+        data = {
+            "version": self.format_version,
+            "algorithm": self.algorithm,
+            "records": self.records,
+        }
+        with filesystem.file_handle(path, "wb", is_atomic=True, compression=None) as dest:
+            pickle.dump(data, dest, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def scan(self, paths):
+        """
+        Compares the inputs given by ``paths`` (paths or `filesystem.StatPath`
+        objects, whose stat results are reused) to the manifest, returning a
+        `ManifestDelta`. Manifest entries not in ``paths`` are reported as
+        deleted. The manifest itself is not modified.
+        """
+        import os
+        from yakherd import hashing
+        delta = ManifestDelta()
+        to_hash = []
+        for path in paths:
+            stat_result = getattr(path, "stat_result", None)
+            path = os.path.abspath(path)
+            if stat_result is None:
+                stat_result = os.stat(path)
+            record = (stat_result.st_size, stat_result.st_mtime_ns, None)
+            delta.records[path] = record
+            previous = self.records.get(path)
+            if previous is None:
+                delta.new.append(path)
+            elif previous[:2] == record[:2]:
+                delta.unchanged.append(path)
+                delta.records[path] = previous
+                continue
+            elif not self.is_hash or previous[0] != record[0] or previous[2] is None:
+                delta.changed.append(path)
+            if self.is_hash:
+                to_hash.append(path)
+        # (set for constant-time membership tests while hashing)
+        changed_paths = set(delta.changed)
+        for path, digest in hashing.hash_files(
+            to_hash,
+            algorithm=self.algorithm,
+            max_workers=self.max_workers,
+        ):
+            size, mtime_ns, _ = delta.records[path]
+            delta.records[path] = (size, mtime_ns, digest)
+            previous = self.records.get(path)
+            if previous is not None and path not in changed_paths:
+                if previous[2] == digest:
+                    delta.unchanged.append(path)
+                else:
+                    delta.changed.append(path)
+        delta.deleted = [path for path in self.records if path not in delta.records]
+        return delta
+
+    def update(self, delta):
+        """
+        Records the state of the inputs in ``delta`` (typically after they
+        have been processed), and removes deleted inputs.
+        """
+        for path in delta.deleted:
+            self.records.pop(path, None)
+        self.records.update(delta.records)
+        return self
+
+# }}}1 InputManifest
+
+# LayeredConfiguration {{{1
+
+config_file_types = {
+    ".json": "json",
+    ".ini": "ini",
+    ".cfg": "ini",
+    ".conf": "ini",
+}
+
+class LayeredConfiguration(container.LayeredDict):
+
+    """
+    Configuration composed from multiple sources, listed from highest to
+    lowest precedence, for e.g.:
+
+        config = LayeredConfiguration([
+            {"environ_prefix": "MYAPP_"},
+            "fragments/logging.json",
+            "project.ini",
+            {"path": "/etc/myapp/site.json", "is_optional": True},
+        ])
+        config["db.host"]
+        config.source("db.host") # e.g., "project.ini"
+
+    Each source may be:
+
+    -   a path to a JSON or INI file (with the type inferred from the
+        suffix; see `config_file_types`);
+    -   a `dict` with "path" (and, optionally, "file_type", "name",
+        "is_optional", to skip the source if the file does not exist, and
+        "kwargs", passed to the parser);
+    -   a `dict` with "environ_prefix", for the environment variables
+        starting with that prefix, with the prefix removed, lower-cased, and
+        "__" mapped to `dict_path_separator` (so that "MYAPP_DB__HOST" gives
+        "db.host").
+
+    Files are read concurrently on a pool of ``max_workers`` threads (each
+    into its own `ConfigurationDict`, cached in ``cache_dir`` if given). The
+    resulting mappings are composed as the layers of a `container.LayeredDict`
+    (named by path, or "environ:<prefix>", unless "name" is given) rather
+    than merged into a single copy, so `source` reports the layer that
+    supplied each key.
+    """
+
+    def __init__(
+        self,
+        sources,
+        max_workers=None,
+        cache_dir=None,
+        dict_path_separator=".",
+        is_skip_none=True,
+        environ=None,
+    ):
+        import concurrent.futures
+        specs = [self._normalize_source(source) for source in sources]
+        if environ is None:
+            import os
+            environ = os.environ
+        def _load(spec):
+            if "environ_prefix" in spec:
+                return self._read_environ(spec["environ_prefix"], environ, dict_path_separator)
+            if not filesystem.expand_path(spec["path"]).exists():
+                if spec["is_optional"]:
+                    return None
+                # (`configparser` silently skips missing files)
+                raise FileNotFoundError(errno.ENOENT, "Configuration file not found", spec["path"])
+            config = ConfigurationDict(cache_dir=cache_dir)
+            config.dict_path_separator = dict_path_separator
+            return config.read(spec["path"], spec["file_type"], **spec["kwargs"])
+        num_files = sum(1 for spec in specs if "path" in spec)
+        if num_files > 1 and max_workers != 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                mappings = list(executor.map(_load, specs))
+        else:
+            mappings = [_load(spec) for spec in specs]
+        super().__init__(
+            [(spec["name"], mapping) for spec, mapping in zip(specs, mappings) if mapping is not None],
+            is_skip_none=is_skip_none,
+        )
+        self.dict_path_separator = dict_path_separator
+
+    @staticmethod
+    def _normalize_source(source):
+        import os
+        if not isinstance(source, dict):
+            source = {"path": source}
+        spec = dict(source)
+        if "environ_prefix" in spec:
+            spec.setdefault("name", "environ:{}".format(spec["environ_prefix"]))
+            return spec
+        if "path" not in spec:
+            raise ValueError("Configuration source requires 'path' or 'environ_prefix': {}".format(source))
+        spec["path"] = os.fspath(spec["path"])
+        if spec.get("file_type") is None:
+            suffix = os.path.splitext(spec["path"])[1].lower()
+            try:
+                spec["file_type"] = config_file_types[suffix]
+            except KeyError:
+                raise ValueError("Unable to infer configuration file type: '{}'".format(spec["path"])) from None
+        spec.setdefault("name", spec["path"])
+        spec.setdefault("is_optional", False)
+        spec.setdefault("kwargs", {})
+        return spec
+
+    @staticmethod
+    def _read_environ(prefix, environ, dict_path_separator):
+        d = {}
+        for name, value in environ.items():
+            if name.startswith(prefix) and len(name) > len(prefix):
+                key = name[len(prefix):].lower().replace("__", dict_path_separator)
+                d[key] = value
+        return d
+
+    def get(self, *args, default=None):
+        """
+        Returns the value at the key path ``args`` (or a single flat key),
+        or ``default`` if not found.
+        """
+        return super().get(self.dict_path_separator.join(args), default)
+
+# }}}1 LayeredConfiguration
@@ -31,8 +31,14 @@
 ##############################################################################
 
 import os
+import re
 import sys
+import stat
+import errno
 import pathlib
+import io
+import threading
+import collections
 
 # Functions {{{1
 def expand_path(path):
@@ -41,9 +47,725 @@ def expand_path(path):
     path = pathlib.Path(os.path.expandvars(path))
     path = path.expanduser()
     return path
+
+def has_glob_magic(path):
+    return any(c in path for c in "*?[")
+
+def iter_glob(pattern):
+    """
+    Yields paths matching the glob ``pattern`` (supporting "*", "?",
+    "[...]" and, as a full path component, "**" for zero or more
+    directories), using `os.scandir` for directory listings. As with the
+    shell, names starting with "." are only matched by pattern components
+    that start with ".".
+    """
+    import fnmatch
+    parts = os.fspath(pattern).split(os.sep)
+    if parts[0] == "":
+        base = os.sep
+        parts = parts[1:]
+    else:
+        base = ""
+    matchers = {}
+    for part in parts:
+        if part != "**" and has_glob_magic(part) and part not in matchers:
+            matchers[part] = re.compile(fnmatch.translate(part)).match
+    def _scandir(dir_path):
+        try:
+            with os.scandir(dir_path or os.curdir) as entries:
+                return list(entries)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return []
+    def _iter(base, parts):
+        if not parts:
+            if base:
+                yield base
+            return
+        part, remaining_parts = parts[0], parts[1:]
+        if part == "**":
+            yield from _iter(base, remaining_parts)
+            for entry in _scandir(base):
+                if not entry.name.startswith(".") and entry.is_dir():
+                    yield from _iter(os.path.join(base, entry.name), parts)
+        elif part in matchers:
+            match = matchers[part]
+            is_match_hidden = part.startswith(".")
+            for entry in sorted(_scandir(base), key=lambda entry: entry.name):
+                if entry.name.startswith(".") and not is_match_hidden:
+                    continue
+                if not match(entry.name):
+                    continue
+                if remaining_parts and not entry.is_dir():
+                    continue
+                yield from _iter(os.path.join(base, entry.name), remaining_parts)
+        else:
+            path = os.path.join(base, part)
+            if remaining_parts:
+                yield from _iter(path, remaining_parts)
+            elif os.path.lexists(path):
+                yield path
+    if not any(part in matchers or part == "**" for part in parts):
+        if os.path.lexists(pattern):
+            yield os.fspath(pattern)
+        return
+    yield from _iter(base, parts)
+
+def _stat_or_error(path):
+    try:
+        return os.stat(path), None
+    except OSError as e:
+        return None, e
+
+def resolve_paths(
+    paths,
+    is_expand_glob=True,
+    is_dedupe=True,
+    is_require_exists=True,
+    path_type=None,
+    max_workers=None,
+):
+    """
+    Resolves a collection of path specifications in bulk, returning a list of
+    `StatPath` objects that carry the results of `os.stat` (so that
+    subsequent calls to ``stat()``, ``exists()``, ``is_file()``, etc. do not
+    need to hit the filesystem again).
+
+    -   Environment variables and "~" are expanded in each specification.
+    -   If ``is_expand_glob`` is `True`, specifications with glob patterns
+        are replaced by their (sorted) matches (see `iter_glob`).
+    -   The paths are stat'ed in parallel by a pool of ``max_workers`` threads
+        (for more than a handful of paths).
+    -   If ``is_dedupe`` is `True`, only the first of any paths referring to
+        the same file (i.e., with the same device and inode, such as through
+        different relative paths or symbolic links) is kept.
+    -   If ``is_require_exists`` is `True`, `FileNotFoundError` is raised for
+        (the first) path that does not exist or glob pattern that does not
+        match anything. Otherwise, such paths are returned without stat
+        results.
+    -   If ``path_type`` is "file" or "dir", `IsADirectoryError` or
+        `NotADirectoryError` is raised for (the first) existing path that is
+        not of the given type.
+    """
+    if path_type not in (None, "file", "dir"):
+        raise ValueError(path_type)
+    expanded = []
+    for path in paths:
+        path = os.fspath(expand_path(path))
+        if is_expand_glob and has_glob_magic(path):
+            matches = list(iter_glob(path))
+            if not matches and is_require_exists:
+                raise FileNotFoundError(errno.ENOENT, "No files match pattern", path)
+            expanded.extend(matches)
+        else:
+            expanded.append(path)
+    if len(expanded) > 16 and max_workers != 1:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            stat_results = list(executor.map(_stat_or_error, expanded, chunksize=64))
+    else:
+        stat_results = [_stat_or_error(path) for path in expanded]
+    resolved = []
+    seen = set()
+    for path, (stat_result, error) in zip(expanded, stat_results):
+        if stat_result is None:
+            if is_require_exists or not isinstance(error, FileNotFoundError):
+                raise error
+            identity = os.path.normpath(os.path.abspath(path))
+        else:
+            identity = (stat_result.st_dev, stat_result.st_ino)
+            if path_type == "file" and stat.S_ISDIR(stat_result.st_mode):
+                raise IsADirectoryError(errno.EISDIR, "Is a directory", path)
+            if path_type == "dir" and not stat.S_ISDIR(stat_result.st_mode):
+                raise NotADirectoryError(errno.ENOTDIR, "Not a directory", path)
+        if is_dedupe:
+            if identity in seen:
+                continue
+            seen.add(identity)
+        resolved.append(StatPath.from_stat_result(path, stat_result))
+    return resolved
+
+def _compile_path_patterns(patterns):
+    """
+    Compiles glob ``patterns`` into a single function that takes the name
+    and the relative path of an entry and returns `True` if any pattern
+    matches: patterns containing a path separator are matched against the
+    relative path, and other patterns against the name.
+    """
+    import fnmatch
+    if patterns is None:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    name_patterns = []
+    path_patterns = []
+    for pattern in patterns:
+        if os.sep in pattern:
+            path_patterns.append(fnmatch.translate(pattern.strip(os.sep)))
+        else:
+            name_patterns.append(fnmatch.translate(pattern))
+    name_match = re.compile("|".join(name_patterns)).match if name_patterns else None
+    path_match = re.compile("|".join(path_patterns)).match if path_patterns else None
+    def _match(name, rel_path):
+        return bool(
+            (name_match is not None and name_match(name))
+            or (path_match is not None and path_match(rel_path))
+        )
+    return _match
+
+def discover_paths(
+    roots,
+    include=None,
+    exclude=None,
+    max_depth=None,
+    symlink_policy="files",
+    is_include_dirs=False,
+    is_stat=True,
+    max_workers=None,
+    on_error=None,
+):
+    """
+    Walks the directory trees under ``roots`` (a path or list of paths),
+    listing directories with `os.scandir` on a pool of ``max_workers``
+    threads, and yields a `StatPath` for each file found, carrying the
+    stat results obtained through its `os.DirEntry` (unless ``is_stat`` is
+    `False`, in which case only the (free) file type information from the
+    directory listing is used, and no stat results are carried). Roots that
+    are files are yielded as they are.
+
+    Results are yielded as soon as each directory has been listed, so the
+    order is not deterministic.
+
+    -   ``include`` and ``exclude`` are glob patterns (or lists of them),
+        compiled once. Patterns with a path separator are matched against
+        the path relative to the root, and other patterns against the name
+        of the entry. If ``include`` is given, only files matching it are
+        yielded. Entries matching ``exclude`` are skipped, and excluded
+        directories are not descended into.
+    -   If ``max_depth`` is not `None`, directories more than ``max_depth``
+        levels below a root are not listed (so 0 only lists the roots).
+    -   ``symlink_policy`` is one of: "ignore", to skip symbolic links;
+        "files" (the default), to yield links to files but not descend into
+        links to directories; or "follow", to also descend into links to
+        directories (each directory is only visited once, so cycles are
+        safe).
+    -   If ``is_include_dirs`` is `True`, directories (that match
+        ``include``) are also yielded.
+    -   Errors listing directories or reading stat results (for e.g.,
+        permission errors or broken links) are passed to ``on_error``, if
+        given, and the directory or entry skipped.
+    """
+    import concurrent.futures
+    if symlink_policy not in ("ignore", "files", "follow"):
+        raise ValueError(symlink_policy)
+    include_match = _compile_path_patterns(include)
+    exclude_match = _compile_path_patterns(exclude)
+    if isinstance(roots, (str, os.PathLike)):
+        roots = [roots]
+    is_follow = symlink_policy == "follow"
+
+    def _scan(dir_path, rel_dir, depth):
+        results = []
+        subdirs = []
+        errors = []
+        try:
+            with os.scandir(dir_path) as entries:
+                entries = list(entries)
+        except OSError as e:
+            return results, subdirs, [e]
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            if exclude_match is not None and exclude_match(entry.name, rel_path):
+                continue
+            try:
+                is_symlink = entry.is_symlink()
+                if is_symlink and symlink_policy == "ignore":
+                    continue
+                is_dir = entry.is_dir()
+                if is_dir and is_symlink and not is_follow:
+                    continue
+                if is_stat or (is_dir and is_follow):
+                    stat_result = entry.stat()
+                else:
+                    stat_result = None
+            except OSError as e:
+                errors.append(e)
+                continue
+            if is_dir:
+                if max_depth is None or depth < max_depth:
+                    subdirs.append((entry.path, rel_path, depth + 1, stat_result))
+                if not is_include_dirs:
+                    continue
+            if include_match is None or include_match(entry.name, rel_path):
+                results.append(StatPath.from_stat_result(entry.path, stat_result))
+        return results, subdirs, errors
+
+    visited = set()
+    num_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = 2 * num_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # depth-first, so that the backlog of directories stays small
+        waiting = []
+        for root in roots:
+            root = os.fspath(expand_path(root))
+            stat_result = os.stat(root)
+            if not stat.S_ISDIR(stat_result.st_mode):
+                yield StatPath.from_stat_result(root, stat_result)
+                continue
+            if is_follow:
+                visited.add((stat_result.st_dev, stat_result.st_ino))
+            if is_include_dirs:
+                yield StatPath.from_stat_result(root, stat_result)
+            waiting.append((root, "", 0))
+        pending = set()
+        while waiting or pending:
+            while waiting and len(pending) < max_in_flight:
+                pending.add(executor.submit(_scan, *waiting.pop()))
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                results, subdirs, errors = future.result()
+                if on_error is not None:
+                    for error in errors:
+                        on_error(error)
+                for dir_path, rel_path, depth, stat_result in subdirs:
+                    if is_follow:
+                        identity = (stat_result.st_dev, stat_result.st_ino)
+                        if identity in visited:
+                            continue
+                        visited.add(identity)
+                    waiting.append((dir_path, rel_path, depth))
+                yield from results
 # }}}1 Functions
 
+# StatPath {{{1
+class StatPath(type(pathlib.Path())):
+    """
+    A (concrete) `pathlib.Path` that carries the results of a previous
+    `os.stat` call, which are returned by ``stat()`` (and therefore used by
+    ``exists()``, ``is_file()``, ``is_dir()``, etc.) instead of querying the
+    filesystem again. Paths derived from this one (``parent``, ``/``, etc.)
+    do not carry any stat results.
+    """
+
+    stat_result = None
+
+    @classmethod
+    def from_stat_result(cls, path, stat_result):
+        p = cls(path)
+        p.stat_result = stat_result
+        return p
+
+    def stat(self, *, follow_symlinks=True):
+        if follow_symlinks and self.stat_result is not None:
+            return self.stat_result
+        return super().stat(follow_symlinks=follow_symlinks)
+
+    def invalidate(self):
+        self.stat_result = None
+# }}}1 StatPath
+
+# Compression {{{1
+compression_suffixes = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".lzma": "lzma",
+    ".zst": "zstd",
+}
+_compression_magic_numbers = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+
+def detect_compression(path, mode="r", is_sniff=False):
+    """
+    Returns the compression format ("gzip", "bz2", "xz", "lzma", "zstd") of
+    ``path`` based on its suffix (see `compression_suffixes`), or `None` if
+    it is not compressed. If ``is_sniff`` is `True` and an existing regular
+    file with an unrecognized suffix is being read, the format is instead
+    detected from its leading "magic" bytes (at the cost of an extra open and
+    read, and with the risk of mistaking uncompressed data that happens to
+    start with those bytes for compressed data).
+    """
+    path = os.fspath(path)
+    for compression_suffix, compression in compression_suffixes.items():
+        if path.endswith(compression_suffix):
+            return compression
+    if not is_sniff or "r" not in mode or "+" in mode:
+        return None
+    try:
+        with open(path, "rb") as src:
+            if not stat.S_ISREG(os.fstat(src.fileno()).st_mode):
+                return None
+            leader = src.read(6)
+    except OSError:
+        return None
+    for magic_number, compression in _compression_magic_numbers:
+        if leader.startswith(magic_number):
+            return compression
+    return None
+
+def open_compressed(
+    target,
+    mode,
+    compression,
+    compression_level=None,
+    compression_threads=None,
+    buffer_size=io.DEFAULT_BUFFER_SIZE,
+    encoding=None,
+    errors=None,
+    newline=None,
+):
+    """
+    Returns a (buffered, streaming) handle that compresses data written to, or
+    decompresses data read from, ``target`` (a path or a binary file object;
+    the latter will not be closed when the handle is) in the ``compression``
+    format ("gzip", "bz2", "xz", "lzma" or "zstd"; "lzma" is the legacy
+    ".lzma" container, and "zstd" requires Python 3.14 or the 'zstandard'
+    package). A text handle is returned unless "b" is in ``mode``.
+
+    If ``compression_threads`` is more than 1, "gzip" output is compressed
+    in independent blocks in parallel (see `ParallelGzipWriter`).
+    """
+    binary_mode = mode.replace("t", "").replace("b", "") + "b"
+    is_write = binary_mode[0] in "wax"
+    is_fileobj = not isinstance(target, (str, bytes, os.PathLike))
+    if compression == "gzip":
+        import gzip
+        if is_write and compression_threads is not None and compression_threads > 1:
+            if is_fileobj:
+                fileobj = target
+            else:
+                fileobj = open(target, binary_mode)
+            stream = ParallelGzipWriter(
+                fileobj,
+                compresslevel=compression_level if compression_level is not None else 9,
+                num_threads=compression_threads,
+                is_close_fileobj=not is_fileobj,
+            )
+        else:
+            stream = gzip.open(
+                target,
+                binary_mode,
+                compresslevel=compression_level if compression_level is not None else 9,
+            )
+    elif compression == "bz2":
+        import bz2
+        stream = bz2.open(
+            target,
+            binary_mode,
+            compresslevel=compression_level if compression_level is not None else 9,
+        )
+    elif compression in ("xz", "lzma"):
+        import lzma
+        stream = lzma.open(
+            target,
+            binary_mode,
+            format=lzma.FORMAT_XZ if compression == "xz" else lzma.FORMAT_ALONE,
+            preset=compression_level if is_write else None,
+        )
+    elif compression == "zstd":
+        try:
+            from compression import zstd
+        except ImportError:
+            zstd = None
+        if zstd is not None:
+            stream = zstd.open(
+                target,
+                binary_mode,
+                level=compression_level if is_write else None,
+            )
+        else:
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError(
+                    "Zstandard compression requires Python 3.14 or the 'zstandard' package"
+                ) from None
+            zstd_kwargs = {}
+            if is_write and compression_level is not None:
+                zstd_kwargs["cctx"] = zstandard.ZstdCompressor(level=compression_level)
+            if is_fileobj:
+                zstd_kwargs["closefd"] = False
+            stream = zstandard.open(target, binary_mode, **zstd_kwargs)
+            if not is_write:
+                stream = io.BufferedReader(stream, buffer_size)
+    else:
+        raise ValueError(compression)
+    if is_write:
+        stream = io.BufferedWriter(stream, buffer_size)
+    if "b" in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, errors=errors, newline=newline)
+
+def _compressed_open_kwargs(kwargs, buffer_size):
+    # maps `open` keyword arguments onto those of `open_compressed`:
+    # ``buffering`` (if larger than 1) sets the buffer size, and arguments
+    # with no equivalent for a compressed stream (``closefd``, ``opener``)
+    # are dropped
+    buffering = kwargs.get("buffering", -1)
+    if buffer_size is None and buffering is not None and buffering > 1:
+        buffer_size = buffering
+    return buffer_size, {
+        key: kwargs[key]
+        for key in ("encoding", "errors", "newline")
+        if key in kwargs
+    }
+
+class ParallelGzipWriter(io.RawIOBase):
+    """
+    Writable binary stream that compresses data in blocks of ``block_size``
+    bytes on a pool of ``num_threads`` threads (`zlib` releases the GIL while
+    compressing), writing each block to ``fileobj`` as a separate gzip member
+    as soon as it and all preceding blocks are done. Standard gzip readers
+    (including `gzip` and the 'gzip' utility) transparently decompress the
+    concatenated members as a single stream.
+    """
+
+    def __init__(
+        self,
+        fileobj,
+        compresslevel=9,
+        num_threads=None,
+        block_size=1 << 20,
+        is_close_fileobj=True,
+    ):
+        import collections
+        import concurrent.futures
+        super().__init__()
+        self._fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self._is_close_fileobj = is_close_fileobj
+        num_threads = num_threads or os.cpu_count() or 1
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+        self._max_pending = 2 * num_threads
+        self._pending = collections.deque()
+        self._block = bytearray()
+        self._is_written = False
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._block += b
+        if len(self._block) >= self.block_size:
+            self._submit_block()
+        return memoryview(b).nbytes
+
+    def _submit_block(self):
+        import gzip
+        block, self._block = self._block, bytearray()
+        self._pending.append(
+            self._executor.submit(gzip.compress, block, self.compresslevel, mtime=0)
+        )
+        self._is_written = True
+        while len(self._pending) > self._max_pending:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._block or not self._is_written:
+                self._submit_block()
+            while self._pending:
+                self._fileobj.write(self._pending.popleft().result())
+            self._fileobj.flush()
+        finally:
+            self._executor.shutdown()
+            if self._is_close_fileobj:
+                self._fileobj.close()
+            super().close()
+# }}}1 Compression
+
+# MappedFile {{{1
+class MappedFile:
+    """
+    Read-only, memory-mapped view of a (regular) file, giving zero-copy access
+    to its contents as `memoryview` slices of the mapping. The kernel is
+    advised (where supported) that the mapping will be accessed sequentially.
+
+    Note that the mapping can only be released once all slices obtained from it
+    have been released; if any are still referenced when this is closed, the
+    mapping will be released when they are.
+    """
+
+    is_memory_mapped = True
+
+    def __init__(self, path):
+        import mmap
+        self.name = path
+        with open(path, "rb") as src:
+            self._mmap = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._mmap, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            try:
+                self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+            except OSError:
+                pass
+        self.view = memoryview(self._mmap)
+        self._pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, key):
+        return self.view[key]
+
+    @property
+    def closed(self):
+        return self.view is None
+
+    def close(self):
+        if self.view is None:
+            return
+        self.view.release()
+        self.view = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._mmap = None
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos):
+        self._pos = pos
+
+    def read(self, size=-1):
+        start = self._pos
+        if size is None or size < 0:
+            end = len(self.view)
+        else:
+            end = min(start + size, len(self.view))
+        self._pos = end
+        return self.view[start:end]
+
+    def readline(self):
+        start = self._pos
+        end = self._mmap.find(b"\n", start)
+        if end < 0:
+            end = len(self.view)
+        else:
+            end += 1
+        self._pos = end
+        return self.view[start:end]
+
+    def iter_lines(self, keepends=True):
+        """
+        Yields each line from the current position as a `memoryview` slice
+        of the mapping, including the line terminator if ``keepends`` is
+        `True`.
+        """
+        find = self._mmap.find
+        view = self.view
+        pos = self._pos
+        size = len(view)
+        while pos < size:
+            end = find(b"\n", pos)
+            if end < 0:
+                next_pos = end = size
+            else:
+                next_pos = end + 1
+            self._pos = next_pos
+            yield view[pos:next_pos if keepends else end]
+            pos = next_pos
+
+    def __iter__(self):
+        return self.iter_lines()
+# }}}1 MappedFile
+
+# StreamedFile {{{1
+class StreamedFile:
+    """
+    Provides the `MappedFile` reading interface over a (binary) stream that
+    cannot be memory-mapped, such as standard input or a pipe. Data is
+    returned as `memoryview` objects over newly-read `bytes`, so that callers
+    can use the same code path for both.
+    """
+
+    is_memory_mapped = False
+
+    def __init__(self, stream, name=None, is_close_stream=True):
+        self._stream = stream
+        self.name = name
+        self._is_close_stream = is_close_stream
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._is_close_stream:
+            self._stream.close()
+
+    def read(self, size=-1):
+        return memoryview(self._stream.read(size))
+
+    def readline(self):
+        return memoryview(self._stream.readline())
+
+    def iter_lines(self, keepends=True):
+        for line in self._stream:
+            if not keepends and line.endswith(b"\n"):
+                line = line[:-1]
+            yield memoryview(line)
+
+    def __iter__(self):
+        return self.iter_lines()
+# }}}1 StreamedFile
+
 # file_handle {{{1
+def _get_umask():
+    try:
+        with open("/proc/self/status") as src:
+            for line in src:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+def _fsync_dir(dir_path):
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _is_standard_stream(fh):
+    for stream in (sys.stdin, sys.stdout, sys.stderr):
+        if fh is stream or fh is getattr(stream, "buffer", None):
+            return True
+    return False
+
 class file_handle:
     """
     Return file handle for specified path, dealing with various special
@@ -98,7 +820,48 @@ class file_handle:
             # still open
             log_f.write(...)
 
-    All *args and **kwargs passed to underlying 'open'.
+    All *args and **kwargs passed to underlying 'open'. ``buffer_size``, if
+    given, sets the size of the write/read buffer.
+
+    If ``is_atomic`` is `True` (only supported in "w" or "x" modes), data
+    is written to a temporary file in the same directory as the target, using
+    a large buffer (``buffer_size``, defaulting to 1 MiB). On a normal exit
+    from the context, the temporary file is flushed, synced to disk (unless
+    ``is_fsync`` is `False`) and then renamed over the target, so that
+    readers never see a partially-written file. In "x" mode, as with 'open',
+    `FileExistsError` is raised on opening if the target exists, and the
+    temporary file is hard-linked to the target instead of renamed over it,
+    so that a target created in the meantime is never clobbered (and
+    `FileExistsError` is raised on exit instead). If an exception is raised,
+    the temporary file is discarded and the target left untouched. The
+    ``existing_file`` policy is applied to the target before anything is
+    written. Atomic writes are only completed through the context manager
+    protocol:
+
+        with file_handle("output.txt", "w", is_atomic=True) as dest:
+            dest.write(...)
+
+    Compressed files are transparently compressed/decompressed:
+    ``compression`` may be "auto" (the default: detected from the path
+    suffix; see `detect_compression`), "sniff" (detected from the path
+    suffix, or, when reading, from the leading bytes of the file), `None`
+    (no compression), or one of "gzip", "bz2", "xz", "lzma" or "zstd" (which
+    can also be applied to standard input/output). ``compression_level`` and
+    ``compression_threads`` are passed on to `open_compressed`, along with
+    the ``encoding``, ``errors`` and ``newline`` arguments of 'open' (a
+    ``buffering`` larger than 1 is taken as ``buffer_size``, and other
+    'open' arguments are ignored).
+
+    If ``is_memory_map`` is `True` (only supported in "rb" mode), then
+    instead of a file object, the handle will be a `MappedFile`, giving
+    zero-copy access to the file contents through `memoryview` slices and
+    a fast line iterator, or, if the source cannot be memory-mapped (standard
+    input, pipes, etc.), a `StreamedFile` that provides the same interface
+    over streaming reads:
+
+        with file_handle(path, "rb", is_memory_map=True) as src:
+            for line in src.iter_lines():
+                ...
 
     """
 
@@ -112,8 +875,18 @@ class file_handle:
         existing_file=None,
         is_allow_standard_streams=True,
         *args,
+        is_memory_map=False,
+        compression="auto",
+        compression_level=None,
+        compression_threads=None,
+        is_atomic=False,
+        buffer_size=None,
+        is_fsync=True,
         **kwargs
     ):
+        self._atomic_write = None
+        if is_memory_map and (mode.replace("b", "") != "r" or "b" not in mode):
+            raise ValueError("Memory-mapped access requires mode 'rb', not '{}'".format(mode))
         if path is None:
             path = default_path
         if path is None or path == "/dev/null":
@@ -140,6 +913,21 @@ class file_handle:
                 fh = stream.buffer  # type: IO
             else:
                 fh = stream
+            if compression and compression not in ("auto", "sniff"):
+                stream_buffer_size, compressed_kwargs = _compressed_open_kwargs(kwargs, buffer_size)
+                fh = open_compressed(
+                    stream.buffer,
+                    mode="rb" if is_memory_map else mode,
+                    compression=compression,
+                    compression_level=compression_level,
+                    compression_threads=compression_threads,
+                    buffer_size=stream_buffer_size or io.DEFAULT_BUFFER_SIZE,
+                    **compressed_kwargs
+                )
+                if is_memory_map:
+                    fh = StreamedFile(fh, name="-")
+            elif is_memory_map:
+                fh = StreamedFile(stream.buffer, name="-", is_close_stream=False)
         else:
             if (
                 existing_file
@@ -157,14 +945,161 @@ class file_handle:
                         except IndexError:
                             message = "Output file already exists: '{}'"
                         sys.exit(message.format(self._filepath))
-            fh = open(self._filepath, mode, *args, **kwargs)
+            if compression in ("auto", "sniff"):
+                if self._filepath != os.devnull:
+                    compression = detect_compression(
+                        self._filepath,
+                        mode,
+                        is_sniff=compression == "sniff",
+                    )
+                else:
+                    compression = None
+            if is_atomic and self._filepath != os.devnull:
+                fh = self._open_atomic(
+                    mode=mode,
+                    compression=compression,
+                    compression_level=compression_level,
+                    compression_threads=compression_threads,
+                    buffer_size=buffer_size,
+                    is_fsync=is_fsync,
+                    **kwargs
+                )
+            elif compression:
+                stream_buffer_size, compressed_kwargs = _compressed_open_kwargs(kwargs, buffer_size)
+                fh = open_compressed(
+                    self._filepath,
+                    mode="rb" if is_memory_map else mode,
+                    compression=compression,
+                    compression_level=compression_level,
+                    compression_threads=compression_threads,
+                    buffer_size=stream_buffer_size or io.DEFAULT_BUFFER_SIZE,
+                    **compressed_kwargs
+                )
+                if is_memory_map:
+                    fh = StreamedFile(fh, name=self._filepath)
+            elif is_memory_map:
+                fh = self._open_memory_mapped(self._filepath)
+            else:
+                if buffer_size is not None:
+                    kwargs["buffering"] = buffer_size
+                fh = open(self._filepath, mode, *args, **kwargs)
         self._fh = fh
 
+    def _open_atomic(
+        self,
+        mode,
+        compression,
+        compression_level,
+        compression_threads,
+        buffer_size,
+        is_fsync,
+        **kwargs
+    ):
+        import tempfile
+        if "w" not in mode and "x" not in mode or "+" in mode:
+            raise ValueError("Atomic writes require mode 'w' or 'x', not '{}'".format(mode))
+        buffer_size, kwargs = _compressed_open_kwargs(kwargs, buffer_size)
+        if buffer_size is None:
+            buffer_size = 1 << 20
+        is_exclusive = "x" in mode
+        if is_exclusive and os.path.lexists(self._filepath):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), self._filepath)
+        dir_path, filename = os.path.split(self._filepath)
+        fd, temp_path = tempfile.mkstemp(
+            dir=dir_path or os.curdir,
+            prefix=".{}.".format(filename),
+            suffix=".tmp",
+        )
+        try:
+            try:
+                file_mode = stat.S_IMODE(os.stat(self._filepath).st_mode)
+            except FileNotFoundError:
+                file_mode = 0o666 & ~_get_umask()
+            os.fchmod(fd, file_mode)
+            if compression:
+                raw = open(fd, "wb", buffering=buffer_size)
+                fh = open_compressed(
+                    raw,
+                    mode=mode.replace("x", "w"),
+                    compression=compression,
+                    compression_level=compression_level,
+                    compression_threads=compression_threads,
+                    buffer_size=buffer_size,
+                    **kwargs
+                )
+            else:
+                raw = open(fd, mode.replace("x", "w"), buffering=buffer_size, **kwargs)
+                fh = raw
+        except BaseException:
+            os.close(fd)
+            os.unlink(temp_path)
+            raise
+        self._atomic_write = (temp_path, raw, is_fsync, is_exclusive)
+        return fh
+
+    def _finish_atomic(self, is_commit):
+        temp_path, raw, is_fsync, is_exclusive = self._atomic_write
+        self._atomic_write = None
+        try:
+            if self._fh is not raw and not self._fh.closed:
+                # compression/decoding layers do not close the underlying file
+                self._fh.close()
+            if is_commit:
+                raw.flush()
+                if is_fsync:
+                    os.fsync(raw.fileno())
+        except BaseException:
+            is_commit = False
+            raise
+        finally:
+            raw.close()
+            if is_commit and is_exclusive:
+                # no-clobber rename: linking fails if the target exists
+                try:
+                    os.link(temp_path, self._filepath)
+                finally:
+                    os.unlink(temp_path)
+                if is_fsync:
+                    _fsync_dir(os.path.dirname(self._filepath) or os.curdir)
+            elif is_commit:
+                os.replace(temp_path, self._filepath)
+                if is_fsync:
+                    _fsync_dir(os.path.dirname(self._filepath) or os.curdir)
+            else:
+                try:
+                    os.unlink(temp_path)
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _open_memory_mapped(filepath):
+        src = open(filepath, "rb")
+        try:
+            st = os.fstat(src.fileno())
+            if stat.S_ISREG(st.st_mode) and st.st_size > 0:
+                src.close()
+                return MappedFile(filepath)
+        except BaseException:
+            src.close()
+            raise
+        return StreamedFile(src, name=filepath)
+
+    @property
+    def filepath(self):
+        """
+        The path opened, after composing it with ``prefix`` and ``suffix``
+        and expanding variables and "~" (`os.devnull` if none was given, and
+        "-" for the standard streams).
+        """
+        return self._filepath
+
     def __enter__(self):
         return self._fh
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        if not self._fh.closed and self._fh not in (sys.stdin, sys.stdout, sys.stderr):
+        if self._atomic_write is not None:
+            self._finish_atomic(is_commit=exc_type is None)
+        elif not self._fh.closed and not _is_standard_stream(self._fh):
             try:
                 self._fh.close()
             except AttributeError:
@@ -195,3 +1130,787 @@ class file_handle:
 
 # }}}1 file_handle
 
+# Tee {{{1
+_tee_flush = object()
+
+class _TeeSink:
+    """
+    A single destination of a `TeeHandle`: a binary file object (and the
+    `file_handle` that opened it, if any) to which blocks are written either
+    directly, or, if ``max_queue_blocks`` is not `None`, by a background
+    thread fed through a queue holding at most ``max_queue_blocks`` blocks.
+    Errors raised on the background thread are re-raised on the next
+    write, flush or close.
+    """
+
+    def __init__(self, fh, handle=None, max_queue_blocks=None):
+        self.fh = fh
+        self.handle = handle
+        self.error = None
+        self._queue = None
+        self._thread = None
+        if max_queue_blocks is not None:
+            import queue
+            self._queue = queue.Queue(maxsize=max(1, max_queue_blocks))
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            if self.error is not None:
+                # keep draining so that the writer never blocks on a dead sink
+                continue
+            try:
+                if block is _tee_flush:
+                    self.fh.flush()
+                else:
+                    self.fh.write(block)
+            except BaseException as exc:
+                self.error = exc
+
+    def _check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def write(self, block):
+        self._check_error()
+        if self._queue is not None:
+            self._queue.put(block)
+        else:
+            self.fh.write(block)
+
+    def flush(self):
+        self.write(_tee_flush)
+
+    def finish(self, is_flush=True):
+        if self._thread is not None:
+            if is_flush:
+                self._queue.put(_tee_flush)
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            if is_flush:
+                self._check_error()
+        elif is_flush:
+            self.fh.flush()
+
+class TeeHandle:
+    """
+    Writes a single output stream to multiple destinations, for e.g., to
+    standard output, a log file and a compressed archive at once:
+
+        with TeeHandle(["-", "run.log", "run.log.gz"], "w") as dest:
+            dest.write(...)
+
+    Data written is accumulated (and, in text mode, encoded) once into blocks
+    of ``block_size`` bytes, each of which is then dispatched to every
+    destination. Each entry of ``destinations`` may be:
+
+    -   a path (including "-" for standard output), opened with
+        `file_handle` in binary mode, with ``kwargs`` (for e.g.,
+        ``existing_file``, ``compression``, ``is_atomic``) passed through;
+    -   a `dict` of `file_handle` keyword arguments for that destination
+        alone (with "path" giving the path), which may also include
+        "is_threaded" to override ``is_threaded`` for that destination;
+    -   an open file object (text or binary), which is written to but not
+        closed.
+
+    If ``is_threaded`` is `True`, then each destination (other than
+    open file objects, which are often standard streams whose ordering with
+    respect to other writes matters) is written on its own background thread,
+    fed by a queue of at most ``max_queue_blocks`` blocks, so that a slow
+    destination only holds up writes once its queue is full.
+
+    As with `file_handle`, destinations are closed on exiting the context,
+    and atomic writes are committed only if no exception was raised.
+    """
+
+    def __init__(
+        self,
+        destinations,
+        mode="w",
+        *,
+        block_size=1 << 16,
+        is_threaded=False,
+        max_queue_blocks=16,
+        encoding=None,
+        errors=None,
+        newline=None,
+        **kwargs
+    ):
+        if "r" in mode or "+" in mode:
+            raise ValueError("Tee handles are write-only, not '{}'".format(mode))
+        self.block_size = block_size
+        self._sinks = []
+        self._block = bytearray()
+        self._closed = False
+        binary_mode = mode.replace("t", "")
+        if "b" not in binary_mode:
+            binary_mode += "b"
+        try:
+            for destination in destinations:
+                self._sinks.append(self._open_sink(
+                    destination,
+                    binary_mode=binary_mode,
+                    is_threaded=is_threaded,
+                    max_queue_blocks=max_queue_blocks,
+                    kwargs=kwargs,
+                ))
+        except BaseException:
+            self._close_sinks(exc_info=sys.exc_info())
+            raise
+        raw = _TeeWriter(self)
+        if "b" in mode:
+            self._fh = raw
+        else:
+            self._fh = io.TextIOWrapper(
+                raw,
+                encoding=encoding,
+                errors=errors,
+                newline=newline,
+                write_through=True,
+            )
+
+    @staticmethod
+    def _open_sink(destination, binary_mode, is_threaded, max_queue_blocks, kwargs):
+        if hasattr(destination, "write"):
+            fh = getattr(destination, "buffer", destination)
+            if isinstance(destination, io.TextIOBase) and fh is destination:
+                raise ValueError("Text stream without an underlying binary buffer: {}".format(destination))
+            # flush pending text so output is not reordered
+            destination.flush()
+            return _TeeSink(fh)
+        if isinstance(destination, dict):
+            handle_kwargs = dict(kwargs)
+            handle_kwargs.update(destination)
+            path = handle_kwargs.pop("path")
+            is_threaded = handle_kwargs.pop("is_threaded", is_threaded)
+        else:
+            handle_kwargs = dict(kwargs)
+            path = destination
+        handle = file_handle(path, binary_mode, **handle_kwargs)
+        return _TeeSink(
+            fh=handle.__enter__(),
+            handle=handle,
+            max_queue_blocks=max_queue_blocks if is_threaded else None,
+        )
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _write(self, b):
+        if self._closed:
+            raise ValueError("I/O operation on closed file.")
+        self._block += b
+        if len(self._block) >= self.block_size:
+            self._dispatch()
+        return memoryview(b).nbytes
+
+    def _dispatch(self):
+        if not self._block:
+            return
+        block, self._block = bytes(self._block), bytearray()
+        for sink in self._sinks:
+            sink.write(block)
+
+    def flush(self):
+        """
+        Sends buffered data to all destinations and flushes them (threaded
+        destinations are flushed asynchronously, in order).
+        """
+        self._dispatch()
+        for sink in self._sinks:
+            sink.flush()
+
+    def _close_sinks(self, exc_info):
+        # a failing destination abandons only its own (atomic) write
+        error = None
+        for sink in self._sinks:
+            sink_exc_info = exc_info
+            try:
+                sink.finish(is_flush=exc_info[0] is None)
+            except BaseException as exc:
+                error = error or exc
+                sink_exc_info = (type(exc), exc, exc.__traceback__)
+            if sink.handle is not None:
+                try:
+                    sink.handle.__exit__(*sink_exc_info)
+                except BaseException as exc:
+                    error = error or exc
+        self._sinks = []
+        if error is not None:
+            raise error
+
+    def close(self, exc_info=(None, None, None)):
+        """
+        Writes any buffered data and closes all destinations opened by this
+        handle. If ``exc_info`` describes an exception, then buffered data is
+        discarded and atomic writes are abandoned.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if exc_info[0] is None:
+                self._dispatch()
+        except BaseException:
+            exc_info = sys.exc_info()
+            self._close_sinks(exc_info)
+            raise
+        self._close_sinks(exc_info)
+
+    def __enter__(self):
+        return self._fh
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close((exc_type, exc_value, exc_traceback))
+
+    def __getattr__(self, attr):
+        return object.__getattribute__(self._fh, attr)
+
+class _TeeWriter(io.RawIOBase):
+    """
+    Binary stream interface of a `TeeHandle`.
+    """
+
+    def __init__(self, tee):
+        super().__init__()
+        self._tee = tee
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self._tee._write(b)
+
+    def flush(self):
+        if not self.closed and not self._tee.closed:
+            self._tee.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._tee.close()
+        finally:
+            super().close()
+# }}}1 Tee
+
+# Sharding {{{1
+class _Shard:
+
+    def __init__(self, key, index, name):
+        self.key = key
+        self.index = index
+        self.name = name
+        self.path = None
+        self.num_records = 0
+        self.num_bytes = 0
+        self.handle = None
+        self.fh = None
+        self.is_opened = False
+
+    def as_dict(self):
+        return {
+            "path": self.path,
+            "key": self.key,
+            "index": self.index,
+            "records": self.num_records,
+            "bytes": self.num_bytes,
+        }
+
+_unsafe_shard_key_chars_re = re.compile(r"[%/\\\x00]")
+
+class ShardedWriter:
+    """
+    Splits output across multiple files ("shards"), each opened using
+    `file_handle` with the given ``prefix`` and ``suffix`` (and ``kwargs``,
+    for e.g. ``compression``), so that:
+
+        with ShardedWriter(prefix="output/part-", suffix=".jsonl.gz", max_records=10000) as dest:
+            for record in records:
+                dest.write(record)
+
+    writes "output/part-00000.jsonl.gz", "output/part-00001.jsonl.gz", etc.
+    The name between the prefix and suffix is given by ``shard_name_format``,
+    with fields ``index`` and ``key``; by default "{index:05d}", or
+    "{key}-{index:05d}" if records are routed by key. Keys are escaped (see
+    `escape_shard_key`), so that shards are always written under ``prefix``.
+
+    A new shard is started when writing a record would take the current shard
+    beyond ``max_bytes`` (of uncompressed data) or ``max_records`` records;
+    a record that is larger than ``max_bytes`` is written to a shard of its
+    own. Records are written as given: they should include line terminators
+    etc. as needed. In text mode, records are encoded using ``encoding``.
+
+    If ``key`` is passed to `write`, the record is routed to that key's own
+    sequence of shards. At most ``max_open_handles`` shards are kept open at
+    any time, with the least recently written closed as needed and reopened
+    in append mode when next written to, so the number of keys is not limited
+    by the number of available file descriptors.
+
+    On close, a manifest describing each shard (path, as resolved by
+    `file_handle`, key, index, number of records and bytes) is written as
+    JSON to ``manifest_path`` ("auto", the default, for "manifest.json"
+    composed with ``prefix``; `None` for no manifest). The same information
+    is available from `shards`. If the writer is closed on an exception
+    (or closing a shard fails), the manifest is marked with "is_complete"
+    set to `False`, as the shards may be truncated.
+    """
+
+    def __init__(
+        self,
+        prefix,
+        suffix=None,
+        mode="w",
+        *,
+        max_bytes=None,
+        max_records=None,
+        max_open_handles=64,
+        shard_name_format=None,
+        manifest_path="auto",
+        encoding="utf-8",
+        errors="strict",
+        **kwargs
+    ):
+        if mode.replace("b", "") not in ("w", "x"):
+            raise ValueError("Sharded writes require mode 'w' or 'x', not '{}'".format(mode))
+        if kwargs.get("is_atomic"):
+            raise ValueError("Atomic writes are not supported for shards")
+        if max_open_handles < 1:
+            raise ValueError("max_open_handles must be at least 1")
+        self.prefix = prefix
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.max_open_handles = max_open_handles
+        self.shard_name_format = shard_name_format
+        if manifest_path == "auto":
+            manifest_path = "{}manifest.json".format(prefix or "")
+        self.manifest_path = manifest_path
+        self._is_text = "b" not in mode
+        self._encoding = encoding
+        self._errors = errors
+        self._mode = mode.replace("b", "") + "b"
+        self._kwargs = kwargs
+        self._shards = []
+        self._current_shards = {}
+        self._open_shards = collections.OrderedDict()
+        self._closed = False
+
+    @property
+    def shards(self):
+        """
+        List of dictionaries describing the shards written so far.
+        """
+        return [shard.as_dict() for shard in self._shards]
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def compose_shard_name(self, index, key=None):
+        name_format = self.shard_name_format
+        if name_format is None:
+            name_format = "{index:05d}" if key is None else "{key}-{index:05d}"
+        return name_format.format(index=index, key="" if key is None else self.escape_shard_key(key))
+
+    @staticmethod
+    def escape_shard_key(key):
+        """
+        Returns ``key`` made safe for use in a file name, so that a key cannot
+        name a file outside of the output directory: path separators, NUL and
+        "%" are percent-encoded (as are the dots of the keys "." and "..").
+        """
+        key = str(key)
+        if key in (".", ".."):
+            return key.replace(".", "%2E")
+        return _unsafe_shard_key_chars_re.sub(lambda m: "%{:02X}".format(ord(m.group())), key)
+
+    def _new_shard(self, key, index):
+        name = self.compose_shard_name(index=index, key=key)
+        shard = _Shard(key=key, index=index, name=name)
+        self._shards.append(shard)
+        self._current_shards[key] = shard
+        return shard
+
+    def _open_shard(self, shard):
+        if shard.fh is not None:
+            self._open_shards.move_to_end(id(shard))
+            return
+        while len(self._open_shards) >= self.max_open_handles:
+            _, lru_shard = self._open_shards.popitem(last=False)
+            self._close_shard(lru_shard)
+        kwargs = dict(self._kwargs)
+        if shard.is_opened:
+            mode = "ab"
+            kwargs.pop("existing_file", None)
+        else:
+            mode = self._mode
+        shard.handle = file_handle(
+            shard.name,
+            mode,
+            prefix=self.prefix,
+            suffix=self.suffix,
+            is_allow_standard_streams=False,
+            **kwargs
+        )
+        shard.path = shard.handle.filepath
+        shard.fh = shard.handle.__enter__()
+        shard.is_opened = True
+        self._open_shards[id(shard)] = shard
+
+    def _close_shard(self, shard, exc_info=(None, None, None)):
+        handle, shard.handle, shard.fh = shard.handle, None, None
+        if handle is not None:
+            handle.__exit__(*exc_info)
+
+    def write(self, record, key=None):
+        """
+        Writes ``record`` to the current shard for ``key`` (or the single
+        sequence of shards if `None`), starting a new shard first if needed.
+        """
+        if self._closed:
+            raise ValueError("I/O operation on closed file.")
+        if self._is_text:
+            data = record.encode(self._encoding, self._errors)
+        else:
+            data = record
+        num_bytes = len(data)
+        shard = self._current_shards.get(key)
+        if shard is None:
+            shard = self._new_shard(key=key, index=0)
+        elif shard.num_records and (
+            (self.max_records is not None and shard.num_records >= self.max_records)
+            or (self.max_bytes is not None and shard.num_bytes + num_bytes > self.max_bytes)
+        ):
+            self._open_shards.pop(id(shard), None)
+            self._close_shard(shard)
+            shard = self._new_shard(key=key, index=shard.index + 1)
+        self._open_shard(shard)
+        shard.fh.write(data)
+        shard.num_records += 1
+        shard.num_bytes += num_bytes
+
+    def write_manifest(self, manifest_path=None, is_complete=True):
+        import json
+        if manifest_path is None:
+            manifest_path = self.manifest_path
+        with file_handle(manifest_path, "w", is_atomic=True, compression=None) as dest:
+            json.dump({"is_complete": is_complete, "shards": self.shards}, dest, indent=2)
+            dest.write("\n")
+
+    def close(self, exc_info=(None, None, None)):
+        """
+        Closes all open shards and writes the manifest (marked as incomplete
+        if ``exc_info`` describes an exception, or closing a shard fails).
+        """
+        if self._closed:
+            return
+        self._closed = True
+        is_complete = False
+        try:
+            while self._open_shards:
+                _, shard = self._open_shards.popitem(last=False)
+                self._close_shard(shard, exc_info)
+            is_complete = exc_info[0] is None
+        finally:
+            if self.manifest_path is not None:
+                self.write_manifest(is_complete=is_complete)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close((exc_type, exc_value, exc_traceback))
+# }}}1 Sharding
+
+# Prefetching {{{1
+class _ByteBudget:
+    """
+    Bounds the number of bytes read ahead but not yet consumed. Requests that
+    would exceed the budget wait until enough is released, unless nothing is
+    currently held (so that a single item larger than the budget can still be
+    read) or ``is_exempt_fn`` returns `True` (used to always let the source
+    being consumed make progress).
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.is_cancelled = False
+        self._condition = threading.Condition()
+
+    def acquire(self, num_bytes, is_exempt_fn=None):
+        with self._condition:
+            while (
+                not self.is_cancelled
+                and self.max_bytes is not None
+                and self.used > 0
+                and self.used + num_bytes > self.max_bytes
+                and not (is_exempt_fn is not None and is_exempt_fn())
+            ):
+                self._condition.wait()
+            self.used += num_bytes
+            return not self.is_cancelled
+
+    def release(self, num_bytes):
+        with self._condition:
+            self.used -= num_bytes
+            self._condition.notify_all()
+
+    def notify(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def cancel(self):
+        with self._condition:
+            self.is_cancelled = True
+            self._condition.notify_all()
+
+_prefetch_end = object()
+
+def iter_prefetched(
+    paths,
+    mode="rb",
+    num_prefetch=4,
+    chunk_size=None,
+    max_buffered_bytes=256 << 20,
+    is_ordered=True,
+    **kwargs
+):
+    """
+    Reads the files given by ``paths`` (opened using `file_handle` with
+    ``mode`` and ``kwargs``, so standard input, compressed files, etc. are
+    supported) ahead of the caller on a pool of threads, yielding
+    ``(path, data)`` tuples:
+
+    -   If ``chunk_size`` is `None`, ``data`` is the full contents of each
+        file; otherwise, successive chunks of (up to) ``chunk_size`` bytes
+        (or characters in text mode) of each file are yielded.
+    -   Up to ``num_prefetch`` files are read concurrently, subject to there
+        being no more than (approximately) ``max_buffered_bytes`` of data read
+        but not yet yielded (`None` for no limit). The file currently being
+        yielded is always allowed to make progress.
+    -   If ``is_ordered`` is `True`, data is yielded in the order of
+        ``paths``; otherwise, as soon as it is read (with the chunks of each
+        file still in order).
+
+    ``paths`` may be a (lazy) iterable: only up to ``num_prefetch`` paths
+    beyond the one being yielded are drawn from it at any time.
+    """
+    import queue
+    import concurrent.futures
+    budget = _ByteBudget(max_buffered_bytes)
+    stop_event = threading.Event()
+    paths_iter = iter(paths)
+    output_queue = queue.Queue()
+    # each entry of `active` is [index, path, queue]
+    active = collections.deque()
+    head_index = [0]
+
+    def _read(index, path, target_queue):
+        is_exempt_fn = (lambda: head_index[0] == index) if is_ordered else None
+        try:
+            if chunk_size is None:
+                try:
+                    estimate = os.path.getsize(path)
+                except (OSError, TypeError):
+                    estimate = 0
+            else:
+                estimate = chunk_size
+            with file_handle(path, mode, **kwargs) as src:
+                while not stop_event.is_set():
+                    if not budget.acquire(estimate, is_exempt_fn):
+                        break
+                    if chunk_size is None:
+                        data = src.read()
+                    else:
+                        data = src.read(chunk_size)
+                    budget.release(estimate - len(data))
+                    if not data:
+                        break
+                    target_queue.put((index, path, data))
+                    if chunk_size is None:
+                        break
+        except BaseException as e:
+            target_queue.put((index, path, e))
+        target_queue.put((index, path, _prefetch_end))
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_prefetch)
+    next_index = 0
+
+    def _fill():
+        nonlocal next_index
+        while len(active) < num_prefetch:
+            try:
+                path = next(paths_iter)
+            except StopIteration:
+                return
+            target_queue = queue.Queue() if is_ordered else output_queue
+            active.append([next_index, path, target_queue])
+            executor.submit(_read, next_index, path, target_queue)
+            next_index += 1
+
+    try:
+        _fill()
+        while active:
+            if is_ordered:
+                index, path, target_queue = active[0]
+                head_index[0] = index
+                budget.notify()
+                item = target_queue.get()
+            else:
+                item = output_queue.get()
+            index, path, data = item
+            if data is _prefetch_end:
+                if is_ordered:
+                    active.popleft()
+                else:
+                    for entry in active:
+                        if entry[0] == index:
+                            active.remove(entry)
+                            break
+                _fill()
+                continue
+            if isinstance(data, BaseException):
+                raise data
+            budget.release(len(data))
+            yield path, data
+    finally:
+        stop_event.set()
+        budget.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+# }}}1 Prefetching
+
+# Line Chunking {{{1
+def iter_line_chunks(src, chunk_size=1 << 20):
+    """
+    Yields the contents of ``src`` in (binary) chunks of about
+    ``chunk_size`` bytes, each ending on a line boundary (i.e., with
+    b"\\n", except possibly the last), so that each chunk can be processed
+    independently (e.g., split with ``bytes.splitlines``) without decoding or
+    allocating objects line by line.
+
+    ``src`` may be a path (opened with `file_handle` in memory-mapped mode,
+    falling back to streaming reads for standard input, pipes, compressed
+    files, etc.), a `MappedFile` (in which case chunks are zero-copy
+    `memoryview` slices of the mapping), a `StreamedFile`, or any binary
+    file object.
+    """
+    if isinstance(src, (str, bytes, os.PathLike)):
+        with file_handle(src, "rb", is_memory_map=True) as fh:
+            yield from iter_line_chunks(fh, chunk_size=chunk_size)
+        return
+    if isinstance(src, MappedFile):
+        yield from _iter_mapped_line_chunks(src, chunk_size)
+        return
+    if isinstance(src, StreamedFile):
+        read = src._stream.read
+    else:
+        read = src.read
+    remainder = b""
+    while True:
+        data = read(chunk_size)
+        if not data:
+            break
+        if remainder:
+            data = remainder + data
+        idx = data.rfind(b"\n")
+        if idx < 0:
+            remainder = data
+            continue
+        if idx == len(data) - 1:
+            remainder = b""
+            yield data
+        else:
+            remainder = data[idx + 1:]
+            yield data[:idx + 1]
+    if remainder:
+        yield remainder
+
+def _iter_mapped_line_chunks(mapped_file, chunk_size):
+    find = mapped_file._mmap.rfind
+    forward_find = mapped_file._mmap.find
+    view = mapped_file.view
+    pos = mapped_file.tell()
+    size = len(view)
+    while pos < size:
+        end = pos + chunk_size
+        if end >= size:
+            end = size
+        else:
+            idx = find(b"\n", pos, end)
+            if idx < 0:
+                idx = forward_find(b"\n", end)
+            end = size if idx < 0 else idx + 1
+        mapped_file.seek(end)
+        yield view[pos:end]
+        pos = end
+
+def iter_line_records(src, chunk_size=1 << 20, keepends=False):
+    """
+    Yields each line of ``src`` (see `iter_line_chunks`) as a `memoryview`
+    slice, without copying, and including the line terminator only if
+    ``keepends`` is `True`. Slices are taken directly from the mapping for
+    memory-mapped sources, or from the chunk containing the line otherwise
+    (in which case they keep the chunk alive, so should be released or
+    copied with ``bytes()`` if retained).
+    """
+    if isinstance(src, (str, bytes, os.PathLike)):
+        with file_handle(src, "rb", is_memory_map=True) as fh:
+            yield from iter_line_records(fh, chunk_size=chunk_size, keepends=keepends)
+        return
+    if isinstance(src, MappedFile):
+        yield from src.iter_lines(keepends=keepends)
+        return
+    for chunk in iter_line_chunks(src, chunk_size=chunk_size):
+        view = memoryview(chunk)
+        find = chunk.find
+        pos = 0
+        size = len(chunk)
+        while pos < size:
+            end = find(b"\n", pos)
+            if end < 0:
+                end = next_pos = size
+            else:
+                next_pos = end + 1
+            yield view[pos:next_pos if keepends else end]
+            pos = next_pos
+
+def iter_line_batches(src, batch_size=10000, chunk_size=1 << 20, keepends=False):
+    """
+    Yields lists of (up to) ``batch_size`` lines of ``src`` (see
+    `iter_line_chunks`) as `bytes` objects, for vectorized processing.
+    Lines are split from each chunk in a single ``split`` call, on "\n"
+    only, so that line boundaries (and counts) are the same as when
+    iterating over the lines of the file.
+    """
+    batch = []
+    for chunk in iter_line_chunks(src, chunk_size=chunk_size):
+        if isinstance(chunk, memoryview):
+            chunk = bytes(chunk)
+        newline = b"\n" if isinstance(chunk, bytes) else "\n"
+        lines = chunk.split(newline)
+        # (empty if the chunk ends with a newline)
+        last_line = lines.pop()
+        if keepends:
+            lines = [line + newline for line in lines]
+        if last_line:
+            lines.append(last_line)
+        idx = 0
+        while idx < len(lines):
+            num_needed = batch_size - len(batch)
+            batch.extend(lines[idx:idx + num_needed])
+            idx += num_needed
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+# }}}1 Line Chunking
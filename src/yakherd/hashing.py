@@ -0,0 +1,188 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+
+import hashlib
+from yakherd import filesystem
+
+default_algorithm = "blake2b"
+
+def hash_file(path, algorithm=default_algorithm, chunk_size=1 << 20, max_bytes=None):
+    """
+    Returns the digest (as `bytes`) of the contents of the file at ``path``
+    (or, if ``max_bytes`` is not `None`, of its first ``max_bytes`` bytes),
+    using the `hashlib` ``algorithm``. The file is read in chunks of
+    ``chunk_size`` bytes into a single reused buffer. `hashlib` releases the
+    GIL while hashing large chunks, so multiple files can be hashed in
+    parallel on threads (see `hash_files`).
+    """
+    hasher = hashlib.new(algorithm)
+    if max_bytes is not None:
+        chunk_size = max(1, min(chunk_size, max_bytes))
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    remaining = max_bytes
+    with filesystem.file_handle(path, "rb", buffering=0, compression=None) as src:
+        while remaining is None or remaining > 0:
+            if remaining is not None and remaining < chunk_size:
+                num_read = src.readinto(view[:remaining])
+            else:
+                num_read = src.readinto(view)
+            if not num_read:
+                break
+            hasher.update(view[:num_read])
+            if remaining is not None:
+                remaining -= num_read
+    return hasher.digest()
+
+def hash_files(
+    paths,
+    algorithm=default_algorithm,
+    chunk_size=1 << 20,
+    max_bytes=None,
+    max_workers=None,
+):
+    """
+    Hashes the files at ``paths`` (see `hash_file`) on a pool of
+    ``max_workers`` threads, yielding ``(path, digest)`` tuples in the
+    order of ``paths``. ``paths`` may be a (lazy) iterable: at most twice
+    as many files as there are threads are submitted ahead of the one being
+    yielded, so a slow consumer does not cause all the files to be queued
+    (and their digests held) at once.
+    """
+    import collections.abc
+    import concurrent.futures
+    import functools
+    import os
+    if max_workers == 1 or (isinstance(paths, collections.abc.Sized) and len(paths) < 2):
+        for path in paths:
+            yield path, hash_file(path, algorithm, chunk_size, max_bytes)
+        return
+    fn = functools.partial(
+        hash_file,
+        algorithm=algorithm,
+        chunk_size=chunk_size,
+        max_bytes=max_bytes,
+    )
+    paths_iter = iter(paths)
+    pending = collections.deque()
+    num_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = 2 * num_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        try:
+            for path in paths_iter:
+                pending.append((path, executor.submit(fn, path)))
+                if len(pending) >= max_in_flight:
+                    path, future = pending.popleft()
+                    yield path, future.result()
+            while pending:
+                path, future = pending.popleft()
+                yield path, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+def find_duplicates(
+    paths,
+    algorithm=default_algorithm,
+    partial_bytes=1 << 16,
+    min_size=1,
+    chunk_size=1 << 20,
+    max_workers=None,
+):
+    """
+    Finds groups of files with identical contents among ``paths`` (paths or
+    `filesystem.StatPath` objects, whose stat results are reused), returning
+    a list of ``(size, digest, paths)`` tuples, one for each group of two or
+    more files, ordered by decreasing size. To minimize the amount of data
+    read:
+
+    -   Files are first bucketed by size, and only files that share their
+        size with another file are read at all.
+    -   Of those, the first ``partial_bytes`` bytes are hashed, and only
+        files that share their size and partial hash with another are then
+        hashed in full (files no larger than ``partial_bytes`` are already
+        fully hashed).
+
+    Hashing is done in parallel by ``max_workers`` threads (see
+    `hash_files`). Files smaller than ``min_size`` bytes and paths that are
+    not regular files are ignored. Multiple (hard) links to the same file
+    are only considered once (the first path given is used).
+    """
+    import os
+    import stat
+    size_buckets = {}
+    seen = set()
+    for path in paths:
+        stat_result = getattr(path, "stat_result", None)
+        if stat_result is None:
+            stat_result = os.stat(path)
+        if not stat.S_ISREG(stat_result.st_mode) or stat_result.st_size < min_size:
+            continue
+        identity = (stat_result.st_dev, stat_result.st_ino)
+        if identity in seen:
+            continue
+        seen.add(identity)
+        size_buckets.setdefault(stat_result.st_size, []).append(os.fspath(path))
+    # groups are keyed by (size, digest)
+    candidates = {
+        (size, None): bucket for size, bucket in size_buckets.items() if len(bucket) > 1
+    }
+    def _regroup(groups, is_partial):
+        sizes = {}
+        to_hash = []
+        for (size, _), group in groups.items():
+            for path in group:
+                sizes[path] = size
+                to_hash.append(path)
+        hashed = {}
+        for path, digest in hash_files(
+            to_hash,
+            algorithm=algorithm,
+            chunk_size=chunk_size,
+            max_bytes=partial_bytes if is_partial else None,
+            max_workers=max_workers,
+        ):
+            hashed.setdefault((sizes[path], digest), []).append(path)
+        return {key: group for key, group in hashed.items() if len(group) > 1}
+    partial_groups = _regroup(candidates, is_partial=True)
+    complete_groups = {
+        key: group for key, group in partial_groups.items() if key[0] <= partial_bytes
+    }
+    complete_groups.update(_regroup(
+        {key: group for key, group in partial_groups.items() if key[0] > partial_bytes},
+        is_partial=False,
+    ))
+    return sorted(
+        ((size, digest, group) for (size, digest), group in complete_groups.items()),
+        key=lambda item: (-item[0], item[2]),
+    )
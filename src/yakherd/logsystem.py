@@ -146,7 +146,8 @@ class Logger:
             )
 
         # needed to avoid clutter on screen in the case of no handlers
-        self._log.addHandler(logging.NullHandler())
+        self._null_handler = logging.NullHandler()
+        self._log.addHandler(self._null_handler)
         for (handler_prefix_key, default_state, default_stream, formatter_type) in (
             ("console", True, sys.stderr, ConsoleFormatter),
             ("logfile", False, None, LogFileFormatter),
@@ -183,6 +184,21 @@ class Logger:
             "stderr": self.theme_colors["process_stderr"],
         }
 
+    def close(self):
+        """
+        Removes (and closes) the handlers added by this logger from the
+        underlying `logging` logger, which is shared by all the loggers with
+        the same name, so that a replacement logger does not duplicate its
+        output.
+        """
+        for handler in [self._null_handler] + list(self.handlers.values()):
+            if handler is None:
+                continue
+            self._log.removeHandler(handler)
+            handler.close()
+        self.handlers = {key: None for key in self.handlers}
+        self.console_handler = None
+
     def _log_message(self, msg, log_fn, **kwargs):
         theme_color = kwargs.pop("color", None)
         if theme_color is not None:
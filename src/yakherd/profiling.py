@@ -0,0 +1,237 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import sys
+import threading
+import collections
+from yakherd import textprocessing
+
+# SamplingProfiler {{{1
+
+class SamplingProfiler:
+    """
+    Statistical profiler that periodically samples the call stack of a thread
+    (by default, the one that creates the profiler) from a background thread.
+    Much lower overhead than the deterministic `cProfile` profiler, at the
+    cost of precision, so better suited to long-running commands.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        if thread_id is None:
+            thread_id = threading.get_ident()
+        self.thread_id = thread_id
+        self.num_samples = 0
+        self.self_samples = collections.Counter()
+        self.total_samples = collections.Counter()
+        self._stop_event = threading.Event()
+        self._sampler_thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._sampler_thread = threading.Thread(target=self._sample, daemon=True)
+        self._sampler_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._sampler_thread is not None:
+            self._sampler_thread.join()
+            self._sampler_thread = None
+
+    def runcall(self, fn, /, *args, **kwargs):
+        self.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.stop()
+
+    def _sample(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.num_samples += 1
+            self.self_samples[self._frame_key(frame)] += 1
+            seen = set()
+            while frame is not None:
+                key = self._frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    self.total_samples[key] += 1
+                frame = frame.f_back
+
+    @staticmethod
+    def _frame_key(frame):
+        code = frame.f_code
+        return (code.co_filename, code.co_firstlineno, code.co_name)
+
+    def rows(self, limit=None):
+        rows = []
+        num_samples = max(self.num_samples, 1)
+        for key, total in self.total_samples.most_common(limit):
+            rows.append({
+                "total": total,
+                "total%": "{:.1f}".format(100.0 * total / num_samples),
+                "self": self.self_samples.get(key, 0),
+                "self%": "{:.1f}".format(100.0 * self.self_samples.get(key, 0) / num_samples),
+                "function": _format_function(key),
+            })
+        return rows
+
+# }}}1 SamplingProfiler
+
+# Support {{{1
+
+def _format_function(key):
+    filename, lineno, fn_name = key
+    return "{}:{}({})".format(filename, lineno, fn_name)
+
+def deterministic_profile_rows(profiler, limit=None):
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    entries = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    rows = []
+    for key, (num_primitive_calls, num_calls, total_time, cumulative_time, callers) in entries[:limit]:
+        if num_calls == num_primitive_calls:
+            ncalls = str(num_calls)
+        else:
+            ncalls = "{}/{}".format(num_calls, num_primitive_calls)
+        rows.append({
+            "ncalls": ncalls,
+            "tottime": "{:.4f}".format(total_time),
+            "cumtime": "{:.4f}".format(cumulative_time),
+            "function": _format_function(key),
+        })
+    return rows
+
+def memory_allocation_rows(snapshot, limit=None):
+    rows = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            "size_kib": "{:.1f}".format(stat.size / 1024),
+            "count": stat.count,
+            "location": "{}:{}".format(frame.filename, frame.lineno),
+        })
+    return rows
+
+def _write_table(path, title, rows):
+    from yakherd import filesystem
+    with filesystem.file_handle(path, "w") as dest:
+        dest.write("{}\n\n".format(title))
+        dest.write(textprocessing.format_dict_table(rows))
+        dest.write("\n")
+
+# }}}1 Support
+
+# run_profiled {{{1
+
+def run_profiled(
+    fn,
+    kwargs,
+    cpu_path=None,
+    cpu_mode="deterministic",
+    memory_path=None,
+    num_top=20,
+    sampling_interval=0.005,
+    logger=None,
+):
+    """
+    Calls ``fn(**kwargs)`` under a CPU profiler (if ``cpu_path`` is given)
+    and/or with memory allocations traced (if ``memory_path`` is given). The
+    full reports are written to the respective paths, and the top ``num_top``
+    entries of each are logged through ``logger`` (if given). Reports are
+    produced even if ``fn`` raises.
+
+    ``cpu_mode`` is one of "deterministic" (`cProfile`) or "sampling"
+    (`SamplingProfiler`). If ``cpu_path`` ends with ".prof" or ".pstats",
+    deterministic profiling results are dumped in the binary `pstats`
+    format for external viewers instead of being tabulated.
+    """
+    if memory_path:
+        import tracemalloc
+        tracemalloc.start()
+    if not cpu_path:
+        profiler = None
+    elif cpu_mode == "deterministic":
+        import cProfile
+        profiler = cProfile.Profile()
+    elif cpu_mode == "sampling":
+        profiler = SamplingProfiler(interval=sampling_interval)
+    else:
+        raise ValueError(cpu_mode)
+    try:
+        if profiler is not None:
+            return profiler.runcall(fn, **kwargs)
+        else:
+            return fn(**kwargs)
+    finally:
+        if memory_path:
+            snapshot = tracemalloc.take_snapshot()
+            current_size, peak_size = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _write_table(
+                memory_path,
+                "Peak traced memory: {:.1f} KiB".format(peak_size / 1024),
+                memory_allocation_rows(snapshot),
+            )
+            if logger is not None:
+                logger.log_info("Top memory allocation sites (peak {:.1f} KiB; full report: '{}'):".format(
+                    peak_size / 1024,
+                    memory_path,
+                ))
+                logger.log_info(textprocessing.format_dict_table_rows(
+                    memory_allocation_rows(snapshot, limit=num_top)
+                ))
+        if profiler is not None:
+            if cpu_mode == "sampling":
+                rows = profiler.rows()
+                top_rows = profiler.rows(limit=num_top)
+                title = "{} samples at {}s intervals".format(profiler.num_samples, profiler.interval)
+            else:
+                rows = None
+                top_rows = deterministic_profile_rows(profiler, limit=num_top)
+                title = "Deterministic profile"
+            if rows is None and str(cpu_path).endswith((".prof", ".pstats")):
+                profiler.dump_stats(str(cpu_path))
+            else:
+                if rows is None:
+                    rows = deterministic_profile_rows(profiler)
+                _write_table(cpu_path, title, rows)
+            if logger is not None:
+                logger.log_info("Top functions ({}; full report: '{}'):".format(
+                    title[0].lower() + title[1:],
+                    cpu_path,
+                ))
+                logger.log_info(textprocessing.format_dict_table_rows(top_rows))
+
+# }}}1 run_profiled
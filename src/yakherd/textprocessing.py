@@ -32,6 +32,49 @@
 
 # format_dict_table {{{1
 
+def _table_border_rules(border_style):
+    """
+    Returns the strings that make up the rules of a table of the given
+    ``border_style``: vertical rule, horizontal rule, rule junction, left and
+    right table edges, and left and right table edge junctions.
+    """
+    if border_style == -1:
+        # default to Markdown/GH style
+        vertical_rule = ' | '
+        horizontal_rule = '-'
+        rule_junction = '-|-'
+    elif border_style == 0:
+        vertical_rule = '  '
+        horizontal_rule = ''
+        rule_junction = ''
+    elif border_style == 1:
+        vertical_rule = ' '
+        horizontal_rule = '-'
+        rule_junction = '-'
+    else:
+        vertical_rule = ' | '
+        horizontal_rule = '-'
+        rule_junction = '-+-'
+    if border_style >= 3:
+        left_table_edge_rule = '| '
+        right_table_edge_rule = ' |'
+        left_table_edge_rule_junction = '+-'
+        right_table_edge_rule_junction = '-+'
+    else:
+        left_table_edge_rule = ''
+        right_table_edge_rule = ''
+        left_table_edge_rule_junction = ''
+        right_table_edge_rule_junction = ''
+    return (
+        vertical_rule,
+        horizontal_rule,
+        rule_junction,
+        left_table_edge_rule,
+        right_table_edge_rule,
+        left_table_edge_rule_junction,
+        right_table_edge_rule_junction,
+    )
+
 def format_dict_table(*args, **kwargs):
     """
     Returns a (single) string representation of a tuple of dictionaries in a
@@ -65,36 +108,16 @@ def format_dict_table_rows(rows, column_names=None, max_column_width=None, borde
             except:
                 column_list = None
         if column_list:
-            # characters that make up the table rules
             border_style = int(border_style)
-            #border_style = 0
-            if border_style == -1:
-                # default to Markdown/GH style
-                vertical_rule = ' | '
-                horizontal_rule = '-'
-                rule_junction = '-|-'
-            elif border_style == 0:
-                vertical_rule = '  '
-                horizontal_rule = ''
-                rule_junction = ''
-            elif border_style == 1:
-                vertical_rule = ' '
-                horizontal_rule = '-'
-                rule_junction = '-'
-            else:
-                vertical_rule = ' | '
-                horizontal_rule = '-'
-                rule_junction = '-+-'
-            if border_style >= 3:
-                left_table_edge_rule = '| '
-                right_table_edge_rule = ' |'
-                left_table_edge_rule_junction = '+-'
-                right_table_edge_rule_junction = '-+'
-            else:
-                left_table_edge_rule = ''
-                right_table_edge_rule = ''
-                left_table_edge_rule_junction = ''
-                right_table_edge_rule_junction = ''
+            (
+                vertical_rule,
+                horizontal_rule,
+                rule_junction,
+                left_table_edge_rule,
+                right_table_edge_rule,
+                left_table_edge_rule_junction,
+                right_table_edge_rule_junction,
+            ) = _table_border_rules(border_style)
 
             if max_column_width:
                 column_list = [c[:max_column_width] for c in column_list]
@@ -131,4 +154,169 @@ def format_dict_table_rows(rows, column_names=None, max_column_width=None, borde
     else:
         return ''
 
+def iter_dict_table_rows(
+    rows,
+    column_names=None,
+    max_column_width=None,
+    border_style=-1,
+    width_mode="spill",
+    max_buffered_rows=10000,
+    sample_size=1000,
+    overflow="extend",
+    temp_dir=None,
+):
+    """
+    Streaming version of `format_dict_table_rows`: ``rows`` can be any
+    iterable of dictionaries (for e.g., a generator), and the lines of the
+    table (in the same format, with the same border styles) are yielded as
+    they are produced, rather than returned as a list. If ``column_names``
+    is not given, the keys of the first row are used.
+
+    Column widths are determined according to ``width_mode``:
+
+    -   "spill" (the default): the widths are computed over all the rows in
+        a first pass. Up to ``max_buffered_rows`` rows are held in memory;
+        beyond that, the (formatted) rows are spilled to a temporary file (in
+        ``temp_dir``) that is read back to render the table in a second pass.
+    -   "sample": the widths are estimated from the first ``sample_size``
+        rows, after which lines are produced immediately as each row is
+        read. Values that do not fit the estimated widths are either written
+        in full, breaking the alignment of that row (``overflow`` "extend"),
+        or cut short (``overflow`` "truncate").
+
+    Memory use is independent of the number of rows in either mode.
+    """
+    import itertools
+    if width_mode not in ("spill", "sample"):
+        raise ValueError(width_mode)
+    if overflow not in ("extend", "truncate"):
+        raise ValueError(overflow)
+    rows = iter(rows)
+    if not column_names:
+        try:
+            first_row = next(rows)
+        except StopIteration:
+            return
+        column_names = list(first_row.keys())
+        rows = itertools.chain([first_row], rows)
+        if not column_names:
+            return
+    column_keys = list(column_names)
+    column_list = [str(c) for c in column_names]
+    if max_column_width:
+        column_list = [c[:max_column_width] for c in column_list]
+    def _cells(row):
+        if max_column_width:
+            return [str(row[k])[:max_column_width] for k in column_keys]
+        return [str(row[k]) for k in column_keys]
+    lengths = [len(c) for c in column_list]
+    def _update_lengths(cells):
+        for idx, cell in enumerate(cells):
+            if len(cell) > lengths[idx]:
+                lengths[idx] = len(cell)
+    if width_mode == "sample":
+        buffered = [_cells(row) for row in itertools.islice(rows, sample_size)]
+        for cells in buffered:
+            _update_lengths(cells)
+        remaining = (_cells(row) for row in rows)
+        spill_file = None
+    else:
+        buffered = []
+        spill_file = None
+        for row in rows:
+            cells = _cells(row)
+            _update_lengths(cells)
+            buffered.append(cells)
+            if len(buffered) >= max_buffered_rows:
+                spill_file = _spill_table_rows(buffered, spill_file, temp_dir)
+                buffered = []
+        if spill_file is not None:
+            spill_file = _spill_table_rows(buffered, spill_file, temp_dir)
+            buffered = []
+            remaining = _iter_spilled_table_rows(spill_file)
+        else:
+            remaining = iter(())
+    try:
+        yield from _render_table_lines(
+            itertools.chain(buffered, remaining),
+            column_list=column_list,
+            lengths=lengths,
+            border_style=int(border_style),
+            is_truncate=overflow == "truncate",
+        )
+    finally:
+        if spill_file is not None:
+            spill_file.close()
+
+def _spill_table_rows(rows, spill_file, temp_dir):
+    import pickle
+    import tempfile
+    if spill_file is None:
+        spill_file = tempfile.TemporaryFile(dir=temp_dir)
+    if rows:
+        pickle.dump(rows, spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return spill_file
+
+def _iter_spilled_table_rows(spill_file):
+    import pickle
+    spill_file.flush()
+    spill_file.seek(0)
+    while True:
+        try:
+            rows = pickle.load(spill_file)
+        except EOFError:
+            return
+        yield from rows
+
+def _render_table_lines(rows, column_list, lengths, border_style, is_truncate):
+    (
+        vertical_rule,
+        horizontal_rule,
+        rule_junction,
+        left_table_edge_rule,
+        right_table_edge_rule,
+        left_table_edge_rule_junction,
+        right_table_edge_rule_junction,
+    ) = _table_border_rules(border_style)
+    full_line = (
+        left_table_edge_rule_junction
+        + rule_junction.join(horizontal_rule * length for length in lengths)
+        + right_table_edge_rule_junction
+    )
+    def _format(cells):
+        if is_truncate:
+            cells = [cell[:length] for cell, length in zip(cells, lengths)]
+        return (
+            left_table_edge_rule
+            + vertical_rule.join(cell.ljust(length) for cell, length in zip(cells, lengths))
+            + right_table_edge_rule
+        )
+    if border_style > 0:
+        yield full_line
+    yield _format(column_list)
+    if border_style == -1 or border_style > 0:
+        yield full_line
+    for cells in rows:
+        yield _format(cells)
+    if border_style > 0:
+        yield full_line
+
+def write_dict_table(dest, rows, **kwargs):
+    """
+    Writes the table of ``rows`` (see `iter_dict_table_rows`, to which
+    ``kwargs`` are passed) to ``dest`` (a file-like object, or a function
+    that is called with each line) one line at a time, as the lines are
+    produced. Returns the number of lines written.
+    """
+    write = getattr(dest, "write", None)
+    num_lines = 0
+    for line in iter_dict_table_rows(rows, **kwargs):
+        if write is None:
+            dest(line)
+        else:
+            write(line)
+            write("\n")
+        num_lines += 1
+    return num_lines
+
 # }}}1 format_dict_table
@@ -0,0 +1,192 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import os
+import time
+import yakherd
+
+def process_start_time():
+    """
+    Returns the (wall clock) time at which the current process was started,
+    or `None` if this cannot be determined on this platform.
+    """
+    try:
+        with open("/proc/self/stat") as src:
+            stat = src.read()
+        # fields following the (parenthesized, possibly space-containing)
+        # command name start from field 3; 'starttime' is field 22
+        start_ticks = int(stat[stat.rindex(")") + 2:].split()[19])
+        with open("/proc/uptime") as src:
+            uptime = float(src.read().split()[0])
+        ticks_per_second = os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return time.time() - (uptime - start_ticks / ticks_per_second)
+
+# PhaseTimer {{{1
+
+class PhaseTimer:
+    """
+    Accumulates the (wall clock) time spent in named phases of a run.
+    Cheap enough to be always on: each phase costs two `time.perf_counter`
+    calls.
+
+    ::
+
+        timer = PhaseTimer()
+        with timer.phase("parse"):
+            ...
+        timer.record("command", elapsed)
+
+    Phases are reported in the order they are first entered. Phases entered
+    more than once are accumulated. The time spent in a phase entered while
+    another is active is only counted in the inner phase, so that the phases
+    add up to the total.
+    """
+
+    class _Phase:
+
+        def __init__(self, timer, name):
+            self._timer = timer
+            self._name = name
+            self._nested_elapsed = 0.0
+
+        def __enter__(self):
+            self._timer._active_phases.append(self)
+            self._start = time.perf_counter()
+            return self
+
+        def __exit__(self, exc_type, exc_value, exc_traceback):
+            elapsed = time.perf_counter() - self._start
+            active_phases = self._timer._active_phases
+            active_phases.remove(self)
+            if active_phases:
+                active_phases[-1]._nested_elapsed += elapsed
+            self._timer.record(self._name, elapsed - self._nested_elapsed)
+
+    def __init__(self):
+        self.created_perf_counter = time.perf_counter()
+        self._elapsed = {}
+        self._counts = {}
+        self._marks = {}
+        self._active_phases = []
+
+    def phase(self, name):
+        return PhaseTimer._Phase(self, name)
+
+    def record(self, name, elapsed):
+        self._elapsed[name] = self._elapsed.get(name, 0.0) + elapsed
+        self._counts[name] = self._counts.get(name, 0) + 1
+
+    def record_since(self, name, start_perf_counter):
+        self.record(name, time.perf_counter() - start_perf_counter)
+
+    def mark(self, name):
+        """
+        Notes the current time as the (provisional) end of the phase ``name``,
+        taken to start when this timer was created. Calling this repeatedly
+        moves the end forward; the phase is recorded by `record_mark`.
+        """
+        self._marks[name] = time.perf_counter()
+
+    def record_mark(self, name):
+        """
+        Records the phase ``name`` as lasting from the creation of this timer to
+        the last call to `mark` (or to now, if never marked), unless already
+        recorded.
+        """
+        if name not in self._elapsed:
+            end = self._marks.get(name)
+            if end is None:
+                end = time.perf_counter()
+            self.record(name, end - self.created_perf_counter)
+
+    def __contains__(self, name):
+        return name in self._elapsed
+
+    def elapsed(self, name):
+        return self._elapsed.get(name, 0.0)
+
+    def as_dict(self, is_include_startup=True):
+        """
+        Returns mapping of phase names to elapsed seconds. If
+        ``is_include_startup`` is `True`, the time from process start to the
+        import of `yakherd` ("startup") and from then on to creation of
+        this timer ("imports") are included as leading phases.
+        """
+        d = {}
+        if is_include_startup:
+            start_time = process_start_time()
+            if start_time is not None:
+                d["startup"] = max(yakherd._import_wall_time - start_time, 0.0)
+            d["imports"] = self.created_perf_counter - yakherd._import_perf_counter
+        d.update(self._elapsed)
+        return d
+
+    def rows(self, is_include_startup=True):
+        d = self.as_dict(is_include_startup=is_include_startup)
+        total = sum(d.values())
+        rows = []
+        for name, elapsed in d.items():
+            rows.append({
+                "phase": name,
+                "calls": self._counts.get(name, 1),
+                "seconds": "{:.6f}".format(elapsed),
+                "percent": "{:.1f}".format(100.0 * elapsed / total if total else 0.0),
+            })
+        rows.append({
+            "phase": "total",
+            "calls": "",
+            "seconds": "{:.6f}".format(total),
+            "percent": "100.0",
+        })
+        return rows
+
+    def append_json(self, path, **metadata):
+        """
+        Appends the timings, along with any other data given as keyword
+        arguments, as a single JSON line to ``path``.
+        """
+        import json
+        from yakherd import filesystem
+        phases = self.as_dict()
+        record = {
+            "timestamp": time.time(),
+        }
+        record.update(metadata)
+        record["phases"] = phases
+        record["total"] = sum(phases.values())
+        with filesystem.file_handle(path, "a") as dest:
+            dest.write(json.dumps(record, separators=(",", ":")))
+            dest.write("\n")
+
+# }}}1 PhaseTimer
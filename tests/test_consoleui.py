@@ -0,0 +1,266 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import unittest
+import yakherd
+from yakherd import completion
+from yakherd import consoleui
+
+def _build_command():
+    main_cmd = consoleui.CommandParser(name="foo")
+    main_cmd.add_argument("--flag", action="store_true")
+    main_cmd.add_argument("--mode", choices=["fast", "slow"])
+    run_cmd = main_cmd.add_subcommand("run")
+    run_cmd.add_path_argument("src_paths", nargs="+")
+    run_cmd.add_path_argument("--output", environ_var="FOO_OUTPUT")
+    main_cmd.add_subcommand("report")
+    return main_cmd
+
+class PathArgumentTestCase(unittest.TestCase):
+
+    def test_resolve_path_argument(self):
+        main_cmd = consoleui.CommandParser(name="foo")
+        main_cmd.add_path_argument("src_paths", nargs="+", is_resolve_paths=True, path_type="file")
+        main_cmd.add_path_argument("--output", environ_var="YAKHERD_TEST_OUTPUT")
+        with tempfile.TemporaryDirectory() as tempdir:
+            for name in ("a.txt", "b.txt"):
+                open(os.path.join(tempdir, name), "w").close()
+            args_d = main_cmd.parse([os.path.join(tempdir, "*.txt"), os.path.join(tempdir, "a.txt")])
+            self.assertEqual([p.name for p in args_d["src_paths"]], ["a.txt", "b.txt"])
+            self.assertIsNotNone(args_d["src_paths"][0].stat_result)
+            self.assertIsNone(args_d["output"])
+            with self.assertRaises(SystemExit):
+                main_cmd.parse([os.path.join(tempdir, "*.none")])
+
+class BuildSettingsTestCase(unittest.TestCase):
+
+    def test_build_settings(self):
+        main_cmd = consoleui.CommandParser(name="foo")
+        main_cmd.add_argument("--num-threads", type=int, default=None)
+        main_cmd.add_argument("--host", default=None)
+        main_cmd.add_argument("--port", type=int, default=None)
+        args_d = main_cmd.parse(["--num-threads", "4"])
+        os.environ["YAKHERD_TEST_HOST"] = "env-host"
+        self.addCleanup(os.environ.pop, "YAKHERD_TEST_HOST", None)
+        settings = main_cmd.build_settings(
+            config={"db.host": "config-host", "db.port": 5432},
+            defaults={"num_threads": 1, "host": "localhost", "port": 80, "timeout": 30},
+            environ_vars={"host": "YAKHERD_TEST_HOST", "port": "YAKHERD_TEST_PORT"},
+            config_keys={"host": "db.host", "port": "db.port", "user": "db.user"},
+            args_d=args_d,
+        )
+        self.assertIs(main_cmd.settings, settings)
+        self.assertEqual(settings["num_threads"], 4)
+        self.assertEqual(settings.source("num_threads"), "cli")
+        self.assertEqual(settings["host"], "env-host")
+        self.assertEqual(settings.source("host"), "environ")
+        self.assertEqual(settings["port"], 5432)
+        self.assertEqual(settings.source("port"), "config")
+        self.assertEqual(settings["timeout"], 30)
+        self.assertEqual(settings.source("timeout"), "defaults")
+        self.assertNotIn("user", settings)
+
+class CompletionIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.index_path = os.path.join(self.tempdir.name, "cache", "index.json")
+        self.main_cmd = _build_command()
+
+    def test_ensure_regenerates_on_version_change(self):
+        self.assertTrue(self.main_cmd.ensure_completion_index(self.index_path, version="1"))
+        self.assertFalse(self.main_cmd.ensure_completion_index(self.index_path, version="1"))
+        self.assertTrue(self.main_cmd.ensure_completion_index(self.index_path, version="2"))
+        self.assertEqual(completion.load_index(self.index_path)["version"], "2")
+        self.main_cmd.add_argument("--extra", action="store_true")
+        self.assertTrue(self.main_cmd.ensure_completion_index(self.index_path, version="2"))
+        self.assertFalse(self.main_cmd.ensure_completion_index(self.index_path, version="2"))
+
+    def test_execute_refreshes_index(self):
+        self.main_cmd.enable_completion_index(self.index_path, version="1")
+        self.assertEqual(self.main_cmd.execute(["report"]), 0)
+        index = completion.load_index(self.index_path)
+        self.assertNotIn("--extra", index["tree"]["options"])
+        self.main_cmd.add_argument("--extra", action="store_true")
+        self.assertEqual(self.main_cmd.execute(["report"]), 0)
+        index = completion.load_index(self.index_path)
+        self.assertIn("--extra", index["tree"]["options"])
+
+    def test_complete(self):
+        self.main_cmd.write_completion_index(self.index_path, version="1")
+        index = completion.load_index(self.index_path)
+        self.assertEqual(completion.complete(index, ["r"]), ["report", "run"])
+        self.assertEqual(completion.complete(index, ["--m"]), ["--mode"])
+        self.assertEqual(completion.complete(index, ["--mode", ""]), ["fast", "slow"])
+        self.assertEqual(completion.complete(index, ["--flag", "ru"]), ["run"])
+        open(os.path.join(self.tempdir.name, "data.txt"), "w").close()
+        prefix = os.path.join(self.tempdir.name, "da")
+        expected = [os.path.join(self.tempdir.name, "data.txt")]
+        self.assertEqual(completion.complete(index, ["run", prefix]), expected)
+        self.assertEqual(completion.complete(index, ["run", "x", prefix]), expected)
+        self.assertEqual(completion.complete(index, ["run", "--output", prefix]), expected)
+        self.assertEqual(completion.complete(index, ["report", prefix]), [])
+
+class ProfilingOptionsTestCase(unittest.TestCase):
+
+    def test_profile_reports(self):
+        calls = []
+        main_cmd = consoleui.CommandParser(name="foo", command_fn=lambda **kwargs: calls.append(kwargs))
+        main_cmd.attach_logger_options()
+        main_cmd.attach_profiling_options()
+        with tempfile.TemporaryDirectory() as tempdir:
+            cpu_path = os.path.join(tempdir, "cpu.txt")
+            memory_path = os.path.join(tempdir, "memory.txt")
+            args_d = vars(main_cmd.parser.parse_args([
+                "-q",
+                "--profile", cpu_path,
+                "--profile-memory", memory_path,
+            ]))
+            main_cmd.default_action(**args_d)
+            self.assertEqual(len(calls), 1)
+            self.assertTrue(os.path.getsize(cpu_path))
+            self.assertTrue(os.path.getsize(memory_path))
+
+    def test_sampling_runcall_keywords(self):
+        from yakherd import profiling
+        profiler = profiling.SamplingProfiler()
+        self.assertEqual(profiler.runcall(lambda fn, self: (fn, self), fn=1, self=2), (1, 2))
+
+class BatchTestCase(unittest.TestCase):
+
+    def test_execute_batch(self):
+        words = []
+        def run(**kwargs):
+            words.append(kwargs["word"])
+            if kwargs["word"] == "bad":
+                sys.exit(2)
+        main_cmd = consoleui.CommandParser(name="foo", command_fn=run)
+        main_cmd.add_argument("word")
+        main_cmd.attach_batch_options()
+        with tempfile.TemporaryDirectory() as tempdir:
+            batch_path = os.path.join(tempdir, "batch.txt")
+            summary_path = os.path.join(tempdir, "summary.txt")
+            with open(batch_path, "w") as dest:
+                dest.write("a\n# comment\n\n'b c'\n")
+            self.assertEqual(main_cmd.execute(["--batch", batch_path, "--batch-summary", summary_path]), 0)
+            self.assertEqual(words, ["a", "b c"])
+            with open(summary_path) as src:
+                self.assertEqual(len(src.read().strip().split("\n")), 4)
+            with open(batch_path, "a") as dest:
+                dest.write("bad\n")
+            self.assertEqual(main_cmd.execute(["--batch", batch_path]), 1)
+
+    def test_batch_logger_options(self):
+        noise_levels = []
+        def run(**kwargs):
+            noise_levels.append(main_cmd.get_logger().max_allowed_message_noise_level)
+        main_cmd = consoleui.CommandParser(name="foo-batch", command_fn=run)
+        main_cmd.attach_logger_options()
+        main_cmd.attach_batch_options()
+        with tempfile.TemporaryDirectory() as tempdir:
+            batch_path = os.path.join(tempdir, "batch.txt")
+            with open(batch_path, "w") as dest:
+                dest.write("--quiet --verbosity 3\n--quiet --verbosity 5\n--quiet\n")
+            self.assertEqual(main_cmd.execute(["--batch", batch_path, "--quiet"]), 0)
+            self.assertEqual(noise_levels, [3, 5, 1])
+            # loggers are reused for the same options, and replaced loggers
+            # do not leave their handlers behind
+            logger = main_cmd.get_logger()
+            with open(batch_path, "w") as dest:
+                dest.write("--quiet\n" * 4)
+            self.assertEqual(main_cmd.execute(["--batch", batch_path, "--quiet"]), 0)
+            self.assertIs(main_cmd.get_logger(), logger)
+            self.assertEqual(len(logging.getLogger("foo-batch").handlers), 1)
+            with open(batch_path, "w") as dest:
+                dest.write("--verbosity 2\n--verbosity 3\n--verbosity 4\n--verbosity 5\n")
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                self.assertEqual(main_cmd.execute(["--batch", batch_path]), 0)
+            self.assertEqual(len(logging.getLogger("foo-batch").handlers), 2)
+
+class DaemonTestCase(unittest.TestCase):
+
+    server_script = """
+import sys, yakherd
+def run(**kwargs):
+    sys.stdout.write(kwargs["word"].upper() + "\\n")
+    sys.exit(int(kwargs["status"]))
+main_cmd = yakherd.CommandParser(name="foo", command_fn=run)
+main_cmd.add_argument("word")
+main_cmd.add_argument("status")
+main_cmd.serve(sys.argv[1], idle_timeout=5, is_fork=sys.argv[2] == "fork")
+"""
+
+    def run_server(self, mode):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(yakherd.__file__)))
+        # the commands' output must be flushed even when buffered
+        env.pop("PYTHONUNBUFFERED", None)
+        with tempfile.TemporaryDirectory() as tempdir:
+            socket_path = os.path.join(tempdir, "foo.sock")
+            server = subprocess.Popen([sys.executable, "-c", self.server_script, socket_path, mode], env=env)
+            try:
+                for _ in range(100):
+                    if os.path.exists(socket_path):
+                        break
+                    time.sleep(0.05)
+                results = []
+                for word, status in (("hello", "0"), ("world", "3")):
+                    result = subprocess.run(
+                        [sys.executable, "-m", "yakherd.daemon", socket_path, word, status],
+                        env=env,
+                        capture_output=True,
+                        text=True,
+                    )
+                    results.append((result.stdout, result.returncode))
+                self.assertEqual(results, [("HELLO\n", 0), ("WORLD\n", 3)])
+            finally:
+                server.terminate()
+                server.wait()
+
+    def test_fork(self):
+        self.run_server("fork")
+
+    def test_in_process(self):
+        self.run_server("in-process")
+
+if __name__ == "__main__":
+    unittest.main()
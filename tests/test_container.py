@@ -0,0 +1,147 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import unittest
+from yakherd import container
+
+class LayeredDictTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cli = {"a": None, "b": 0}
+        self.environ = {"a": "env-a", "c": "env-c"}
+        self.defaults = {"a": "default-a", "b": 1, "c": "default-c", "d": "default-d"}
+        self.settings = container.LayeredDict([
+            ("cli", self.cli),
+            ("environ", self.environ),
+            ("defaults", self.defaults),
+        ])
+
+    def test_lookup(self):
+        self.assertEqual(dict(self.settings), {"a": "env-a", "b": 0, "c": "env-c", "d": "default-d"})
+        self.assertEqual(self.settings.source("a"), "environ")
+        self.assertEqual(self.settings.source("b"), "cli")
+        self.assertEqual(self.settings.source("d"), "defaults")
+
+    def test_set_layer(self):
+        self.environ.pop("a")
+        self.environ["d"] = "env-d"
+        self.settings.set_layer("environ")
+        self.assertEqual(self.settings["a"], "default-a")
+        self.assertEqual(self.settings.source("d"), "environ")
+        self.settings.set_layer("defaults", {})
+        self.assertNotIn("a", self.settings)
+
+    def test_overlay(self):
+        derived = self.settings.overlay("cli", {"a": "cli-a"})
+        self.assertEqual(derived["a"], "cli-a")
+        self.assertEqual(derived["b"], 1)
+        self.assertEqual(self.settings["a"], "env-a")
+        self.assertEqual(self.settings["b"], 0)
+        self.assertEqual(derived.source("a"), "cli")
+        self.assertEqual(derived.source("c"), "environ")
+        self.assertEqual(dict(derived), {"a": "cli-a", "b": 1, "c": "env-c", "d": "default-d"})
+        self.assertEqual(len(derived), 4)
+        self.assertEqual(derived._merged, {"a": "cli-a", "b": 1})
+        derived = derived.overlay("defaults", {"a": "default-a"})
+        self.assertNotIn("b", derived)
+        self.assertNotIn("d", derived)
+        self.assertRaises(KeyError, derived.source, "d")
+        self.assertEqual(sorted(derived), ["a", "c"])
+        self.assertEqual(derived.sources(), {"a": "cli", "c": "environ"})
+        self.assertIn("d", self.settings)
+
+    def test_overlay_parent_changes(self):
+        derived = self.settings.overlay("cli", {"k": 1})
+        self.settings.set_layer("cli", {"j": "parent-cli", "c": "parent-c"})
+        self.assertEqual(derived.layer("cli"), {"k": 1})
+        self.assertNotIn("j", derived)
+        self.assertRaises(KeyError, derived.source, "j")
+        self.assertEqual(derived["c"], "env-c")
+        self.assertEqual(derived.source("c"), "environ")
+        self.environ["e"] = "env-e"
+        self.settings.set_layer("environ")
+        self.assertEqual(derived["e"], "env-e")
+        self.assertEqual(dict(derived), {"a": "env-a", "b": 1, "c": "env-c", "d": "default-d", "e": "env-e", "k": 1})
+
+class FlattenDictTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.d = {
+            "a": {"b": 1, "c": {"d": [1]}},
+            "e": {},
+            "f": 2,
+            "g": {"h": {"i": None}, "j": 3},
+        }
+
+    def test_flatten(self):
+        self.assertEqual(container.flatten_dict(self.d), {
+            "a.b": 1, "a.c.d": [1], "e": {}, "f": 2, "g.h.i": None, "g.j": 3,
+        })
+        self.assertEqual(
+            list(container.iter_flatten_dict(self.d, separator="/", parent_key="root"))[:2],
+            [("root/a/b", 1), ("root/a/c/d", [1])],
+        )
+        self.assertEqual(
+            list(container.flatten_dict(self.d, is_tuple_keys=True))[-1],
+            ("g", "j"),
+        )
+
+    def test_round_trip(self):
+        self.assertEqual(container.unflatten_dict(container.flatten_dict(self.d)), self.d)
+        self.assertEqual(
+            container.unflatten_dict(container.flatten_dict(self.d, separator="/"), separator="/"),
+            self.d,
+        )
+        self.assertEqual(
+            container.unflatten_dict(container.iter_flatten_dict(self.d, is_tuple_keys=True)),
+            self.d,
+        )
+        with self.assertRaises(ValueError):
+            container.unflatten_dict([("a", 1), ("a.b", 2)])
+        with self.assertRaises(ValueError):
+            container.unflatten_dict([("a.b", 1), ("a", 2)])
+
+    def test_deep(self):
+        d = {}
+        node = d
+        for level in range(5000):
+            node = node.setdefault(level, {})
+        node["leaf"] = 1
+        (key, value), = container.iter_flatten_dict(d, is_tuple_keys=True)
+        self.assertEqual(len(key), 5001)
+        node = container.unflatten_dict([(key, value)])
+        for level in range(5000):
+            node = node[level]
+        self.assertEqual(node, {"leaf": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import os
+import tempfile
+import unittest
+from yakherd import fileresource
+
+class InputManifestTestCase(unittest.TestCase):
+
+    def test_delta(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            paths = [os.path.join(tempdir, "input{}.txt".format(i)) for i in range(4)]
+            for path in paths:
+                with open(path, "w") as dest:
+                    dest.write(path)
+            manifest_path = os.path.join(tempdir, "inputs.manifest")
+            manifest = fileresource.InputManifest(manifest_path, is_hash=True)
+            delta = manifest.scan(paths)
+            self.assertEqual(delta.new, paths)
+            manifest.update(delta).save()
+            with open(paths[0], "w") as dest:
+                dest.write("changed")
+            os.utime(paths[1], ns=(0, 0))
+            os.unlink(paths[2])
+            new_path = os.path.join(tempdir, "input4.txt")
+            with open(new_path, "w") as dest:
+                dest.write("new")
+            manifest = fileresource.InputManifest(manifest_path, is_hash=True)
+            delta = manifest.scan([paths[0], paths[1], paths[3], new_path])
+            self.assertEqual(delta.new, [new_path])
+            self.assertEqual(delta.changed, [paths[0]])
+            self.assertEqual(delta.deleted, [paths[2]])
+            self.assertEqual(sorted(delta.unchanged), [paths[1], paths[3]])
+            manifest.update(delta).save()
+            self.assertFalse(manifest.scan([paths[0], paths[1], paths[3], new_path]))
+            # without hashing, modification time changes count
+            os.utime(paths[3], ns=(0, 0))
+            delta = fileresource.InputManifest(manifest_path).scan(paths[:2] + paths[3:])
+            self.assertEqual(delta.changed, [paths[3]])
+
+class ConfigurationDictCacheTestCase(unittest.TestCase):
+
+    def test_cache(self):
+        import json
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "config.json")
+            cache_dir = os.path.join(tempdir, "cache")
+            with open(path, "w") as dest:
+                json.dump({"db": {"replica": {"host": "a"}}, "name": "x"}, dest)
+            config = fileresource.ConfigurationDict(cache_dir=cache_dir).read(path, "json")
+            self.assertEqual(config["db.replica.host"], "a")
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            calls = []
+            cached = fileresource.ConfigurationDict(cache_dir=cache_dir)
+            cached._read_json = lambda *args, **kwargs: calls.append(args)
+            cached.read(path, "json")
+            self.assertEqual(calls, [])
+            self.assertEqual(dict(cached), dict(config))
+            self.assertEqual(cached._raw_d, config._raw_d)
+            with open(path, "w") as dest:
+                json.dump({"db": {"replica": {"host": "changed"}}}, dest)
+            config = fileresource.ConfigurationDict(cache_dir=cache_dir).read(path, "json")
+            self.assertEqual(config["db.replica.host"], "changed")
+            self.assertNotIn("name", config)
+
+class ConfigurationDictKeyIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.config = fileresource.ConfigurationDict()
+        self.config.update({
+            "db.replica.host": "replica",
+            "db.replica.port": 5433,
+            "db.primary.host": "primary",
+            "name": "x",
+        })
+
+    def test_lookup(self):
+        self.assertEqual(self.config["db", "replica", "port"], 5433)
+        self.assertEqual(self.config["db.primary.host"], "primary")
+        self.assertEqual(self.config.get("db", "replica", "host"), "replica")
+        self.assertEqual(self.config.get("db", "none", default=1), 1)
+        with self.assertRaises(KeyError):
+            self.config["db", "replica"]
+        self.assertEqual(self.config._raw_d["db"]["replica"], {"host": "replica", "port": 5433})
+
+    def test_lookup_dotted_components(self):
+        self.assertEqual(self.config.get("db.replica", "port"), 5433)
+        self.assertEqual(self.config["db", "replica.host"], "replica")
+        self.assertEqual(self.config[("db.primary", "host")], "primary")
+        self.assertEqual(dict(self.config.subtree("db.replica")), {"host": "replica", "port": 5433})
+        self.assertEqual(self.config.subtree("db")["replica.port"], 5433)
+        self.assertEqual(self.config.subtree("db")["primary", "host"], "primary")
+
+    def test_subtree_and_prefix(self):
+        view = self.config.subtree("db")
+        self.assertEqual(list(view), ["primary.host", "replica.host", "replica.port"])
+        self.assertEqual(view["replica", "host"], "replica")
+        self.assertEqual(dict(view.subtree("replica")), {"host": "replica", "port": 5433})
+        self.config["db.replica.user"] = "u"
+        self.assertEqual(len(view), 4)
+        del self.config["db.primary.host"]
+        self.assertEqual(
+            [key for key, _ in self.config.iter_prefix()],
+            ["db.replica.host", "db.replica.port", "db.replica.user", "name"],
+        )
+        self.assertEqual(list(self.config.iter_prefix("db", "primary")), [])
+
+    def test_index_built_on_demand(self):
+        self.assertIsNone(self.config._key_index)
+        self.assertEqual(self.config["name"], "x")
+        self.config.update({"db.primary.port": 5432})
+        self.assertIsNone(self.config._key_index)
+        self.assertEqual(self.config["db", "primary", "port"], 5432)
+        self.assertIsNotNone(self.config._key_index)
+        self.config.update({"db.primary.user": "u"})
+        del self.config["name"]
+        self.assertEqual(self.config["db", "primary", "user"], "u")
+        self.assertIsNone(self.config.get("name"))
+        self.assertEqual(
+            [key for key, _ in self.config.iter_prefix()],
+            ["db.primary.host", "db.primary.port", "db.primary.user", "db.replica.host", "db.replica.port"],
+        )
+
+class LayeredConfigurationTestCase(unittest.TestCase):
+
+    def test_layers(self):
+        import json
+        with tempfile.TemporaryDirectory() as tempdir:
+            site_path = os.path.join(tempdir, "site.json")
+            project_path = os.path.join(tempdir, "project.ini")
+            with open(site_path, "w") as dest:
+                json.dump({"db": {"host": "site", "port": 1}, "name": "site"}, dest)
+            with open(project_path, "w") as dest:
+                dest.write("[db]\nhost = project\n")
+            sources = [
+                {"environ_prefix": "APP_"},
+                project_path,
+                {"path": os.path.join(tempdir, "none.json"), "is_optional": True},
+                site_path,
+            ]
+            config = fileresource.LayeredConfiguration(
+                sources,
+                environ={"APP_DB__PORT": "9", "OTHER": "x"},
+            )
+            self.assertEqual(dict(config), {"db.port": "9", "db.host": "project", "name": "site"})
+            self.assertEqual(config.source("db.host"), project_path)
+            self.assertEqual(config.source("db.port"), "environ:APP_")
+            self.assertEqual(config.get("db", "host"), "project")
+            self.assertEqual(config.layer_names, ["environ:APP_", project_path, site_path])
+            with self.assertRaises(FileNotFoundError):
+                fileresource.LayeredConfiguration([os.path.join(tempdir, "none.ini")])
+
+class ConfigurationDictReloadTestCase(unittest.TestCase):
+
+    def test_reload_changed(self):
+        import json
+        import threading
+        with tempfile.TemporaryDirectory() as tempdir:
+            base_path = os.path.join(tempdir, "base.json")
+            override_path = os.path.join(tempdir, "override.json")
+            def write(path, d):
+                with open(path, "w") as dest:
+                    json.dump(d, dest)
+            write(base_path, {"x": 1, "y": {"z": 2}, "s": "base"})
+            write(override_path, {"s": "override", "t": 1})
+            config = fileresource.ConfigurationDict()
+            config.read(base_path, "json").read(override_path, "json")
+            diffs = []
+            config.subscribe(diffs.append)
+            self.assertFalse(config.reload_changed())
+            write(base_path, {"x": 5, "y": {"w": 2}, "s": "base2"})
+            diff = config.reload_changed()
+            self.assertEqual(diff.added, {"y.w": 2})
+            self.assertEqual(diff.removed, {"y.z": 2})
+            self.assertEqual(diff.changed, {"x": (1, 5)})
+            self.assertEqual(config["s"], "override")
+            write(override_path, {"t": 1, "u": 2})
+            diff = config.reload_changed()
+            self.assertEqual(diff.changed, {"s": ("override", "base2")})
+            self.assertEqual(diff.added, {"u": 2})
+            self.assertEqual(len(diffs), 2)
+            notified = threading.Event()
+            config.subscribe(lambda diff: notified.set())
+            config.watch(interval=0.01)
+            try:
+                write(base_path, {"x": 6, "longer": True})
+                self.assertTrue(notified.wait(5))
+            finally:
+                config.stop_watching()
+            self.assertEqual(config["x"], 6)
+
+class ConfigurationDictLazyTestCase(unittest.TestCase):
+
+    def test_lazy_json(self):
+        import json
+        data = {
+            "db": {"replica": {"host": "h", "ports": [1, 2, {"x": "]}\"["}]}},
+            "name": "x\"y",
+            "n": 1.5e3,
+            "flags": [True, None],
+            "empty": {},
+        }
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "config.json")
+            with open(path, "w") as dest:
+                json.dump(data, dest, indent=2)
+            config = fileresource.ConfigurationDict().read(path, "json", is_lazy=True)
+            self.assertEqual(dict.__len__(config), 0)
+            self.assertEqual(config["db", "replica", "host"], "h")
+            self.assertEqual(dict.__len__(config), 2)
+            self.assertEqual(config.get("n"), 1500.0)
+            expected = fileresource.ConfigurationDict().read(path, "json")
+            self.assertEqual(dict(config), dict(expected))
+
+    def test_lazy_ini(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "config.ini")
+            with open(path, "w") as dest:
+                dest.write("[DEFAULT]\nbase = 1\n[s1]\na = %(base)s-x\nmulti = one\n  [two]\n[s2]\nb = 2\n")
+            config = fileresource.ConfigurationDict().read(path, "ini", is_lazy=True)
+            self.assertEqual(config["s1.a"], "1-x")
+            self.assertEqual(dict.__len__(config), 3)
+            self.assertEqual(config["s1", "multi"], "one\n[two]")
+            expected = fileresource.ConfigurationDict().read(path, "ini")
+            self.assertEqual(dict(config), dict(expected))
+            with open(path, "w") as dest:
+                dest.write("[common]\nbase = 2\n[s1]\na = %(base)s-y\n")
+            config = fileresource.ConfigurationDict().read(path, "ini", is_lazy=True, default_section="common")
+            self.assertEqual(dict(config), {"s1.a": "2-y", "s1.base": "2"})
+
+    def test_lazy_reload(self):
+        import json
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "config.json")
+            def write(data):
+                with open(path, "w") as dest:
+                    json.dump(data, dest)
+                st = os.stat(path)
+                os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+            write({"a": {"x": 1}, "b": {"y": 2}, "c": 3})
+            config = fileresource.ConfigurationDict().read(path, "json", is_lazy=True)
+            self.assertEqual(config["a", "x"], 1)
+            self.assertEqual(config["c"], 3)
+            write({"a": {"x": 1}, "b": {"y": 5}, "c": 4})
+            diff = config.reload_changed()
+            self.assertEqual(diff.added, {})
+            self.assertEqual(diff.removed, {})
+            # "b" was never loaded, so it is not compared
+            self.assertEqual(diff.changed, {"c": (3, 4)})
+            self.assertEqual(dict.__len__(config), 2)
+            self.assertEqual(dict(config), {"a.x": 1, "b.y": 5, "c": 4})
+            # pending sections are read from the file when first accessed
+            write({"p": {"q": 1}, "r": 2})
+            config = fileresource.ConfigurationDict().read(path, "json", is_lazy=True)
+            write({"p": {"q": 5}, "r": 2, "s": 3})
+            self.assertEqual(config["p.q"], 5)
+            diff = config.reload_changed()
+            self.assertEqual(diff.added, {"s": 3})
+            self.assertEqual(diff.changed, {})
+            write({})
+            diff = config.reload_changed()
+            self.assertEqual(diff.removed, {"p.q": 5, "s": 3})
+            self.assertEqual(dict(config), {})
+
+    def test_reload_parses_earlier_once(self):
+        import json
+        with tempfile.TemporaryDirectory() as tempdir:
+            paths = [os.path.join(tempdir, "{}.json".format(idx)) for idx in range(2)]
+            with open(paths[0], "w") as dest:
+                json.dump({"a": 1, "b": 2}, dest)
+            with open(paths[1], "w") as dest:
+                json.dump({"a": 3, "b": 4}, dest)
+            config = fileresource.ConfigurationDict()
+            for path in paths:
+                config.read(path, "json")
+            with open(paths[1], "w") as dest:
+                json.dump({}, dest)
+            st = os.stat(paths[1])
+            os.utime(paths[1], ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+            parsed_paths = []
+            parse = config._parse
+            def _parse(path, *args):
+                parsed_paths.append(str(path))
+                return parse(path, *args)
+            config._parse = _parse
+            diff = config.reload_changed()
+            self.assertEqual(diff.changed, {"a": (3, 1), "b": (4, 2)})
+            self.assertEqual(parsed_paths, paths[::-1])
+
+if __name__ == "__main__":
+    unittest.main()
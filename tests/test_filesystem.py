@@ -0,0 +1,404 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import os
+import tempfile
+import unittest
+from yakherd import filesystem
+
+class ResolvePathsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = self.tempdir.name
+        for rel_path in ("a.txt", "b.txt", "c.dat", "sub/d.txt", "sub/deeper/e.txt", ".hidden.txt"):
+            path = os.path.join(self.root, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as dest:
+                dest.write(rel_path)
+        os.symlink(os.path.join(self.root, "a.txt"), os.path.join(self.root, "link.dat"))
+
+    def rel(self, paths):
+        return [os.path.relpath(str(p), self.root) for p in paths]
+
+    def test_glob(self):
+        self.assertEqual(
+            self.rel(filesystem.iter_glob(os.path.join(self.root, "*.txt"))),
+            ["a.txt", "b.txt"],
+        )
+        self.assertEqual(
+            sorted(self.rel(filesystem.iter_glob(os.path.join(self.root, "**", "*.txt")))),
+            ["a.txt", "b.txt", "sub/d.txt", "sub/deeper/e.txt"],
+        )
+
+    def test_resolve(self):
+        resolved = filesystem.resolve_paths([
+            os.path.join(self.root, "*.txt"),
+            os.path.join(self.root, "a.txt"),
+            os.path.join(self.root, "*.dat"),
+        ])
+        self.assertEqual(self.rel(resolved), ["a.txt", "b.txt", "c.dat"])
+        self.assertTrue(all(p.stat_result is not None for p in resolved))
+        self.assertIs(resolved[0].stat(), resolved[0].stat_result)
+        self.assertTrue(resolved[0].is_file())
+        with self.assertRaises(FileNotFoundError):
+            filesystem.resolve_paths([os.path.join(self.root, "*.none")])
+        with self.assertRaises(IsADirectoryError):
+            filesystem.resolve_paths([os.path.join(self.root, "sub")], path_type="file")
+        many = [os.path.join(self.root, "a.txt")] * 50 + [os.path.join(self.root, "b.txt")]
+        self.assertEqual(self.rel(filesystem.resolve_paths(many)), ["a.txt", "b.txt"])
+
+class MemoryMappedReadTestCase(unittest.TestCase):
+
+    def test_mapped_and_streamed(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "data.txt")
+            with open(path, "wb") as dest:
+                dest.write(b"a\nbb\nccc")
+            with filesystem.file_handle(path, "rb", is_memory_map=True) as src:
+                self.assertTrue(src.is_memory_mapped)
+                self.assertEqual(bytes(src[2:4]), b"bb")
+                self.assertEqual(bytes(src.readline()), b"a\n")
+                self.assertEqual([bytes(line) for line in src.iter_lines(keepends=False)], [b"bb", b"ccc"])
+            with open(path, "rb") as stream:
+                streamed = filesystem.StreamedFile(stream)
+                self.assertEqual([bytes(line) for line in streamed], [b"a\n", b"bb\n", b"ccc"])
+            empty_path = os.path.join(tempdir, "empty.txt")
+            open(empty_path, "w").close()
+            with filesystem.file_handle(empty_path, "rb", is_memory_map=True) as src:
+                self.assertFalse(src.is_memory_mapped)
+                self.assertEqual(bytes(src.read()), b"")
+        with self.assertRaises(ValueError):
+            filesystem.file_handle(path, "r", is_memory_map=True)
+
+class CompressionTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            for suffix in (".gz", ".bz2", ".lzma", ".xz"):
+                path = os.path.join(tempdir, "data.txt" + suffix)
+                with filesystem.file_handle(path, "w") as dest:
+                    dest.write("hello\nworld\n")
+                with filesystem.file_handle(path, "rb", compression=None) as src:
+                    self.assertNotEqual(src.read(), b"hello\nworld\n")
+                with filesystem.file_handle(path) as src:
+                    self.assertEqual(src.read(), "hello\nworld\n")
+            unsuffixed_path = os.path.join(tempdir, "data")
+            os.rename(path, unsuffixed_path)
+            self.assertIsNone(filesystem.detect_compression(unsuffixed_path))
+            self.assertEqual(filesystem.detect_compression(unsuffixed_path, is_sniff=True), "xz")
+            with filesystem.file_handle(unsuffixed_path, "rb", compression="sniff") as src:
+                self.assertEqual(src.read(), b"hello\nworld\n")
+
+    def test_no_sniff_by_default(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "data.txt")
+            with open(path, "w") as dest:
+                dest.write("BZh is not a bzip2 stream\n")
+            with filesystem.file_handle(path) as src:
+                self.assertEqual(src.read(), "BZh is not a bzip2 stream\n")
+
+    def test_lzma_container(self):
+        import lzma
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "data.lzma")
+            with filesystem.file_handle(path, "wb") as dest:
+                dest.write(b"hello\n")
+            with open(path, "rb") as src:
+                self.assertEqual(lzma.decompress(src.read(), format=lzma.FORMAT_ALONE), b"hello\n")
+
+    def test_open_kwargs(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "data.txt.gz")
+            for is_atomic in (False, True):
+                with filesystem.file_handle(path, "w", buffering=4096, encoding="utf-8", is_atomic=is_atomic) as dest:
+                    dest.write("h\u00e9llo\n")
+                with filesystem.file_handle(path, buffering=4096, encoding="utf-8") as src:
+                    self.assertEqual(src.read(), "h\u00e9llo\n")
+
+    def test_parallel_gzip(self):
+        import gzip
+        data = b"".join(b"line %d\n" % i for i in range(100000))
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "data.gz")
+            with filesystem.file_handle(path, "wb", compression_threads=4) as dest:
+                for idx in range(0, len(data), 1000):
+                    dest.write(data[idx:idx + 1000])
+            with gzip.open(path) as src:
+                self.assertEqual(src.read(), data)
+
+class PrefetchTestCase(unittest.TestCase):
+
+    def test_iter_prefetched(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            paths = []
+            for idx in range(8):
+                path = os.path.join(tempdir, "{}.txt".format(idx))
+                with open(path, "w") as dest:
+                    dest.write(str(idx) * 1000)
+                paths.append(path)
+            results = list(filesystem.iter_prefetched(paths, num_prefetch=3))
+            self.assertEqual([path for path, data in results], paths)
+            self.assertEqual(results[2][1], b"2" * 1000)
+            results = list(filesystem.iter_prefetched(
+                paths,
+                chunk_size=300,
+                max_buffered_bytes=700,
+                is_ordered=False,
+            ))
+            self.assertEqual(len(results), 8 * 4)
+            contents = {}
+            for path, data in results:
+                contents[path] = contents.get(path, b"") + data
+            self.assertEqual(contents[paths[5]], b"5" * 1000)
+            with self.assertRaises(FileNotFoundError):
+                list(filesystem.iter_prefetched(paths + [os.path.join(tempdir, "none")]))
+
+class LineChunkingTestCase(unittest.TestCase):
+
+    def test_chunks_records_batches(self):
+        import io
+        data = b"".join(b"line %d\n" % i for i in range(1000)) + b"tail"
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "data.txt")
+            with open(path, "wb") as dest:
+                dest.write(data)
+            for chunk_size in (5, 100, 1 << 20):
+                for src in (path, io.BytesIO(data)):
+                    chunks = [bytes(c) for c in filesystem.iter_line_chunks(src, chunk_size=chunk_size)]
+                    self.assertEqual(b"".join(chunks), data)
+                    self.assertTrue(all(c.endswith(b"\n") for c in chunks[:-1]))
+                for src in (path, io.BytesIO(data)):
+                    records = [bytes(r) for r in filesystem.iter_line_records(src, chunk_size=chunk_size)]
+                    self.assertEqual(records, data.split(b"\n"))
+                batches = list(filesystem.iter_line_batches(path, batch_size=300, chunk_size=chunk_size))
+                self.assertEqual([len(b) for b in batches], [300, 300, 300, 101])
+                self.assertEqual(batches[-1][-1], b"tail")
+
+    def test_batches_split_on_newline_only(self):
+        import io
+        data = b"a\rb\x0bc\r\nd\n\ne\xe2\x80\xa8f\n"
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "data.txt")
+            with open(path, "wb") as dest:
+                dest.write(data)
+            with open(path, "rb") as src:
+                expected = list(src)
+            batches = list(filesystem.iter_line_batches(path, batch_size=2, keepends=True))
+            self.assertEqual([line for batch in batches for line in batch], expected)
+            batches = list(filesystem.iter_line_batches(io.BytesIO(data), chunk_size=3))
+            self.assertEqual(
+                [line for batch in batches for line in batch],
+                [line.rstrip(b"\n") for line in expected],
+            )
+
+class AtomicWriteTestCase(unittest.TestCase):
+
+    def test_commit_and_discard(self):
+        import gzip
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "out.txt")
+            with filesystem.file_handle(path, "w", is_atomic=True) as dest:
+                dest.write("first")
+                self.assertFalse(os.path.exists(path))
+            with open(path) as src:
+                self.assertEqual(src.read(), "first")
+            with self.assertRaises(RuntimeError):
+                with filesystem.file_handle(path, "w", is_atomic=True) as dest:
+                    dest.write("second")
+                    raise RuntimeError()
+            with open(path) as src:
+                self.assertEqual(src.read(), "first")
+            self.assertEqual(os.listdir(tempdir), ["out.txt"])
+            gz_path = os.path.join(tempdir, "out.gz")
+            with filesystem.file_handle(gz_path, "wb", is_atomic=True) as dest:
+                dest.write(b"zipped")
+            with gzip.open(gz_path) as src:
+                self.assertEqual(src.read(), b"zipped")
+
+    def test_exclusive(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "out.txt")
+            with filesystem.file_handle(path, "x", is_atomic=True) as dest:
+                dest.write("first")
+            with open(path) as src:
+                self.assertEqual(src.read(), "first")
+            with self.assertRaises(FileExistsError):
+                filesystem.file_handle(path, "x", is_atomic=True)
+            with self.assertRaises(FileExistsError):
+                with filesystem.file_handle(os.path.join(tempdir, "late.txt"), "x", is_atomic=True) as dest:
+                    dest.write("second")
+                    with open(os.path.join(tempdir, "late.txt"), "w") as other:
+                        other.write("other")
+            with open(os.path.join(tempdir, "late.txt")) as src:
+                self.assertEqual(src.read(), "other")
+            self.assertEqual(sorted(os.listdir(tempdir)), ["late.txt", "out.txt"])
+
+class TeeHandleTestCase(unittest.TestCase):
+
+    def test_fan_out(self):
+        import gzip
+        import io
+        expected = "".join("line {}\n".format(i) for i in range(200))
+        with tempfile.TemporaryDirectory() as tempdir:
+            plain_path = os.path.join(tempdir, "out.txt")
+            gz_path = os.path.join(tempdir, "out.txt.gz")
+            buffer = io.BytesIO()
+            with filesystem.TeeHandle(
+                [buffer, plain_path, {"path": gz_path, "is_threaded": True}],
+                "w",
+                block_size=64,
+                max_queue_blocks=2,
+            ) as dest:
+                for line in expected.splitlines(True):
+                    dest.write(line)
+            self.assertEqual(buffer.getvalue().decode(), expected)
+            with open(plain_path) as src:
+                self.assertEqual(src.read(), expected)
+            with gzip.open(gz_path, "rt") as src:
+                self.assertEqual(src.read(), expected)
+            with self.assertRaises(RuntimeError):
+                with filesystem.TeeHandle([plain_path], "wb", is_atomic=True, is_threaded=True) as dest:
+                    dest.write(b"partial")
+                    raise RuntimeError()
+            with open(plain_path) as src:
+                self.assertEqual(src.read(), expected)
+
+class ShardedWriterTestCase(unittest.TestCase):
+
+    def test_rotate_and_route(self):
+        import gzip
+        import json
+        with tempfile.TemporaryDirectory() as tempdir:
+            prefix = os.path.join(tempdir, "part-")
+            with filesystem.ShardedWriter(prefix, ".txt.gz", max_records=3) as dest:
+                for i in range(10):
+                    dest.write("r{}\n".format(i))
+            with open(prefix + "manifest.json") as src:
+                manifest = json.load(src)
+            self.assertTrue(manifest["is_complete"])
+            shards = manifest["shards"]
+            self.assertEqual([s["records"] for s in shards], [3, 3, 3, 1])
+            self.assertEqual(shards[0]["path"], prefix + "00000.txt.gz")
+            with gzip.open(shards[-1]["path"], "rt") as src:
+                self.assertEqual(src.read(), "r9\n")
+            prefix = os.path.join(tempdir, "keyed-")
+            with filesystem.ShardedWriter(
+                prefix,
+                ".txt",
+                "wb",
+                max_bytes=8,
+                max_open_handles=2,
+                manifest_path=None,
+            ) as dest:
+                for i in range(30):
+                    dest.write(b"r%02d\n" % i, key="k{}".format(i % 5))
+            self.assertEqual(len(dest.shards), 15)
+            self.assertFalse(os.path.exists(prefix + "manifest.json"))
+            with open(prefix + "k1-00000.txt") as src:
+                self.assertEqual(src.read(), "r01\nr06\n")
+
+    def test_unsafe_keys(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            out_dir = os.path.join(tempdir, "out")
+            os.mkdir(out_dir)
+            keys = ["../escape", "a/b", "..", "nul\x00", "50%"]
+            with filesystem.ShardedWriter(
+                os.path.join(out_dir, ""),
+                ".txt",
+                shard_name_format="{key}",
+                manifest_path=None,
+            ) as dest:
+                for key in keys:
+                    dest.write("{!r}\n".format(key), key=key)
+            self.assertEqual(os.listdir(tempdir), ["out"])
+            self.assertEqual(
+                sorted(os.listdir(out_dir)),
+                sorted(["..%2Fescape.txt", "a%2Fb.txt", "%2E%2E.txt", "nul%00.txt", "50%25.txt"]),
+            )
+
+    def test_resolved_paths_and_failure(self):
+        import json
+        with tempfile.TemporaryDirectory() as tempdir:
+            os.environ["YAKHERD_TEST_SHARD_DIR"] = tempdir
+            self.addCleanup(os.environ.pop, "YAKHERD_TEST_SHARD_DIR", None)
+            with self.assertRaises(RuntimeError):
+                with filesystem.ShardedWriter("$YAKHERD_TEST_SHARD_DIR/part-", ".txt", max_records=1) as dest:
+                    dest.write("a\n")
+                    dest.write("b\n")
+                    raise RuntimeError()
+            with open(os.path.join(tempdir, "part-manifest.json")) as src:
+                manifest = json.load(src)
+            self.assertFalse(manifest["is_complete"])
+            self.assertEqual(
+                [s["path"] for s in manifest["shards"]],
+                [os.path.join(tempdir, "part-00000.txt"), os.path.join(tempdir, "part-00001.txt")],
+            )
+
+class DiscoverPathsTestCase(unittest.TestCase):
+
+    def test_discover(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            for dir_path in ("a/b/c", "a/skip", "x"):
+                os.makedirs(os.path.join(tempdir, dir_path))
+            for path in ("r.txt", "a/1.txt", "a/b/2.txt", "a/b/c/3.txt", "a/b/c/3.log", "a/skip/4.txt"):
+                with open(os.path.join(tempdir, path), "w") as dest:
+                    dest.write("data")
+            os.symlink(os.path.join(tempdir, "a"), os.path.join(tempdir, "x", "loop"))
+            os.symlink(os.path.join(tempdir, "a"), os.path.join(tempdir, "a", "b", "up"))
+            os.symlink(os.path.join(tempdir, "none"), os.path.join(tempdir, "x", "broken"))
+            def rel(paths):
+                return sorted(os.path.relpath(p, tempdir) for p in paths)
+            paths = list(filesystem.discover_paths(tempdir, max_workers=4))
+            self.assertEqual(rel(paths), [
+                "a/1.txt", "a/b/2.txt", "a/b/c/3.log", "a/b/c/3.txt", "a/skip/4.txt", "r.txt",
+            ])
+            self.assertTrue(all(p.stat_result.st_size == 4 for p in paths))
+            errors = []
+            self.assertEqual(rel(filesystem.discover_paths(
+                tempdir,
+                include="*.txt",
+                exclude="skip",
+                symlink_policy="follow",
+                on_error=errors.append,
+            )), ["a/1.txt", "a/b/2.txt", "a/b/c/3.txt", "r.txt"])
+            self.assertEqual(len(errors), 1)
+            self.assertEqual(rel(filesystem.discover_paths(
+                tempdir,
+                max_depth=1,
+                is_include_dirs=True,
+                is_stat=False,
+            )), [".", "a", "a/1.txt", "a/b", "a/skip", "r.txt", "x", "x/broken"])
+
+if __name__ == "__main__":
+    unittest.main()
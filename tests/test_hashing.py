@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import os
+import tempfile
+import unittest
+from yakherd import hashing
+
+class FindDuplicatesTestCase(unittest.TestCase):
+
+    def test_find_duplicates(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            def write(name, data):
+                path = os.path.join(tempdir, name)
+                with open(path, "wb") as dest:
+                    dest.write(data)
+                return path
+            data = os.urandom(100000)
+            paths = [
+                write("a", data),
+                write("b", data),
+                # same size and leading bytes, different contents
+                write("c", data[:-1] + bytes([data[-1] ^ 1])),
+                write("d", b"small"),
+                write("e", b"small"),
+                write("f", b"other"),
+                write("g", b""),
+                write("h", b""),
+            ]
+            link_path = os.path.join(tempdir, "a-link")
+            os.link(paths[0], link_path)
+            groups = hashing.find_duplicates(paths + [link_path], partial_bytes=1024, max_workers=4)
+            self.assertEqual(
+                [(size, group) for size, _, group in groups],
+                [(100000, paths[:2]), (5, paths[3:5])],
+            )
+            self.assertEqual(groups[0][1], hashing.hash_file(paths[1]))
+
+    def test_hash_files_bounded(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            paths = []
+            for idx in range(20):
+                path = os.path.join(tempdir, str(idx))
+                with open(path, "w") as dest:
+                    dest.write(str(idx))
+                paths.append(path)
+            num_drawn = [0]
+            def _iter_paths():
+                for path in paths:
+                    num_drawn[0] += 1
+                    yield path
+            results = hashing.hash_files(_iter_paths(), max_workers=2)
+            self.assertEqual(next(results), (paths[0], hashing.hash_file(paths[0])))
+            self.assertEqual(num_drawn[0], 4)
+            self.assertEqual([path for path, _ in results], paths[1:])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import os
+import sys
+import subprocess
+import unittest
+import yakherd
+
+class ColdImportTestCase(unittest.TestCase):
+
+    # Cumulative microseconds allowed for a cold ``import yakherd``, as
+    # reported by ``-X importtime``. Eagerly importing all the submodules
+    # takes several times this.
+    import_time_budget_us = 15000
+
+    def run_python(self, *args):
+        env = dict(os.environ)
+        src_dir = os.path.dirname(os.path.dirname(os.path.abspath(yakherd.__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(
+            [src_dir] + [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p]
+        )
+        return subprocess.run(
+            [sys.executable] + list(args),
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    def test_import_time_budget(self):
+        result = self.run_python("-X", "importtime", "-c", "import yakherd")
+        cumulative_us = None
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            fields = line[len("import time:"):].split("|")
+            if len(fields) == 3 and fields[2].strip() == "yakherd":
+                cumulative_us = int(fields[1])
+        self.assertIsNotNone(cumulative_us, result.stderr)
+        self.assertLessEqual(cumulative_us, self.import_time_budget_us)
+
+    def test_submodules_deferred(self):
+        result = self.run_python(
+            "-c",
+            "import sys, yakherd; print(' '.join(sorted(m for m in sys.modules if m.startswith('yakherd.'))))",
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_public_names(self):
+        from yakherd import filesystem
+        self.assertIs(yakherd.file_handle, filesystem.file_handle)
+        for name in yakherd.__all__:
+            self.assertTrue(hasattr(yakherd, name), name)
+        with self.assertRaises(AttributeError):
+            yakherd.no_such_name
+
+    def test_submodule_attributes(self):
+        result = self.run_python(
+            "-c",
+            "import yakherd; print(yakherd.hashing.__name__, yakherd.filesystem.file_handle.__name__)",
+        )
+        self.assertEqual(result.stdout.strip(), "yakherd.hashing file_handle")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import io
+import unittest
+from yakherd import textprocessing
+
+class StreamingTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{"a": i, "bb": "x" * (i % 7), "c": None} for i in range(250)]
+
+    def test_matches_format_dict_table_rows(self):
+        for border_style in (-1, 0, 1, 2, 3):
+            for max_column_width in (None, 2):
+                expected = textprocessing.format_dict_table_rows(
+                    self.rows,
+                    border_style=border_style,
+                    max_column_width=max_column_width,
+                )
+                for max_buffered_rows in (10, 10000):
+                    lines = textprocessing.iter_dict_table_rows(
+                        iter(self.rows),
+                        border_style=border_style,
+                        max_column_width=max_column_width,
+                        max_buffered_rows=max_buffered_rows,
+                    )
+                    self.assertEqual(list(lines), expected)
+        self.assertEqual(list(textprocessing.iter_dict_table_rows(iter([]))), [])
+
+    def test_sampled_widths(self):
+        lines = list(textprocessing.iter_dict_table_rows(
+            self.rows[:8],
+            width_mode="sample",
+            sample_size=3,
+            overflow="truncate",
+        ))
+        self.assertEqual(lines[0], "a | bb | c   ")
+        self.assertEqual(lines[-1], "7 |    | None")
+        self.assertEqual(lines[6], "4 | xx | None")
+        lines = list(textprocessing.iter_dict_table_rows(self.rows[:8], width_mode="sample", sample_size=3))
+        self.assertEqual(lines[6], "4 | xxxx | None")
+
+    def test_write(self):
+        dest = io.StringIO()
+        num_lines = textprocessing.write_dict_table(dest, iter(self.rows[:2]), border_style=3)
+        self.assertEqual(num_lines, 6)
+        self.assertEqual(dest.getvalue(), textprocessing.format_dict_table(self.rows[:2], border_style=3) + "\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##############################################################################
+## Copyright (c) 2021 Jeet Sukumaran.
+## All rights reserved.
+##
+## Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##     * Redistributions of source code must retain the above copyright
+##       notice, this list of conditions and the following disclaimer.
+##     * Redistributions in binary form must reproduce the above copyright
+##       notice, this list of conditions and the following disclaimer in the
+##       documentation and/or other materials provided with the distribution.
+##     * The names of its contributors may not be used to endorse or promote
+##       products derived from this software without specific prior written
+##       permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+## ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+## WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+## DISCLAIMED. IN NO EVENT SHALL JEET SUKUMARAN BE LIABLE FOR ANY DIRECT,
+## INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+## BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+## LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+## OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+##
+##############################################################################
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from yakherd import consoleui
+from yakherd import timing
+
+class PhaseTimerTestCase(unittest.TestCase):
+
+    def test_phases(self):
+        timer = timing.PhaseTimer()
+        with timer.phase("parse"):
+            pass
+        timer.record("command", 0.5)
+        with timer.phase("parse"):
+            pass
+        timer.record("command", 0.25)
+        d = timer.as_dict(is_include_startup=False)
+        self.assertEqual(list(d), ["parse", "command"])
+        self.assertEqual(d["command"], 0.75)
+        self.assertEqual(timer.rows(is_include_startup=False)[1]["calls"], 2)
+        self.assertEqual(timer.rows(is_include_startup=False)[-1]["phase"], "total")
+        self.assertEqual(list(timer.as_dict())[-3:], ["imports", "parse", "command"])
+
+    def test_mark(self):
+        timer = timing.PhaseTimer()
+        timer.mark("construction")
+        time.sleep(0.05)
+        timer.record_mark("construction")
+        self.assertLess(timer.elapsed("construction"), 0.05)
+        timer.record_mark("construction")
+        self.assertEqual(timer.as_dict(is_include_startup=False), {"construction": timer.elapsed("construction")})
+
+    def test_nested(self):
+        timer = timing.PhaseTimer()
+        with timer.phase("command"):
+            with timer.phase("logger"):
+                time.sleep(0.05)
+        self.assertGreaterEqual(timer.elapsed("logger"), 0.05)
+        self.assertLess(timer.elapsed("command"), 0.05)
+
+class TimingOptionsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.main_cmd = consoleui.CommandParser(
+            name="foo",
+            command_fn=lambda **kwargs: self.calls.append(kwargs),
+        )
+        self.main_cmd.add_argument("--flag", action="store_true")
+        self.main_cmd.attach_timing_options(version="1.2")
+
+    def test_report(self):
+        stderr = io.StringIO()
+        # time spent between construction and parsing is not construction
+        time.sleep(0.05)
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(self.main_cmd.execute(["--timings", "--flag"]), 0)
+        self.assertEqual(len(self.calls), 1)
+        phases = [line.split("|")[0].strip() for line in stderr.getvalue().splitlines()[2:]]
+        self.assertEqual(phases[-4:], ["construction", "parse", "command", "total"])
+        self.assertLess(self.main_cmd.phase_timer.elapsed("construction"), 0.05)
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "timings.jsonl")
+            self.main_cmd.execute(["--timings-file", path])
+            self.main_cmd.execute(["--timings-file", path, "--flag"])
+            with open(path) as src:
+                records = [json.loads(line) for line in src]
+        self.assertEqual(len(records), 2)
+        record = records[0]
+        self.assertEqual(record["prog"], "foo")
+        self.assertEqual(record["version"], "1.2")
+        self.assertEqual(list(record["phases"])[-3:], ["construction", "parse", "command"])
+        self.assertAlmostEqual(record["total"], sum(record["phases"].values()))
+        self.assertEqual(records[1]["argv"], ["--timings-file", path, "--flag"])
+
+if __name__ == "__main__":
+    unittest.main()
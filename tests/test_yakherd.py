@@ -30,14 +30,36 @@
 ## 
 ##############################################################################
 
+import contextlib
+import io
+import os
+import tempfile
 import unittest
 if __name__ == "__main__":
     import _pathmap
 else:
     from . import _pathmap
+from yakherd.application import yakherd as yakherd_app
 
 class TestCase(unittest.TestCase):
-    pass
+
+    def test_default_command(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertEqual(yakherd_app.main(["a.txt", "b.txt", "-o", "out"]), 0)
+        self.assertEqual(stdout.getvalue(), "Hello, world.\n")
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertNotEqual(yakherd_app.main([]), 0)
+
+    def test_duplicates_command(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            for name in ("a", "b"):
+                with open(os.path.join(tempdir, name), "w") as dest:
+                    dest.write("same")
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(yakherd_app.main(["duplicates", tempdir]), 0)
+            self.assertIn(os.path.join(tempdir, "b"), stdout.getvalue())
 
 if __name__ == "__main__":
     unittest.main()